@@ -31,17 +31,39 @@ def create_app(config_name=None):
     db.init_app(app)
     login_manager.init_app(app)
     
+    # 请求计时最先注册，它的 after_request 最后执行
+    from . import metrics, slow_queries
+    metrics.init_app(app)
+    slow_queries.init_app(app)
+    
+    from . import database
+    database.init_app(app)
+    
     # 确保上传目录存在
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # 注册蓝图
-    from . import auth
+    from . import auth, user_cache
     app.register_blueprint(auth.bp)
+    user_cache.init_app(app)
     
     from . import routes
     app.register_blueprint(routes.main_bp)
     app.register_blueprint(routes.library_bp)
     app.register_blueprint(routes.question_bp)
     app.register_blueprint(routes.paper_bp)
+    app.register_blueprint(routes.api_bp)
+    
+    from . import jobs
+    jobs.init_app(app)
+    
+    from . import search
+    search.init_app(app)
+    
+    from . import near_duplicates
+    near_duplicates.init_app(app)
+    
+    from . import seed
+    seed.init_app(app)
     
     return app
\ No newline at end of file
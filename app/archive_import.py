@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+压缩包批量导入模块
+
+一个 zip 中的多个 .md/.txt/.docx 文件在进程池中并行解析，每个文件的解析结果先写入临时文件，
+全部解析完成后按文件顺序在一个事务中批量写入目标题库，按哈希去重，并返回每个文件的导入汇总。
+"""
+import multiprocessing
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from app.docx_reader import iter_docx_lines
+from app.utils import bulk_insert_questions, iter_cleaned_questions, iter_lines, normalize_lines
+
+# 压缩包中可以导入的文件类型
+ARCHIVE_EXTENSIONS = {'.md', '.txt', '.docx'}
+
+
+def entry_display_name(info):
+    """压缩包内的文件名；Windows 下压缩的中文文件名通常是 GBK 编码"""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('gbk')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _natural_key(name):
+    """自然排序：第2章 排在 第10章 前面"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+def list_archive_entries(archive_path, max_entries=500, max_size=512 * 1024 * 1024):
+    """列出压缩包中可导入的文件 [(压缩包内路径, 显示名称)]，按文件名自然排序"""
+    with zipfile.ZipFile(archive_path) as archive:
+        entries = []
+        total_size = 0
+        for info in archive.infolist():
+            name = entry_display_name(info)
+            basename = os.path.basename(name.rstrip('/'))
+            if info.is_dir() or basename.startswith('.') or name.startswith('__MACOSX/'):
+                continue
+            if os.path.splitext(basename)[1].lower() not in ARCHIVE_EXTENSIONS:
+                continue
+            total_size += info.file_size
+            entries.append((info.filename, name))
+
+    if len(entries) > max_entries:
+        raise ValueError(f'压缩包中的文件过多（{len(entries)} 个，最多 {max_entries} 个）')
+    if total_size > max_size:
+        raise ValueError(f'压缩包解压后过大（{total_size // (1024 * 1024)}MB）')
+    return sorted(entries, key=lambda entry: _natural_key(entry[1]))
+
+
+def parse_archive_entry(archive_path, entry_name, display_name, library_id, spool_dir, chunk_size=500,
+                        media_folder=None):
+    """在工作进程中解析压缩包内的一个文件，题目按批写入临时文件，返回该文件的解析汇总"""
+    summary = {'name': display_name, 'lines': 0, 'parsed': 0, 'failed': 0, 'spool': None}
+    try:
+        with zipfile.ZipFile(archive_path) as archive, archive.open(entry_name) as entry:
+            if display_name.lower().endswith('.docx'):
+                # docx 本身也是 zip，需要可随机访问的文件，大文件会落到磁盘上
+                buffer = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, dir=spool_dir)
+                shutil.copyfileobj(entry, buffer)
+                buffer.seek(0)
+                lines = normalize_lines(iter_docx_lines(buffer, media_folder))
+            else:
+                buffer = None
+                lines = iter_lines(entry)
+
+            with tempfile.NamedTemporaryFile('wb', dir=spool_dir, suffix='.spool', delete=False) as spool:
+                summary['spool'] = spool.name
+                rows = []
+                for row in iter_cleaned_questions(lines, library_id, stats=summary):
+                    rows.append(row)
+                    if len(rows) >= chunk_size:
+                        pickle.dump(rows, spool)
+                        rows = []
+                if rows:
+                    pickle.dump(rows, spool)
+
+            if buffer is not None:
+                buffer.close()
+    except Exception as e:
+        summary['error'] = str(e)
+    return summary
+
+
+def _iter_spool(path):
+    """读取临时文件中的题目"""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                rows = pickle.load(f)
+            except EOFError:
+                return
+            yield from rows
+
+
+def import_archive(conn, archive_path, library_id, workers=None, chunk_size=500, spool_dir=None, progress=None,
+                   near_duplicate_distance=None, media_folder=None):
+    """并行解析压缩包中的文件，并在一个事务中按文件顺序写入题库
+
+    progress(files) 在每个文件解析完成后调用；near_duplicate_distance 见 bulk_insert_questions，
+    media_folder 见 iter_docx_lines。
+    返回 {'files': [每个文件的汇总], 'lines', 'parsed', 'inserted', 'duplicates', 'near_duplicates', 'failed'}。
+    """
+    entries = list_archive_entries(archive_path)
+    workers = workers or os.cpu_count() or 1
+    spool_dir = tempfile.mkdtemp(prefix='archive_', dir=spool_dir)
+    files = []
+
+    try:
+        # 并行解析；结果按文件顺序返回，便于按顺序写入
+        with ProcessPoolExecutor(max_workers=min(workers, max(len(entries), 1)),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [
+                executor.submit(parse_archive_entry, archive_path, entry_name, display_name,
+                                library_id, spool_dir, chunk_size, media_folder)
+                for entry_name, display_name in entries
+            ]
+            for future in futures:
+                files.append(future.result())
+                if progress:
+                    progress(files)
+
+        # 所有文件在一个事务中写入，重复题目（包括压缩包内不同文件之间的重复）由唯一索引忽略
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for summary in files:
+                summary.update({'inserted': 0, 'duplicates': 0, 'near_duplicates': 0})
+                if summary['spool']:
+                    result = bulk_insert_questions(conn, library_id, _iter_spool(summary['spool']),
+                                                   chunk_size, transaction=False,
+                                                   near_duplicate_distance=near_duplicate_distance)
+                    summary['inserted'] = result['inserted']
+                    summary['duplicates'] = result['duplicates']
+                    summary['near_duplicates'] = result['near_duplicates']
+                    summary['failed'] += result['failed']
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    for summary in files:
+        summary.pop('spool', None)
+    totals = {key: sum(summary.get(key, 0) for summary in files)
+              for key in ('lines', 'parsed', 'inserted', 'duplicates', 'near_duplicates', 'failed')}
+    return dict(totals, files=files)
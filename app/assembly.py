@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+"""
+组卷蓝图求解模块
+
+蓝图是一个字典（通常来自 JSON），例如：
+
+    {
+        "types": {"single_choice": 30, "true_false": 20, "short_answer": 10},
+        "difficulty": {"average": "medium", "tolerance": 0.2, "max_share": {"hard": 0.2}},
+        "exclude_recent_papers": 3,
+        "chapters": "all"
+    }
+
+- types: 各题型的题目数量；也可以只给 total，表示不限题型的题目总数
+- difficulty.average: 平均难度目标，可以是 easy/medium/hard 或 1~3 之间的数字（简单=1，中等=2，困难=3）
+- difficulty.tolerance: 平均难度允许的偏差，默认 0.25
+- difficulty.max_share / min_share: 各难度题目占比的上限/下限（0~1）
+- exclude_recent_papers: 不使用本题库最近 N 份试卷中的题目
+- chapters: "all" 表示覆盖题库中所有章节，也可以给出需要覆盖的章节列表
+
+求解时不逐题读取题目，而是在 SQL 中按 (章节, 题型, 难度) 分组统计候选数量，
+在这些分组上求解每组选几道题：先用贪心法构造初始解，为每个需要覆盖的章节选一道题，
+再逐题选择难度，使平均难度和各难度数量保持在可达范围内；然后做局部搜索，
+把已选题目换到同题型的其他分组，逐步减少约束违反量。最后在每个分组内随机抽取题目 id。
+约束无法满足时抛出 AssemblyError，reasons 中列出具体原因。
+"""
+import math
+import random
+import time
+from config import Config
+from app.sampling import MAX_PROBE_FRACTION, PROBE_COST
+from app.utils import DIFFICULTY_LEVELS, DIFFICULTY_SCORES
+
+# 蓝图只给出题目总数时，所有题型归入同一组
+ANY_TYPE = '*'
+
+# 局部搜索的时间和步数上限
+SEARCH_TIME_LIMIT = 0.1
+SEARCH_MAX_STEPS = 50000
+
+
+class BlueprintError(ValueError):
+    """蓝图格式错误"""
+
+
+class AssemblyError(Exception):
+    """蓝图约束无法满足"""
+
+    def __init__(self, reasons):
+        self.reasons = reasons
+        super().__init__('；'.join(reasons))
+
+
+def _difficulty_name(score):
+    """难度分值对应的中文名称"""
+    return Config.QUESTION_DIFFICULTIES[DIFFICULTY_LEVELS[score]]
+
+
+def _number(value, name, cast=int):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise BlueprintError(f'{name}必须是数字')
+
+
+def _difficulty_score(value, name):
+    if isinstance(value, str) and value in DIFFICULTY_SCORES:
+        return DIFFICULTY_SCORES[value]
+    score = _number(value, name, float)
+    if not 1 <= score <= 3:
+        raise BlueprintError(f'{name}必须在 1 到 3 之间')
+    return score
+
+
+def _share_counts(shares, total, name, rounding):
+    """把各难度占比换算为题目数量"""
+    if not isinstance(shares, dict):
+        raise BlueprintError(f'{name}必须是对象')
+    counts = {}
+    for difficulty, share in shares.items():
+        if difficulty not in DIFFICULTY_SCORES:
+            raise BlueprintError(f'未知难度：{difficulty}')
+        share = _number(share, name, float)
+        if not 0 <= share <= 1:
+            raise BlueprintError(f'{name}必须在 0 到 1 之间')
+        counts[DIFFICULTY_SCORES[difficulty]] = rounding(share * total)
+    return counts
+
+
+def parse_blueprint(data):
+    """校验蓝图并转换为求解使用的格式"""
+    if not isinstance(data, dict):
+        raise BlueprintError('蓝图必须是 JSON 对象')
+
+    types = data.get('types') or {}
+    if not isinstance(types, dict):
+        raise BlueprintError('types 必须是对象')
+    counts = {}
+    for question_type, count in types.items():
+        if question_type not in Config.QUESTION_TYPES:
+            raise BlueprintError(f'未知题型：{question_type}')
+        count = _number(count, f'{question_type} 的题目数量')
+        if count < 0:
+            raise BlueprintError(f'{question_type} 的题目数量不能为负数')
+        if count:
+            counts[question_type] = count
+
+    total = data.get('total')
+    if total is not None:
+        total = _number(total, '题目总数')
+    if counts:
+        if total is not None and total != sum(counts.values()):
+            raise BlueprintError('题目总数与各题型数量之和不一致')
+        total = sum(counts.values())
+    elif total and total > 0:
+        counts = {ANY_TYPE: total}
+    if not total or total <= 0:
+        raise BlueprintError('请至少选择一道题目')
+
+    difficulty = data.get('difficulty') or {}
+    if not isinstance(difficulty, dict):
+        raise BlueprintError('difficulty 必须是对象')
+    average = difficulty.get('average')
+    if average is not None:
+        average = _difficulty_score(average, '平均难度')
+    tolerance = _number(difficulty.get('tolerance', 0.25), '平均难度偏差', float)
+    if tolerance < 0:
+        raise BlueprintError('平均难度偏差不能为负数')
+    # 浮点误差不应让 0.2 * 60 变成 11
+    max_count = _share_counts(difficulty.get('max_share') or {}, total, '难度占比上限',
+                              lambda x: math.floor(x + 1e-9))
+    min_count = _share_counts(difficulty.get('min_share') or {}, total, '难度占比下限',
+                              lambda x: math.ceil(x - 1e-9))
+
+    exclude_recent = _number(data.get('exclude_recent_papers', 0), '排除的最近试卷数量')
+    if exclude_recent < 0:
+        raise BlueprintError('排除的最近试卷数量不能为负数')
+
+    chapters = data.get('chapters')
+    if chapters not in (None, 'all'):
+        if not isinstance(chapters, list) or not all(isinstance(c, str) for c in chapters):
+            raise BlueprintError('chapters 必须是 "all" 或章节名称列表')
+        chapters = list(dict.fromkeys(chapters))
+
+    return {
+        'counts': counts,
+        'total': total,
+        'average': average,
+        'tolerance': tolerance,
+        'max_count': max_count,
+        'min_count': min_count,
+        'exclude_recent': exclude_recent,
+        'chapters': chapters,
+    }
+
+
+def recent_question_ids(conn, library_id, paper_count):
+    """题库最近 paper_count 份试卷中使用过的题目 id"""
+    rows = conn.execute(
+        'SELECT question_id FROM paper_questions WHERE paper_id IN '
+        '(SELECT id FROM papers WHERE library_id = ? ORDER BY created_at DESC, id DESC LIMIT ?)',
+        [library_id, paper_count]
+    )
+    return {row[0] for row in rows}
+
+
+def load_cells(conn, library_id, blueprint, excluded=()):
+    """
+    按 (章节, 题型, 难度) 分组统计候选题目，走 (library_id, chapter, question_type, difficulty) 覆盖索引。
+
+    返回分组列表，每个分组为 [章节, 题型, 难度, 题目总数, 可用数量]，可用数量已扣除 excluded 中的题目。
+    """
+    cells = {}
+    rows = conn.execute(
+        'SELECT chapter, question_type, difficulty, COUNT(*) FROM questions WHERE library_id = ? '
+        'GROUP BY chapter, question_type, difficulty',
+        [library_id]
+    )
+    for chapter, question_type, difficulty, count in rows:
+        cells[(chapter, question_type, difficulty)] = [chapter, question_type, difficulty, count, count]
+
+    excluded = list(excluded)
+    for start in range(0, len(excluded), 500):
+        chunk = excluded[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'SELECT chapter, question_type, difficulty, COUNT(*) FROM questions '
+            f'WHERE library_id = ? AND id IN ({placeholders}) GROUP BY chapter, question_type, difficulty',
+            [library_id] + chunk
+        )
+        for chapter, question_type, difficulty, count in rows:
+            cells[(chapter, question_type, difficulty)][4] -= count
+
+    any_type = ANY_TYPE in blueprint['counts']
+    return [cell for cell in cells.values()
+            if cell[4] > 0 and cell[2] in DIFFICULTY_SCORES and (any_type or cell[1] in blueprint['counts'])]
+
+
+class _Solver:
+    """在分组上求解每组选题数量：贪心构造加局部搜索"""
+
+    def __init__(self, blueprint, cells, required, rng):
+        self.bp = blueprint
+        self.rng = rng
+        self.total = blueprint['total']
+        any_type = ANY_TYPE in blueprint['counts']
+
+        # 分组信息拆成并列的列表：分组（题型或 ANY_TYPE）、难度分值、章节、可用数量
+        self.groups = [ANY_TYPE if any_type else cell[1] for cell in cells]
+        self.scores = [DIFFICULTY_SCORES[cell[2]] for cell in cells]
+        self.chapters_of = [cell[0] for cell in cells]
+        self.capacity = [cell[4] for cell in cells]
+        self.taken = [0] * len(cells)
+
+        self.by_level = {group: {1: [], 2: [], 3: []} for group in blueprint['counts']}
+        self.by_chapter = {}
+        for i, group in enumerate(self.groups):
+            self.by_level[group][self.scores[i]].append(i)
+            if self.chapters_of[i] is not None:
+                self.by_chapter.setdefault(self.chapters_of[i], []).append(i)
+
+        # 章节按名称排序，保证同一种子的结果可复现
+        self.chapters = sorted(required)
+        self.required = set(required)
+
+        self.units = []  # 每道已选题目所在的分组
+        self.level_counts = {1: 0, 2: 0, 3: 0}
+        self.score_sum = 0
+        self.chapter_counts = {}
+        self.uncovered = len(required)
+
+    # 状态维护
+    def _count(self, i, delta):
+        score, chapter = self.scores[i], self.chapters_of[i]
+        self.taken[i] += delta
+        self.level_counts[score] += delta
+        self.score_sum += score * delta
+        if chapter in self.required:
+            n = self.chapter_counts.get(chapter, 0)
+            self.chapter_counts[chapter] = n + delta
+            if n == 0 and delta > 0:
+                self.uncovered -= 1
+            elif n + delta == 0:
+                self.uncovered += 1
+
+    def _add(self, i):
+        self.units.append(i)
+        self._count(i, 1)
+
+    def _free(self, indexes):
+        return sum(self.capacity[i] - self.taken[i] for i in indexes)
+
+    def _pick(self, indexes):
+        """按剩余可用数量加权随机选择一个分组"""
+        indexes = [i for i in indexes if self.taken[i] < self.capacity[i]]
+        if not indexes:
+            return None
+        weights = [self.capacity[i] - self.taken[i] for i in indexes]
+        return self.rng.choices(indexes, weights)[0]
+
+    def penalty(self):
+        """约束违反量，为 0 表示满足所有约束"""
+        bp = self.bp
+        value = self.uncovered
+        if bp['average'] is not None:
+            deviation = abs(self.score_sum / self.total - bp['average']) - bp['tolerance']
+            if deviation > 1e-9:
+                value += deviation * self.total
+        for score, limit in bp['max_count'].items():
+            value += max(0, self.level_counts[score] - limit)
+        for score, limit in bp['min_count'].items():
+            value += max(0, limit - self.level_counts[score])
+        return value
+
+    # 贪心构造
+    def _level_allowed(self, score, slots_after):
+        """选择该难度后，剩余题目是否仍可能满足难度约束"""
+        bp = self.bp
+        if self.level_counts[score] >= bp['max_count'].get(score, self.total):
+            return False
+        deficit = sum(max(0, limit - self.level_counts[s] - (s == score)) for s, limit in bp['min_count'].items())
+        if deficit > slots_after:
+            return False
+        if bp['average'] is not None:
+            low = (self.score_sum + score + slots_after) / self.total
+            high = (self.score_sum + score + 3 * slots_after) / self.total
+            if low > bp['average'] + bp['tolerance'] + 1e-9 or high < bp['average'] - bp['tolerance'] - 1e-9:
+                return False
+        return True
+
+    def construct(self):
+        remaining = dict(self.bp['counts'])
+
+        # 先为每个章节选一道题，候选少的章节优先
+        for chapter in sorted(self.chapters, key=lambda c: self._free(self.by_chapter.get(c, ()))):
+            if self.chapter_counts.get(chapter):
+                continue
+            options = [i for i in self.by_chapter.get(chapter, ()) if remaining[self.groups[i]]]
+            slots_after = self.total - len(self.units) - 1
+            allowed = [i for i in options if self._level_allowed(self.scores[i], slots_after)]
+            i = self._pick(allowed) if allowed else None
+            if i is None:
+                i = self._pick(options)
+            if i is not None:
+                self._add(i)
+                remaining[self.groups[i]] -= 1
+
+        # 再逐题选择难度，难度按剩余可用数量加权随机选择
+        target = self.bp['average'] or 2
+        for group, count in remaining.items():
+            levels = self.by_level[group]
+            for _ in range(count):
+                slots_after = self.total - len(self.units) - 1
+                free = {s: self._free(levels[s]) for s in (1, 2, 3)}
+                allowed = [s for s in (1, 2, 3) if free[s] and self._level_allowed(s, slots_after)]
+                if allowed:
+                    score = self.rng.choices(allowed, [free[s] for s in allowed])[0]
+                else:
+                    score = min((s for s in (1, 2, 3) if free[s]), key=lambda s: abs(s - target))
+                self._add(self._pick(levels[score]))
+
+    # 局部搜索
+    def _propose(self):
+        """生成一次替换：返回 (已选题目序号, 目标分组)"""
+        if self.uncovered and self.rng.random() < 0.5:
+            chapter = self.rng.choice([c for c in self.chapters if not self.chapter_counts.get(c)])
+            j = self._pick(self.by_chapter.get(chapter, ()))
+            if j is None:
+                return None, None
+            positions = [k for k, i in enumerate(self.units) if self.groups[i] == self.groups[j]]
+            return (self.rng.choice(positions) if positions else None), j
+        k = self.rng.randrange(len(self.units))
+        return k, self._pick(self.by_level[self.groups[self.units[k]]][self.rng.choice((1, 2, 3))])
+
+    def search(self, time_limit=SEARCH_TIME_LIMIT, max_steps=SEARCH_MAX_STEPS):
+        current = self.penalty()
+        deadline = time.perf_counter() + time_limit
+        steps = 0
+        while current > 1e-9 and steps < max_steps:
+            steps += 1
+            if steps % 256 == 0 and time.perf_counter() > deadline:
+                break
+            k, j = self._propose()
+            if k is None or j is None or self.units[k] == j:
+                continue
+            i = self.units[k]
+            self._count(i, -1)
+            self._count(j, 1)
+            value = self.penalty()
+            # 接受更优解，偶尔接受相同违反量的解以跳出平台
+            if value < current - 1e-9 or (value <= current + 1e-9 and self.rng.random() < 0.2):
+                self.units[k] = j
+                current = value
+            else:
+                self._count(j, -1)
+                self._count(i, 1)
+        return steps
+
+    def violations(self):
+        """当前解违反的约束说明"""
+        bp = self.bp
+        reasons = []
+        if bp['average'] is not None:
+            average = self.score_sum / self.total
+            if abs(average - bp['average']) - bp['tolerance'] > 1e-9:
+                reasons.append(f'平均难度为 {average:.2f}，超出目标 {bp["average"]:.2f}±{bp["tolerance"]:.2f}')
+        for score, limit in bp['max_count'].items():
+            if self.level_counts[score] > limit:
+                reasons.append(f'{_difficulty_name(score)}题 {self.level_counts[score]} 道，超过上限 {limit} 道')
+        for score, limit in bp['min_count'].items():
+            if self.level_counts[score] < limit:
+                reasons.append(f'{_difficulty_name(score)}题 {self.level_counts[score]} 道，少于下限 {limit} 道')
+        missing = [c for c in self.chapters if not self.chapter_counts.get(c)]
+        if missing:
+            reasons.append(f'未覆盖章节：{"、".join(missing)}')
+        return reasons
+
+
+def _type_name(group):
+    return '所有题型' if group == ANY_TYPE else Config.QUESTION_TYPES[group]
+
+
+def _fill_score(sizes, count, order):
+    """按 order 的难度顺序依次选满 count 道题时的难度分值之和"""
+    total = 0
+    for score in order:
+        take = min(count, sizes[score])
+        total += take * score
+        count -= take
+    return total
+
+
+def _bounded_fill_score(sizes, count, order, max_count, min_count):
+    """先满足各难度数量下限，再按 order 的难度顺序在数量上限内选满 count 道题时的难度分值之和"""
+    taken = {score: min(min_count.get(score, 0), sizes[score]) for score in (1, 2, 3)}
+    count -= sum(taken.values())
+    for score in order:
+        extra = max(0, min(count, sizes[score] - taken[score], max_count.get(score, sizes[score]) - taken[score]))
+        taken[score] += extra
+        count -= extra
+    return sum(score * n for score, n in taken.items())
+
+
+def _precheck(blueprint, cells, required, excluded):
+    """求解前检查明显无法满足的约束"""
+    reasons = []
+    note = f'（已排除最近试卷中的 {len(excluded)} 道题）' if excluded else ''
+    any_type = ANY_TYPE in blueprint['counts']
+    sizes = {group: {1: 0, 2: 0, 3: 0} for group in blueprint['counts']}
+    chapter_sizes = {}
+    for chapter, question_type, difficulty, _, available in cells:
+        sizes[ANY_TYPE if any_type else question_type][DIFFICULTY_SCORES[difficulty]] += available
+        chapter_sizes[chapter] = chapter_sizes.get(chapter, 0) + available
+    level_sizes = {s: sum(levels[s] for levels in sizes.values()) for s in (1, 2, 3)}
+
+    for group, count in blueprint['counts'].items():
+        available = sum(sizes[group].values())
+        if available < count:
+            reasons.append(f'{_type_name(group)}可用题目 {available} 道，需要 {count} 道{note}')
+
+    for chapter in sorted(required):
+        if not chapter_sizes.get(chapter):
+            reasons.append(f'章节“{chapter}”在所选题型中没有可用题目')
+    if len(required) > blueprint['total']:
+        reasons.append(f'需要覆盖 {len(required)} 个章节，但试卷只有 {blueprint["total"]} 道题')
+
+    max_count, min_count = blueprint['max_count'], blueprint['min_count']
+    if sum(min_count.values()) > blueprint['total']:
+        reasons.append('各难度的最低数量之和超过了题目总数')
+    capped = sum(min(level_sizes[s], max_count.get(s, level_sizes[s])) for s in (1, 2, 3))
+    if capped < blueprint['total'] <= sum(level_sizes.values()):
+        reasons.append('难度占比上限过低，凑不够题目总数')
+    for score, limit in min_count.items():
+        if limit > max_count.get(score, limit):
+            reasons.append(f'{_difficulty_name(score)}题至少需要 {limit} 道，但上限只有 {max_count[score]} 道')
+        if level_sizes[score] < limit:
+            reasons.append(f'{_difficulty_name(score)}题只有 {level_sizes[score]} 道，至少需要 {limit} 道')
+    if reasons:
+        return reasons
+
+    # 平均难度可达范围：每个题型都选最简单/最难的题目，并考虑各难度数量的上下限
+    average = blueprint['average']
+    if average is not None:
+        total = blueprint['total']
+        lowest = max(
+            sum(_fill_score(sizes[group], count, (1, 2, 3)) for group, count in blueprint['counts'].items()),
+            _bounded_fill_score(level_sizes, total, (1, 2, 3), max_count, min_count)
+        ) / total
+        highest = min(
+            sum(_fill_score(sizes[group], count, (3, 2, 1)) for group, count in blueprint['counts'].items()),
+            _bounded_fill_score(level_sizes, total, (3, 2, 1), max_count, min_count)
+        ) / total
+        # 难度分值之和只能是整数
+        if math.ceil((average - blueprint['tolerance']) * total - 1e-9) > math.floor((average + blueprint['tolerance']) * total + 1e-9):
+            reasons.append(f'{total} 道题的平均难度无法落在 {average:.2f}±{blueprint["tolerance"]:.2f} 内，请放宽偏差')
+        if lowest > average + blueprint['tolerance'] + 1e-9:
+            reasons.append(f'在现有约束下平均难度最低只能到 {lowest:.2f}，高于目标上限')
+        if highest < average - blueprint['tolerance'] - 1e-9:
+            reasons.append(f'在现有约束下平均难度最高只能到 {highest:.2f}，低于目标下限')
+    return reasons
+
+
+def _draw_cell_ids(conn, library_id, cell, count, excluded, rng):
+    """
+    在分组内随机抽取 count 道题目的 id，跳过 excluded 中的题目。
+    候选较多时在分组的 id 范围内随机探测（方法与 app.sampling.QuestionSampler 相同），
+    否则通过覆盖索引一次读出分组内的全部 id 再抽样
+    """
+    chapter, question_type, difficulty, size, available = cell
+    where = 'library_id = ? AND chapter IS ? AND question_type = ? AND difficulty = ?'
+    params = [library_id, chapter, question_type, difficulty]
+
+    def probe(condition, value):
+        row = conn.execute(f'SELECT id FROM questions WHERE {where} AND {condition}', params + [value]).fetchone()
+        return row[0] if row is not None else None
+
+    probe_cost = count * 2 * PROBE_COST
+    if probe_cost < size and count + size - available <= size * MAX_PROBE_FRACTION:
+        lo = probe('id >= ? ORDER BY id LIMIT 1', 0)
+        hi = probe('id <= ? ORDER BY id DESC LIMIT 1', 2 ** 63 - 1)
+        if lo is not None and probe_cost * (hi - lo + 1) / size < size:
+            ids = []
+            seen = set(excluded)
+            attempts = 0
+            # 探测次数超过分组大小时（组卷过程中分组内的题目被删除）改为读出全部 id
+            while len(ids) < count and attempts < size:
+                attempts += 1
+                candidate = probe('id >= ? ORDER BY id LIMIT 1', rng.randint(lo, hi))
+                if candidate is None:
+                    continue
+                previous = probe('id < ? ORDER BY id DESC LIMIT 1', candidate)
+                gap = candidate - (lo - 1 if previous is None else previous)
+                # 按 1/间隔 接受，保证分组内每道题被抽中的概率相同
+                if gap > 1 and rng.random() * gap >= 1:
+                    continue
+                if candidate not in seen:
+                    seen.add(candidate)
+                    ids.append(candidate)
+            if len(ids) == count:
+                return ids
+
+    ids = [row[0] for row in conn.execute(f'SELECT id FROM questions WHERE {where} ORDER BY id', params)
+           if row[0] not in excluded]
+    return rng.sample(ids, min(count, len(ids)))
+
+
+def assemble(conn, library_id, blueprint, seed=None):
+    """
+    按蓝图从题库中选题。
+
+    返回字典：question_ids（按题型顺序排列）、seed 和统计信息 stats；
+    约束无法满足时抛出 AssemblyError。
+    """
+    started = time.perf_counter()
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 31)
+    rng = random.Random(seed)
+
+    excluded = recent_question_ids(conn, library_id, blueprint['exclude_recent']) if blueprint['exclude_recent'] else set()
+    cells = load_cells(conn, library_id, blueprint, excluded)
+    if blueprint['chapters'] == 'all':
+        required = {cell[0] for cell in cells if cell[0] is not None}
+    else:
+        required = set(blueprint['chapters'] or ())
+
+    reasons = _precheck(blueprint, cells, required, excluded)
+    if reasons:
+        raise AssemblyError(reasons)
+
+    solver = _Solver(blueprint, cells, required, rng)
+    solver.construct()
+    steps = solver.search()
+    reasons = solver.violations()
+    if reasons:
+        raise AssemblyError(['在时间限制内没有找到满足所有约束的组合'] + reasons)
+
+    chosen = []
+    for i, cell in enumerate(cells):
+        if solver.taken[i]:
+            chosen.extend((question_id, cell[1]) for question_id in
+                          _draw_cell_ids(conn, library_id, cell, solver.taken[i], excluded, rng))
+    if len(chosen) < blueprint['total']:
+        raise AssemblyError(['组卷过程中题库发生了变化，请重试'])
+    rng.shuffle(chosen)
+    type_order = {question_type: i for i, question_type in enumerate(Config.QUESTION_TYPES)}
+    chosen.sort(key=lambda c: type_order.get(c[1], len(type_order)))
+    return {
+        'question_ids': [question_id for question_id, _ in chosen],
+        'seed': seed,
+        'stats': {
+            'average_difficulty': round(solver.score_sum / blueprint['total'], 3),
+            'difficulties': {name: solver.level_counts[score] for name, score in DIFFICULTY_SCORES.items()},
+            'chapters_covered': len(required) - solver.uncovered,
+            'excluded_questions': len(excluded),
+            'search_steps': steps,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+    }
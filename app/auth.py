@@ -2,12 +2,13 @@
 """
 用户认证模块
 """
-import sqlite3
-import os
+from functools import wraps
 from flask import Blueprint, render_template, redirect, url_for, request, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
 from app import login_manager
+from app import database
+from app.user_cache import get_user_cache, invalidate_user
+from app.passwords import hash_password, needs_rehash, verify_password, PasswordVerifyBusy
 
 # 创建蓝图
 bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -34,39 +35,44 @@ class User:
 
 
 def get_db():
-    """获取数据库连接"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'app.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """获取当前请求的数据库连接"""
+    return database.get_db()
 
 
 def query_db(query, args=(), one=False):
     """执行查询并返回结果"""
-    conn = get_db()
-    cur = conn.execute(query, args)
+    cur = get_db().execute(query, args)
     rv = cur.fetchall()
-    conn.close()
+    cur.close()
     return (rv[0] if rv else None) if one else rv
 
 
 def execute_db(query, args=()):
     """执行SQL语句"""
     conn = get_db()
-    conn.execute(query, args)
+    cur = conn.execute(query, args)
     conn.commit()
-    conn.close()
+    return cur.lastrowid
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    """加载用户"""
-    user = query_db('SELECT * FROM users WHERE id = ?', [user_id], one=True)
+def fetch_user(user_id):
+    """从数据库加载用户"""
+    user = query_db('SELECT id, username, password, email, role_id FROM users WHERE id = ?', [user_id], one=True)
     if user:
         return User(user['id'], user['username'], user['password'], user['email'], user['role_id'])
     return None
 
 
+@login_manager.user_loader
+def load_user(user_id):
+    """加载用户，优先使用进程内缓存（见 app.user_cache）"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    return get_user_cache().get(user_id, fetch_user)
+
+
 def check_user_exists(username, email):
     """检查用户是否存在"""
     user = query_db('SELECT * FROM users WHERE username = ? OR email = ?', [username, email], one=True)
@@ -82,8 +88,21 @@ def login():
         
         # 查询用户
         user = query_db('SELECT * FROM users WHERE username = ?', [username], one=True)
+        # 验证密码可能要排队，先把连接还给连接池，集中登录时不占用其他请求的连接
+        database.close_db()
         
-        if user and check_password_hash(user['password'], password):
+        try:
+            valid = user is not None and verify_password(user['password'], password)
+        except PasswordVerifyBusy as e:
+            flash(str(e), 'warning')
+            return render_template('login.html'), 503
+        
+        if valid:
+            # 哈希算法或参数与配置不同时按当前配置重新生成
+            if needs_rehash(user['password']):
+                execute_db('UPDATE users SET password = ? WHERE id = ?', [hash_password(password), user['id']])
+                invalidate_user(user['id'])
+            
             # 创建用户对象
             user_obj = User(user['id'], user['username'], user['password'], user['email'], user['role_id'])
             
@@ -127,7 +146,7 @@ def register():
             return redirect(url_for('auth.register'))
         
         # 创建新用户
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        hashed_password = hash_password(password)
         execute_db(
             'INSERT INTO users (username, password, email, role_id) VALUES (?, ?, ?, ?)',
             [username, hashed_password, email, 2]  # 默认角色为普通用户
@@ -163,6 +182,7 @@ def profile():
 
 def admin_required(f):
     """管理员权限装饰器"""
+    @wraps(f)
     @login_required
     def decorated_function(*args, **kwargs):
         if not current_user.is_admin:
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+批量写入题目
+
+请求体为 NDJSON，每行一个操作：
+    {"op": "create", "question_text": "...", "answer_text": "...", "question_type": "single_choice", "difficulty": "easy"}
+    {"op": "update", "id": 12, "answer_text": "..."}    只修改给出的字段
+    {"op": "delete", "id": 12}
+chapter 为可选字段。请求体边读边执行，每 chunk_size 行在一个事务中写入并提交，
+提交后逐行输出结果 {"line": 行号, "op": ..., "success": ..., "id": 题目 id, "message": 失败原因}，
+最后输出一行汇总 {"done": true, "created": ..., "updated": ..., "deleted": ..., "failed": ...}。
+单行失败（格式错误、题型或难度无效、题库中已有相同题目、题目不存在）只影响该行，同一批的其他操作照常提交。
+"""
+import json
+import sqlite3
+from app.near_duplicates import simhash
+from app.render_cache import invalidate_questions
+from app.search import index_pending
+from app.utils import question_hash
+
+# update 可以修改的字段
+FIELDS = ('question_text', 'answer_text', 'question_type', 'difficulty', 'chapter')
+# 汇总中各操作的计数键
+SUMMARY_KEYS = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+# 读取请求体的块大小
+READ_SIZE = 64 * 1024
+
+
+class OperationError(ValueError):
+    """一行操作无效"""
+
+
+def iter_lines(stream):
+    """按块读取请求体并切分为行（werkzeug 的输入流按行迭代时逐字节读取，很慢）"""
+    pending = b''
+    while True:
+        block = stream.read(READ_SIZE)
+        if not block:
+            break
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def parse_operation(line, question_types, difficulties):
+    """解析并校验一行操作，返回 (操作, 字段)；无效时抛出 OperationError"""
+    try:
+        op = json.loads(line)
+    except ValueError:
+        raise OperationError('不是有效的 JSON')
+    if not isinstance(op, dict):
+        raise OperationError('每行必须是一个 JSON 对象')
+    kind = op.get('op')
+    if kind not in ('create', 'update', 'delete'):
+        raise OperationError('op 必须是 create、update 或 delete')
+    if kind != 'create' and type(op.get('id')) is not int:
+        raise OperationError('缺少题目 id')
+    if kind == 'delete':
+        return op, {}
+
+    fields = {name: op[name] for name in FIELDS if name in op}
+    if kind == 'create':
+        missing = [name for name in FIELDS[:4] if name not in fields]
+        if missing:
+            raise OperationError(f'缺少字段：{", ".join(missing)}')
+    elif not fields:
+        raise OperationError('没有要修改的字段')
+    for name in ('question_text', 'answer_text'):
+        if name in fields and (not isinstance(fields[name], str) or not fields[name].strip()):
+            raise OperationError('题目和答案不能为空')
+    # 先检查类型：列表、对象不能作为字典键查找
+    if 'question_type' in fields and (not isinstance(fields['question_type'], str)
+                                      or fields['question_type'] not in question_types):
+        raise OperationError('无效的题型')
+    if 'difficulty' in fields and (not isinstance(fields['difficulty'], str)
+                                   or fields['difficulty'] not in difficulties):
+        raise OperationError('无效的难度')
+    if 'chapter' in fields:
+        chapter = fields['chapter']
+        if chapter is not None and not isinstance(chapter, str):
+            raise OperationError('章节必须是字符串')
+        fields['chapter'] = (chapter.strip() or None) if chapter else None
+    return op, fields
+
+
+def apply_operation(conn, library_id, op, fields):
+    """在当前事务中执行一个操作，返回题目 id"""
+    if op['op'] == 'create':
+        text = fields['question_text']
+        return conn.execute(
+            'INSERT INTO questions (library_id, question_text, answer_text, question_type, difficulty, chapter, '
+            'question_hash, simhash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [library_id, text, fields['answer_text'], fields['question_type'], fields['difficulty'],
+             fields.get('chapter'), question_hash(text), simhash(text)]
+        ).lastrowid
+
+    if op['op'] == 'update':
+        if 'question_text' in fields:
+            fields['question_hash'] = question_hash(fields['question_text'])
+            fields['simhash'] = simhash(fields['question_text'])
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        cur = conn.execute(
+            f'UPDATE questions SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND library_id = ?',
+            [*fields.values(), op['id'], library_id]
+        )
+    else:
+        cur = conn.execute('DELETE FROM questions WHERE id = ? AND library_id = ?', [op['id'], library_id])
+    if not cur.rowcount:
+        raise OperationError('题目不存在')
+    return op['id']
+
+
+def apply_chunk(conn, library_id, chunk, question_types, difficulties):
+    """在一个事务中执行一批 (行号, 内容)，返回各行的结果"""
+    results = []
+    changed = []
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for number, line in chunk:
+            result = {'line': number}
+            try:
+                op, fields = parse_operation(line, question_types, difficulties)
+                result['op'] = op['op']
+                result['id'] = apply_operation(conn, library_id, op, fields)
+                result['success'] = True
+                if op['op'] != 'create':
+                    changed.append(op['id'])
+            except OperationError as e:
+                result.update(success=False, message=str(e))
+            except sqlite3.IntegrityError:
+                # 单条语句失败时 SQLite 只回滚该语句，事务中的其他操作不受影响
+                result.update(success=False, message='题库中已存在相同的题目')
+            results.append(result)
+        index_pending(conn)
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        return [{'line': number, 'success': False, 'message': f'写入失败：{e}'} for number, _ in chunk]
+    except Exception:
+        conn.rollback()
+        raise
+    if changed:
+        invalidate_questions(conn, changed)
+    return results
+
+
+def apply_batch(conn, library_id, lines, question_types, difficulties, chunk_size=1000):
+    """逐行执行操作，生成每行的结果，最后生成汇总；空行跳过（仍计入行号）"""
+    summary = {'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+    chunk = []
+
+    def flush():
+        for result in apply_chunk(conn, library_id, chunk, question_types, difficulties):
+            if result['success']:
+                summary[SUMMARY_KEYS[result['op']]] += 1
+            else:
+                summary['failed'] += 1
+            yield result
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        chunk.append((number, line))
+        if len(chunk) >= chunk_size:
+            yield from flush()
+            chunk = []
+    if chunk:
+        yield from flush()
+    yield {'done': True, **summary}
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+数据库连接模块
+
+每个进程持有一个有界的 SQLite 连接池，每个请求（应用上下文）从池中取出一个连接，
+保存在 ``g._database`` 上，并在应用上下文销毁时归还。
+"""
+import importlib.util
+import os
+import queue
+import sqlite3
+import threading
+import click
+from flask import current_app, g
+from flask.cli import with_appcontext
+from app import metrics
+from app.search import search_tokens, search_tags
+from app.near_duplicates import simhash
+
+# 迁移脚本目录，文件名形如 0002_indexes.sql；需要在 Python 中回填数据的迁移使用 .py 文件，提供 upgrade(conn)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+
+class PoolTimeout(RuntimeError):
+    """连接池在等待时间内没有空闲连接"""
+
+
+def connect(database, pragmas=None):
+    """
+    创建一个新的数据库连接并设置 PRAGMA，连接上的语句由 metrics.TimedConnection 计时。注册的 fts_tokens/fts_tags/question_simhash 函数
+    只在执行 0012、0013 迁移时使用，现在的触发器都是纯 SQL，不需要这些函数
+    """
+    conn = sqlite3.connect(database, check_same_thread=False, factory=metrics.TimedConnection)
+    conn.row_factory = sqlite3.Row
+    conn.create_function('fts_tokens', 1, search_tokens, deterministic=True)
+    conn.create_function('fts_tags', 3, search_tags, deterministic=True)
+    conn.create_function('question_simhash', 1, simhash, deterministic=True)
+    for name, value in (pragmas or {}).items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+class ConnectionPool:
+    """有界连接池，连接在创建时设置一次 PRAGMA，之后重复使用"""
+
+    def __init__(self, database, size=8, timeout=10, pragmas=None):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(pragmas or {})
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        """取出一个连接，池满时最多等待 timeout 秒"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f'等待数据库连接超时（连接池大小 {self.size}）')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return connect(self.database, self.pragmas)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        """归还连接，未提交的事务会被回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def get_pool(app=None):
+    """获取当前进程的连接池，fork 之后会重新创建"""
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get('sqlite_pool')
+    if pool is None or pool.pid != os.getpid():
+        pool = ConnectionPool(
+            app.config['DATABASE'],
+            size=app.config['DB_POOL_SIZE'],
+            timeout=app.config['DB_POOL_TIMEOUT'],
+            pragmas=app.config['DB_PRAGMAS']
+        )
+        app.extensions['sqlite_pool'] = pool
+    return pool
+
+
+def get_db():
+    """获取当前请求的数据库连接"""
+    if '_database' not in g:
+        g._database = get_pool().acquire()
+    return g._database
+
+
+def close_db(exception=None):
+    """应用上下文结束时归还数据库连接"""
+    conn = g.pop('_database', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+def list_migrations(migrations_dir=MIGRATIONS_DIR):
+    """按版本号列出迁移脚本 [(version, name, path)]"""
+    migrations = []
+    for filename in sorted(os.listdir(migrations_dir)):
+        stem, ext = os.path.splitext(filename)
+        version, _, name = stem.partition('_')
+        if ext in ('.sql', '.py') and version.isdigit():
+            migrations.append((int(version), name, os.path.join(migrations_dir, filename)))
+    return sorted(migrations)
+
+
+def split_sql(script):
+    """把SQL脚本拆分成单条语句（触发器内的分号不会被拆开）"""
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ''
+
+
+def upgrade_db(conn, migrations_dir=MIGRATIONS_DIR):
+    """依次执行尚未应用的迁移，返回本次应用的版本号列表
+
+    每个迁移在一个 IMMEDIATE 事务中执行并记录到 schema_migrations，
+    多个进程同时启动时只有一个会真正执行。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+    applied = []
+    for version, name, path in list_migrations(migrations_dir):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            done = conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', [version]).fetchone()
+            if done:
+                conn.rollback()
+                continue
+            if path.endswith('.py'):
+                spec = importlib.util.spec_from_file_location(f'migration_{version:04d}', path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                module.upgrade(conn)
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for statement in split_sql(f.read()):
+                        conn.execute(statement)
+            conn.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', [version, name])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+@click.command('db-upgrade')
+@with_appcontext
+def upgrade_db_command():
+    """执行数据库迁移"""
+    applied = upgrade_db(get_db())
+    if applied:
+        click.echo(f'已应用迁移：{", ".join(str(v) for v in applied)}')
+    else:
+        click.echo('数据库已是最新版本')
+
+
+def init_app(app):
+    """注册数据库连接的清理函数和命令行命令"""
+    app.teardown_appcontext(close_db)
+    app.cli.add_command(upgrade_db_command)
+
+    if app.config.get('AUTO_MIGRATE'):
+        with app.app_context():
+            upgrade_db(get_db())
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Word (.docx) 题目文件流式读取模块
+
+直接从 zip 包中流式读取 word/document.xml，使用增量 XML 解析逐段产出文本行，
+不构建 python-docx 的文档对象树。输出的文本行与 Markdown/文本文件的行格式一致：
+自动编号会还原为 "1. "、"A. " 等前缀，标题样式转换为 "#" 前缀，可直接交给 iter_questions 解析。
+
+内嵌图片：指定 media_folder 时按内容哈希保存到该目录（同一图片只保存一份），转换为指向
+MEDIA_URL（由 routes.question_media 提供）的 Markdown 图片标记；未指定时输出 "[图片]" 占位文本。
+上传的 .docx 在导入后会被删除，不能引用文件内部的路径。
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+V_NS = 'urn:schemas-microsoft-com:vml'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+
+def _w(tag):
+    return f'{{{W_NS}}}{tag}'
+
+
+P, T, TAB, BR, CR = _w('p'), _w('t'), _w('tab'), _w('br'), _w('cr')
+PPR, PSTYLE, NUMPR, ILVL, NUMID, VAL = _w('pPr'), _w('pStyle'), _w('numPr'), _w('ilvl'), _w('numId'), _w('val')
+TBL, BODY = _w('tbl'), _w('body')
+BLIP = f'{{{A_NS}}}blip'
+IMAGEDATA = f'{{{V_NS}}}imagedata'
+R_EMBED, R_ID = f'{{{R_NS}}}embed', f'{{{R_NS}}}id'
+
+CHINESE_DIGITS = '零一二三四五六七八九'
+# 导入图片的访问路径前缀，图片文件名为内容的 SHA-1 加扩展名
+MEDIA_URL = '/questions/media/'
+# 保存的图片类型，其他类型（如可能包含脚本的 SVG）输出占位文本
+MEDIA_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tif', '.tiff', '.emf', '.wmf'}
+IMAGE_PLACEHOLDER = '[图片]'
+# 标题样式名：内置样式为 "heading 1"、"Title"，没有 styles.xml 时按 styleId（"Heading1"）匹配
+HEADING_STYLE_PATTERN = re.compile(r'^(?:heading|标题)\s*(\d+)$|^(?:title|标题)$', re.IGNORECASE)
+
+
+def _chinese_number(n):
+    """把 1-99 转换为中文数字"""
+    if n < 10:
+        return CHINESE_DIGITS[n]
+    tens, ones = divmod(n, 10)
+    text = ('' if tens == 1 else CHINESE_DIGITS[tens]) + '十'
+    return text + (CHINESE_DIGITS[ones] if ones else '')
+
+
+def _letter(n, upper):
+    """1 -> a, 27 -> aa（与 Word 的字母编号一致）"""
+    base = ord('A' if upper else 'a')
+    return chr(base + (n - 1) % 26) * ((n - 1) // 26 + 1)
+
+
+def _roman(n, upper):
+    values = [(1000, 'm'), (900, 'cm'), (500, 'd'), (400, 'cd'), (100, 'c'), (90, 'xc'),
+              (50, 'l'), (40, 'xl'), (10, 'x'), (9, 'ix'), (5, 'v'), (4, 'iv'), (1, 'i')]
+    text = ''
+    for value, numeral in values:
+        while n >= value:
+            text += numeral
+            n -= value
+    return text.upper() if upper else text
+
+
+def format_number(n, num_fmt):
+    """按 Word 的 numFmt 格式化编号"""
+    if num_fmt in ('lowerLetter', 'upperLetter'):
+        return _letter(n, num_fmt == 'upperLetter')
+    if num_fmt in ('lowerRoman', 'upperRoman'):
+        return _roman(n, num_fmt == 'upperRoman')
+    if num_fmt in ('chineseCounting', 'chineseCountingThousand', 'ideographTraditional', 'japaneseCounting'):
+        return _chinese_number(n) if n < 100 else str(n)
+    if num_fmt == 'bullet':
+        return ''
+    return str(n)
+
+
+def _read_relationships(archive):
+    """读取 document.xml 的关系表 {rId: 目标路径}"""
+    try:
+        data = archive.read('word/_rels/document.xml.rels')
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in ET.fromstring(data).iter(f'{{{PKG_REL_NS}}}Relationship'):
+        rels[rel.get('Id')] = rel.get('Target')
+    return rels
+
+
+def _read_numbering(archive):
+    """读取编号定义 {numId: {ilvl: (numFmt, lvlText, start)}}"""
+    try:
+        data = archive.read('word/numbering.xml')
+    except KeyError:
+        return {}
+    root = ET.fromstring(data)
+
+    abstract = {}
+    for abstract_num in root.iter(_w('abstractNum')):
+        levels = {}
+        for lvl in abstract_num.iter(_w('lvl')):
+            num_fmt = lvl.find(_w('numFmt'))
+            lvl_text = lvl.find(_w('lvlText'))
+            start = lvl.find(_w('start'))
+            levels[int(lvl.get(_w('ilvl'), 0))] = (
+                num_fmt.get(VAL) if num_fmt is not None else 'decimal',
+                lvl_text.get(VAL) if lvl_text is not None else f'%{int(lvl.get(_w("ilvl"), 0)) + 1}.',
+                int(start.get(VAL)) if start is not None else 1
+            )
+        abstract[abstract_num.get(_w('abstractNumId'))] = levels
+
+    numbering = {}
+    for num in root.iter(_w('num')):
+        ref = num.find(_w('abstractNumId'))
+        if ref is not None:
+            numbering[num.get(_w('numId'))] = abstract.get(ref.get(VAL), {})
+    return numbering
+
+
+class _Numbering:
+    """按 (numId, ilvl) 维护列表编号计数"""
+
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self.counters = {}
+
+    def label(self, num_id, ilvl):
+        levels = self.definitions.get(num_id)
+        if not levels or ilvl not in levels:
+            return ''
+        counters = self.counters.setdefault(num_id, {})
+        num_fmt, lvl_text, start = levels[ilvl]
+        counters[ilvl] = counters.get(ilvl, start - 1) + 1
+        # 上级编号递增后，下级编号重新开始
+        for deeper in [level for level in counters if level > ilvl]:
+            del counters[deeper]
+        if num_fmt == 'bullet':
+            return '- '
+        text = lvl_text
+        for level, (fmt, _, level_start) in levels.items():
+            placeholder = f'%{level + 1}'
+            if placeholder in text:
+                text = text.replace(placeholder, format_number(counters.get(level, level_start), fmt))
+        return text + ' '
+
+
+def _heading_prefix(name):
+    """标题样式（按样式名，如 "heading 2"、"Title"、"标题 2"）转换为 Markdown 标题前缀"""
+    if not name:
+        return ''
+    match = HEADING_STYLE_PATTERN.match(name.strip())
+    if not match:
+        return ''
+    level = int(match.group(1) or 1)
+    return '#' * min(level, 6) + ' '
+
+
+def _read_styles(archive):
+    """
+    读取 styles.xml，返回样式中定义的编号 {styleId: (numId, ilvl)}（如 "List Number" 样式）
+    和各样式对应的标题前缀 {styleId: 前缀}
+    """
+    try:
+        data = archive.read('word/styles.xml')
+    except KeyError:
+        return {}, {}
+    numbering, headings = {}, {}
+    for style in ET.fromstring(data).iter(_w('style')):
+        style_id = style.get(_w('styleId'))
+        # 中文版 Word 的 styleId 是 "1"、"2"、"a3" 等，按样式名（"heading 1"、"Title"）判断标题
+        name = style.find(_w('name'))
+        headings[style_id] = _heading_prefix(name.get(VAL) if name is not None else style_id)
+        num_pr = style.find(f'{PPR}/{NUMPR}')
+        if num_pr is None:
+            continue
+        num_id = num_pr.find(NUMID)
+        ilvl = num_pr.find(ILVL)
+        if num_id is not None:
+            numbering[style_id] = (num_id.get(VAL), int(ilvl.get(VAL, 0)) if ilvl is not None else 0)
+    return numbering, headings
+
+
+def save_media(archive, path, media_folder):
+    """把 docx 包内的图片按内容哈希保存到 media_folder，返回文件名；不是支持的图片类型或不存在时返回 None"""
+    ext = posixpath.splitext(path)[1].lower()
+    if ext not in MEDIA_EXTENSIONS:
+        return None
+    try:
+        data = archive.read(path)
+    except KeyError:
+        return None
+    name = hashlib.sha1(data).hexdigest() + ext
+    target = os.path.join(media_folder, name)
+    if not os.path.exists(target):
+        os.makedirs(media_folder, exist_ok=True)
+        # 先写临时文件再替换，多个导入进程同时保存同一图片时不会读到不完整的文件
+        fd, temp_path = tempfile.mkstemp(dir=media_folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, target)
+    return name
+
+
+def iter_docx_lines(stream, media_folder=None):
+    """从 .docx 文件（路径或可 seek 的二进制流）中逐段产出文本行，图片保存到 media_folder（见模块说明）"""
+    with zipfile.ZipFile(stream) as archive:
+        rels = _read_relationships(archive)
+        images = {}  # 包内路径 -> 图片标记
+        numbering = _Numbering(_read_numbering(archive))
+        style_numbering, style_headings = _read_styles(archive)
+
+        with archive.open('word/document.xml') as document:
+            parents = []
+            paragraphs = []  # 段落状态栈（文本框中可能嵌套段落）
+
+            for event, elem in ET.iterparse(document, events=('start', 'end')):
+                if event == 'start':
+                    parents.append(elem)
+                    if elem.tag == P:
+                        paragraphs.append({'parts': [], 'style': None, 'num_id': None, 'ilvl': 0})
+                    continue
+
+                parents.pop()
+                tag = elem.tag
+                paragraph = paragraphs[-1] if paragraphs else None
+                if paragraph is None:
+                    pass
+                elif tag == T:
+                    paragraph['parts'].append(elem.text or '')
+                elif tag == TAB:
+                    if parents and parents[-1].tag != _w('tabs'):
+                        paragraph['parts'].append('\t')
+                elif tag in (BR, CR):
+                    paragraph['parts'].append('\n')
+                elif tag == PSTYLE:
+                    paragraph['style'] = elem.get(VAL)
+                elif tag == ILVL:
+                    paragraph['ilvl'] = int(elem.get(VAL, 0))
+                elif tag == NUMID:
+                    paragraph['num_id'] = elem.get(VAL)
+                elif tag in (BLIP, IMAGEDATA):
+                    target = rels.get(elem.get(R_EMBED) or elem.get(R_ID))
+                    if target:
+                        path = posixpath.normpath(posixpath.join('word', target))
+                        if path not in images:
+                            name = save_media(archive, path, media_folder) if media_folder else None
+                            images[path] = f'![图片]({MEDIA_URL}{name})' if name else IMAGE_PLACEHOLDER
+                        paragraph['parts'].append(images[path])
+                elif tag == P:
+                    paragraphs.pop()
+                    style = paragraph['style']
+                    prefix = style_headings[style] if style in style_headings else _heading_prefix(style)
+                    num_id, ilvl = paragraph['num_id'], paragraph['ilvl']
+                    if num_id is None and style in style_numbering:
+                        num_id, ilvl = style_numbering[style]
+                    if num_id and num_id != '0':
+                        prefix += numbering.label(num_id, ilvl)
+                    text = prefix + ''.join(paragraph['parts'])
+                    for line in text.split('\n'):
+                        yield line
+
+                # 段落和表格处理完毕后释放已解析的节点，保持内存占用稳定
+                if tag in (P, TBL):
+                    elem.clear()
+                    if parents and parents[-1].tag == BODY:
+                        parents[-1].remove(elem)
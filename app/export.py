@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+题库导出模块
+
+按 NDJSON、CSV 或 Markdown 格式流式导出一个题库的全部题目：游标按 (created_at, id) 顺序
+用 fetchmany 分批读取，每批格式化后立即交给响应输出，内存占用与题库大小无关，需要时边输出边 gzip 压缩。
+
+Markdown 使用 H4 标题格式 "#### 序号. 题型（难度）：题目"，可以通过题目导入重新导入，
+题型和难度按标签恢复。章节不导出；导入时空行表示简答题和论述题答案结束，这两种题型答案中的空行会被合并。
+"""
+import csv
+import io
+import json
+import zlib
+from config import Config
+
+EXPORT_COLUMNS = ('id', 'question_text', 'answer_text', 'question_type', 'difficulty', 'chapter',
+                  'created_at', 'updated_at')
+# 导出格式: 响应类型
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv', 'md': 'text/markdown'}
+# 每次从游标读取的行数
+FETCH_SIZE = 500
+# 答案中的空行会结束答案的题型（见 app.utils.iter_questions）
+BLANK_LINE_ENDS_ANSWER = ('short_answer', 'essay')
+
+
+def iter_library_rows(conn, library_id, fetch_size=FETCH_SIZE):
+    """按创建顺序分批读取题库中的题目，每次产出一批行"""
+    cur = conn.execute(
+        f'SELECT {", ".join(EXPORT_COLUMNS)} FROM questions WHERE library_id = ? ORDER BY created_at, id',
+        [library_id]
+    )
+    try:
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+
+
+def question_markdown(number, q):
+    """按 H4 标题格式输出一道题目，可以重新导入"""
+    label = Config.QUESTION_TYPES.get(q['question_type'], '简答题')
+    difficulty = Config.QUESTION_DIFFICULTIES.get(q['difficulty'])
+    if difficulty:
+        label += f'（{difficulty}）'
+    answer = q['answer_text']
+    if q['question_type'] in BLANK_LINE_ENDS_ANSWER:
+        answer = '\n'.join(line for line in answer.split('\n') if line.strip())
+    return f'#### {number}. {label}：{q["question_text"]}\n**答案：** {answer}\n\n'
+
+
+def iter_ndjson(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(row), ensure_ascii=False) + '\n' for row in rows)
+
+
+def iter_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 带 BOM，Excel 可以直接按 UTF-8 打开
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def iter_markdown(batches, title):
+    yield f'# {title}\n\n'
+    number = 0
+    for rows in batches:
+        chunk = []
+        for number, row in enumerate(rows, number + 1):
+            chunk.append(question_markdown(number, row))
+        yield ''.join(chunk)
+
+
+def iter_export(conn, library_id, library_name, export_format):
+    """按格式逐批产出导出文本"""
+    batches = iter_library_rows(conn, library_id)
+    if export_format == 'csv':
+        return iter_csv(batches)
+    if export_format == 'md':
+        return iter_markdown(batches, library_name)
+    return iter_ndjson(batches)
+
+
+def encode_chunks(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """边输出边压缩为 gzip 格式"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+后台导入任务模块
+
+上传的文件先保存到导入目录并登记到 import_jobs 表，再交给进程池中的工作进程解析和写入。
+zip 压缩包作为 archive 类型的任务，由工作进程再把其中的文件分发到多个进程并行解析。
+工作进程每写入一批题目就在同一事务中更新任务进度，前端通过 /questions/jobs/<id> 轮询。
+任务状态保存在数据库中，进程重启后未完成的任务会被重新执行（导入按哈希去重，可以安全重跑）。
+认领任务的工作进程 pid 记录在 worker_pid 中，该进程退出（或超过 IMPORT_JOB_STALE_SECONDS 秒没有进度）的
+running 任务会重新排队；pid 只能检查本机的进程，多台机器共用数据库时只能依赖超时。
+"""
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from app import database, metrics, slow_queries
+from app.archive_import import import_archive
+from app.utils import extract_questions_from_file
+
+# 进行中的任务状态
+ACTIVE_STATES = ('queued', 'running')
+
+
+class TooManyJobs(RuntimeError):
+    """用户进行中的导入任务达到上限"""
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(app=None, reset=False):
+    """获取当前进程的导入进程池"""
+    global _executor, _executor_pid
+    app = app or current_app._get_current_object()
+    with _executor_lock:
+        if reset or _executor is None or _executor_pid != os.getpid():
+            if _executor is not None and _executor_pid == os.getpid():
+                _executor.shutdown(wait=False, cancel_futures=False)
+            # 解析是CPU密集型的正则处理，使用进程池；spawn 避免从多线程的Web进程 fork
+            _executor = ProcessPoolExecutor(
+                max_workers=app.config['IMPORT_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def run_import_job(db_path, pragmas, job_id, options):
+    """在工作进程中执行导入任务"""
+    # 工作进程的解析耗时写入 METRICS_DIR，由 /metrics 汇总；慢查询写入与 Web 进程相同的日志
+    metrics.configure(options['metrics_enabled'], options['metrics_dir'])
+    slow_queries.configure(options['slow_query_seconds'], options['slow_query_log'])
+    conn = database.connect(db_path, pragmas)
+    try:
+        # 认领任务，避免多个进程重复执行同一个任务
+        cur = conn.execute(
+            "UPDATE import_jobs SET state = 'running', worker_pid = ?, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND state = 'queued'",
+            [os.getpid(), job_id]
+        )
+        conn.commit()
+        if not cur.rowcount:
+            return
+        job = conn.execute('SELECT * FROM import_jobs WHERE id = ?', [job_id]).fetchone()
+
+        def report(stats):
+            conn.execute(
+                'UPDATE import_jobs SET lines_processed = ?, questions_found = ?, inserted = ?, duplicates = ?, '
+                'near_duplicates = ?, failed = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                [stats['lines'], stats['parsed'], stats.get('inserted', 0), stats.get('duplicates', 0),
+                 stats.get('near_duplicates', 0), stats['failed'], job_id]
+            )
+
+        def report_files(files):
+            # 压缩包解析阶段每完成一个文件提交一次进度
+            report({key: sum(f.get(key, 0) for f in files) for key in ('lines', 'parsed', 'failed')})
+            conn.commit()
+
+        result = None
+        try:
+            if job['kind'] == 'archive':
+                with metrics.span('import_archive'):
+                    stats = import_archive(
+                        conn, job['file_path'], job['library_id'],
+                        workers=options['archive_workers'],
+                        chunk_size=options['chunk_size'],
+                        spool_dir=os.path.dirname(job['file_path']),
+                        progress=report_files,
+                        near_duplicate_distance=options['near_duplicate_distance'],
+                        media_folder=options['media_folder']
+                    )
+                result = json.dumps(stats.pop('files'), ensure_ascii=False)
+            else:
+                with metrics.span('import_file'):
+                    stats = extract_questions_from_file(
+                        job['file_path'], job['library_id'],
+                        chunk_size=options['chunk_size'],
+                        filename=job['filename'],
+                        conn=conn,
+                        progress=report,
+                        commit_chunks=True,
+                        near_duplicate_distance=options['near_duplicate_distance'],
+                        media_folder=options['media_folder']
+                    )
+        except Exception as e:
+            stats = {'lines': 0, 'parsed': 0, 'inserted': 0, 'duplicates': 0, 'failed': 0, 'error': str(e)}
+
+        report(stats)
+        conn.execute(
+            'UPDATE import_jobs SET state = ?, error = ?, result = ? WHERE id = ?',
+            ['failed' if 'error' in stats else 'done', stats.get('error'), result, job_id]
+        )
+        conn.commit()
+
+        if os.path.exists(job['file_path']):
+            os.remove(job['file_path'])
+    finally:
+        conn.close()
+        metrics.flush()
+
+
+def submit_job(job_id, app=None):
+    """把任务交给进程池执行"""
+    app = app or current_app._get_current_object()
+    options = {
+        'chunk_size': app.config['IMPORT_CHUNK_SIZE'],
+        'archive_workers': app.config['ARCHIVE_WORKERS'],
+        'near_duplicate_distance': app.config['NEAR_DUPLICATE_DISTANCE'],
+        'media_folder': app.config['QUESTION_MEDIA_FOLDER'],
+        'metrics_enabled': app.config['METRICS_ENABLED'],
+        'metrics_dir': app.config['METRICS_DIR'],
+        'slow_query_seconds': app.config['SLOW_QUERY_SECONDS'],
+        'slow_query_log': slow_queries.log_path(app)
+    }
+    args = (app.config['DATABASE'], app.config['DB_PRAGMAS'], job_id, options)
+    try:
+        return get_executor(app).submit(run_import_job, *args)
+    except BrokenProcessPool:
+        # 工作进程异常退出后重建进程池
+        return get_executor(app, reset=True).submit(run_import_job, *args)
+
+
+def count_active_jobs(user_id, conn=None):
+    """统计用户进行中的导入任务数量"""
+    row = (conn or database.get_db()).execute(
+        f'SELECT COUNT(*) FROM import_jobs WHERE user_id = ? AND state IN ({",".join("?" * len(ACTIVE_STATES))})',
+        [user_id, *ACTIVE_STATES]
+    ).fetchone()
+    return row[0]
+
+
+def create_job(file, library_id, user_id, max_jobs=None):
+    """
+    保存上传文件并登记导入任务，返回任务编号；zip 文件登记为压缩包导入任务。
+    max_jobs 不为 None 时，用户进行中的任务（不含执行进程已退出的任务）达到该数量则删除文件并抛出 TooManyJobs
+    """
+    job_id = uuid.uuid4().hex
+    import_folder = current_app.config['IMPORT_FOLDER']
+    os.makedirs(import_folder, exist_ok=True)
+
+    # 磁盘上的文件名只使用任务编号，原始文件名仅用于判断文件类型和展示
+    ext = os.path.splitext(file.filename)[1].lower()
+    file_path = os.path.join(import_folder, job_id + ext)
+    file.save(file_path)
+
+    kind = 'archive' if ext == '.zip' else 'file'
+
+    # 统计和登记在同一个写事务中完成，同一用户并发上传时不会超过上限
+    conn = database.get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        requeued = requeue_orphaned_jobs(conn, current_app.config['IMPORT_JOB_STALE_SECONDS'], user_id)
+        accepted = max_jobs is None or count_active_jobs(user_id, conn) < max_jobs
+        if accepted:
+            conn.execute(
+                'INSERT INTO import_jobs (id, user_id, library_id, filename, file_path, kind) VALUES (?, ?, ?, ?, ?, ?)',
+                [job_id, user_id, library_id, file.filename, file_path, kind]
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        os.remove(file_path)
+        raise
+
+    for requeued_id in requeued:
+        submit_job(requeued_id)
+    if not accepted:
+        os.remove(file_path)
+        raise TooManyJobs('进行中的导入任务过多，请稍后再试！')
+    submit_job(job_id)
+    return job_id
+
+
+def get_job(job_id):
+    """查询导入任务"""
+    return database.get_db().execute('SELECT * FROM import_jobs WHERE id = ?', [job_id]).fetchone()
+
+
+def job_to_dict(job):
+    """导入任务的 JSON 表示"""
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'library_id': job['library_id'],
+        'filename': job['filename'],
+        'state': job['state'],
+        'lines_processed': job['lines_processed'],
+        'questions_found': job['questions_found'],
+        'inserted': job['inserted'],
+        'duplicates': job['duplicates'],
+        'near_duplicates': job['near_duplicates'],
+        'failed': job['failed'],
+        'error': job['error'],
+        'files': json.loads(job['result']) if job['result'] else None,
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+
+
+def _worker_alive(pid):
+    """本机的工作进程是否还在运行；Windows 上 os.kill 会结束进程，不做检查"""
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def requeue_orphaned_jobs(conn, stale_seconds, user_id=None):
+    """
+    把执行进程已退出或超过 stale_seconds 秒没有进度的 running 任务改回 queued，返回这些任务的编号；
+    由调用方提交事务并重新提交任务
+    """
+    sql = ("SELECT id, worker_pid, updated_at < datetime('now', ?) AS stale FROM import_jobs "
+           "WHERE state = 'running'")
+    args = [f'-{stale_seconds} seconds']
+    if user_id is not None:
+        sql += ' AND user_id = ?'
+        args.append(user_id)
+    job_ids = []
+    for row in conn.execute(sql, args).fetchall():
+        if not row['stale'] and (row['worker_pid'] is None or _worker_alive(row['worker_pid'])):
+            continue
+        cur = conn.execute(
+            "UPDATE import_jobs SET state = 'queued', worker_pid = NULL, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND state = 'running' AND worker_pid IS ?",
+            [row['id'], row['worker_pid']]
+        )
+        if cur.rowcount:
+            job_ids.append(row['id'])
+    return job_ids
+
+
+def recover_jobs(app=None):
+    """重新提交未完成的任务，执行进程已退出的 running 任务先改回 queued"""
+    app = app or current_app._get_current_object()
+    conn = database.get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    requeue_orphaned_jobs(conn, app.config['IMPORT_JOB_STALE_SECONDS'])
+    conn.commit()
+    job_ids = [row['id'] for row in conn.execute("SELECT id FROM import_jobs WHERE state = 'queued' ORDER BY created_at")]
+    for job_id in job_ids:
+        submit_job(job_id, app)
+    return job_ids
+
+
+def init_app(app):
+    """每个进程处理第一个请求前恢复未完成的导入任务"""
+    @app.before_request
+    def recover_pending_jobs():
+        if app.extensions.get('import_jobs_recovered') == os.getpid():
+            return
+        app.extensions['import_jobs_recovered'] = os.getpid()
+        try:
+            recover_jobs(app)
+        except Exception:
+            app.logger.exception('恢复导入任务失败')
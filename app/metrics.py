@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+性能指标模块
+
+每个请求按蓝图和端点记录处理时间，以及执行的 SQL 语句数、SQL 耗时和读取的行数（由 database.connect() 创建的
+TimedConnection 在连接层面计时，包括 execute/executemany 和读取结果）；
+试卷渲染、文件导入等耗时操作用 span() 单独计时。指标以 Prometheus 文本格式的直方图在 /metrics 输出，
+SERVER_TIMING 打开时在响应的 Server-Timing 头中列出本次请求的 SQL 和各 span 耗时。
+
+指标保存在进程内。多个工作进程（如 gunicorn）和后台导入进程的指标需要汇总时设置 METRICS_DIR：
+各进程每隔 FLUSH_INTERVAL 秒把自己的指标写入该目录下的 <pid>.json，/metrics 读取并累加目录中的所有文件。
+已退出进程的文件会保留（计数不会回退），重新部署时应清空该目录。
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from flask import Response, current_app, request
+from app import slow_queries
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# 指标名: (说明, 桶上界)
+METRICS = {
+    'qb_request_duration_seconds': ('请求处理时间', DURATION_BUCKETS),
+    'qb_request_sql_statements': ('每个请求执行的 SQL 语句数', STATEMENT_BUCKETS),
+    'qb_request_sql_seconds': ('每个请求的 SQL 耗时', DURATION_BUCKETS),
+    'qb_request_sql_rows': ('每个请求读取的行数', ROW_BUCKETS),
+    'qb_span_duration_seconds': ('试卷渲染、文件导入等耗时操作的时间', DURATION_BUCKETS),
+}
+
+# 写入 METRICS_DIR 的最短间隔（秒）
+FLUSH_INTERVAL = 5
+# 按行迭代查询结果时每次读取并计时的行数
+ITER_BATCH_SIZE = 256
+
+_lock = threading.Lock()
+_series = {}  # (指标名, 标签) -> 各桶计数（最后一个桶为 +Inf）加上总和
+_enabled = True
+_directory = None
+_last_flush = 0.0
+# 当前请求的 RequestMetrics；不用 flask.g，避免每条 SQL 都经过代理对象查找
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def _reset_after_fork():
+    """fork 出的子进程不继承父进程的指标，避免汇总时重复计算"""
+    global _lock, _last_flush
+    _lock = threading.Lock()
+    _series.clear()
+    _last_flush = 0.0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def configure(enabled=True, directory=None):
+    """设置是否记录指标，以及多进程汇总使用的目录（None 表示只在进程内汇总）"""
+    global _enabled, _directory
+    _enabled = enabled
+    _directory = directory
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+def _observe(metric, labels, value):
+    buckets = METRICS[metric][1]
+    key = (metric, labels)
+    series = _series.get(key)
+    if series is None:
+        series = _series[key] = [0] * (len(buckets) + 2)
+    series[bisect.bisect_left(buckets, value)] += 1
+    series[-1] += value
+
+
+def observe(metric, labels, value):
+    """记录一个观测值，labels 为 ((名称, 值), ...)"""
+    with _lock:
+        _observe(metric, labels, value)
+
+
+class RequestMetrics:
+    """一个请求中累计的 SQL 和 span 耗时"""
+    __slots__ = ('start', 'sql_statements', 'sql_seconds', 'sql_rows', 'spans')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.sql_rows = 0
+        self.spans = {}
+
+
+def _record_statement(conn, sql, parameters, seconds, rows, read=True):
+    """一条语句结束：计入当前请求，耗时达到慢查询阈值时写入慢查询日志；read 为 False 时 rows 为修改的行数"""
+    current = _current.get()
+    if current is not None:
+        current.sql_statements += 1
+        current.sql_seconds += seconds
+        if read:
+            current.sql_rows += rows
+    if slow_queries.threshold is not None and seconds >= slow_queries.threshold:
+        slow_queries.record(conn, sql, parameters, seconds, rows)
+
+
+def _remember_first(rows, first):
+    """executemany 的参数可能是生成器，保存第一组参数用于慢查询日志的参数形状和执行计划"""
+    for row in rows:
+        if not first:
+            first.append(row)
+        yield row
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    记录每条语句的耗时（执行和读取结果）和读取的行数，语句结束时（读完结果、重新执行、关闭或被丢弃）
+    计入当前请求的 SQL 统计并检查慢查询阈值；没有进行中的请求统计且未设置慢查询阈值时不计时。
+
+    按行迭代时每次用 fetchmany 读取 ITER_BATCH_SIZE 行并计时，避免逐行计时的开销，
+    因此迭代到一半时不要再混用 fetchone/fetchmany。
+    """
+    _statement = None  # [SQL, 参数, 累计耗时, 读取的行数]
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        if _current.get() is None and slow_queries.threshold is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._started(sql, parameters, time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        if _current.get() is None and slow_queries.threshold is None:
+            return super().executemany(sql, seq_of_parameters)
+        first = []
+        start = time.perf_counter()
+        super().executemany(sql, _remember_first(seq_of_parameters, first))
+        self._started(sql, first[0] if first else (), time.perf_counter() - start)
+        return self
+
+    def _started(self, sql, parameters, seconds):
+        if self.description is None:
+            # 写入语句在 execute 中已经执行完；BEGIN 等非 DML 语句的 rowcount 为 -1
+            _record_statement(self.connection, sql, parameters, seconds, max(self.rowcount, 0), read=False)
+        else:
+            self._statement = [sql, parameters, seconds, 0]
+
+    def _finish(self):
+        statement = self._statement
+        if statement is not None:
+            self._statement = None
+            _record_statement(self.connection, *statement)
+
+    def fetchone(self):
+        statement = self._statement
+        if statement is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        statement[2] += time.perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            statement[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        statement = self._statement
+        if statement is None:
+            return super().fetchmany(size)
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        statement[2] += time.perf_counter() - start
+        statement[3] += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        statement = self._statement
+        if statement is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        statement[2] += time.perf_counter() - start
+        statement[3] += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        if self._statement is None:
+            return super().__iter__()
+        return self._iter_batches()
+
+    def _iter_batches(self):
+        while True:
+            rows = self.fetchmany(ITER_BATCH_SIZE)
+            yield from rows
+            if len(rows) < ITER_BATCH_SIZE:
+                return
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # 没有读完结果就被丢弃的语句（如只调用一次 fetchone）在这里结束；连接已关闭时写慢查询日志会失败，忽略
+        if self._statement is not None:
+            try:
+                self._finish()
+            except Exception:
+                pass
+
+
+class TimedConnection(sqlite3.Connection):
+    """cursor()、execute()、executemany() 返回 TimedCursor（sqlite3.Connection.execute 不经过 cursor() 方法）"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+@contextlib.contextmanager
+def span(name):
+    """对一段耗时操作计时，记录到 qb_span_duration_seconds，在请求中时同时计入 Server-Timing"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('qb_span_duration_seconds', (('span', name),), elapsed)
+        current = _current.get()
+        if current is not None:
+            current.spans[name] = current.spans.get(name, 0.0) + elapsed
+        maybe_flush()
+
+
+def start_request():
+    if _enabled:
+        _current.set(RequestMetrics())
+
+
+def finish_request(response):
+    current = _current.get()
+    if current is None:
+        return response
+    _current.set(None)
+    elapsed = time.perf_counter() - current.start
+    endpoint = request.endpoint or 'unknown'
+    labels = (('endpoint', endpoint),)
+    with _lock:
+        _observe('qb_request_duration_seconds', (
+            ('blueprint', endpoint.rpartition('.')[0]), ('endpoint', endpoint),
+            ('method', request.method), ('status', str(response.status_code))
+        ), elapsed)
+        _observe('qb_request_sql_statements', labels, current.sql_statements)
+        _observe('qb_request_sql_seconds', labels, current.sql_seconds)
+        _observe('qb_request_sql_rows', labels, current.sql_rows)
+
+    if current_app.config['SERVER_TIMING']:
+        timings = [f'sql;dur={current.sql_seconds * 1000:.2f};desc="{current.sql_statements} statements"']
+        timings += [f'{name};dur={seconds * 1000:.2f}' for name, seconds in current.spans.items()]
+        timings.append(f'app;dur={elapsed * 1000:.2f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+    maybe_flush()
+    return response
+
+
+def clear_request(exc=None):
+    """after_request 未执行时（未处理的异常）丢弃当前请求的统计"""
+    _current.set(None)
+
+
+def snapshot():
+    """本进程指标的副本 [(指标名, 标签, 计数和总和)]"""
+    with _lock:
+        return [(metric, labels, list(series)) for (metric, labels), series in _series.items()]
+
+
+def flush():
+    """把本进程的指标写入 METRICS_DIR/<pid>.json（写临时文件再替换）"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    if not _directory:
+        return
+    path = os.path.join(_directory, f'{os.getpid()}.json')
+    temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    data = [[metric, [list(label) for label in labels], series] for metric, labels, series in snapshot()]
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def maybe_flush():
+    if _directory and time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush()
+
+
+def collect():
+    """汇总所有进程的指标，返回 {(指标名, 标签): 计数和总和}"""
+    if not _directory:
+        return {(metric, labels): series for metric, labels, series in snapshot()}
+    flush()
+    merged = {}
+    for path in glob.glob(os.path.join(_directory, '*.json')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, series in data:
+            if metric not in METRICS:
+                continue
+            key = (metric, tuple(tuple(label) for label in labels))
+            total = merged.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+    return merged
+
+
+def _format_labels(labels):
+    return ','.join('{}="{}"'.format(
+        name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    ) for name, value in labels)
+
+
+def render(series):
+    """按 Prometheus 文本格式输出直方图"""
+    lines = []
+    for metric, (help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (name, labels), values in sorted(series.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], values[:-1]):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{_format_labels([*labels, ("le", bound)])}}} {cumulative}')
+            label_text = _format_labels(labels)
+            lines.append(f'{metric}_sum{{{label_text}}} {values[-1]}')
+            lines.append(f'{metric}_count{{{label_text}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    """Prometheus 抓取接口"""
+    return Response(render(collect()), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """注册请求计时和 /metrics；应在其他扩展之前调用，使请求计时包含它们的 after_request"""
+    configure(app.config['METRICS_ENABLED'], app.config['METRICS_DIR'])
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(clear_request)
+    if app.config['METRICS_ENABLED']:
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
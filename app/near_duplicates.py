@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+题目近似重复检测模块
+
+每道题目保存一个 64 位 SimHash 指纹（questions.simhash），特征为归一化题目文本的相邻三字组。
+只有题号、标点、空白、全半角或 Markdown 加粗不同的题目指纹相同；改动少量字词的题目距离较小，
+改动越多距离越大，改写幅度较大的题目需要调高距离阈值才能检出。
+
+指纹按 16 位切分为 4 段写入 question_simhash_bands，键为 (段号 << 16) | 段值。
+汉明距离不超过 3 的两个指纹至少有一段完全相同，按段查出候选题目再计算距离即可，
+查询时间与候选数量成正比，与题库大小无关；距离阈值大于 3 时可能漏掉部分近似重复。
+
+写入题目时由应用计算指纹（没有指纹的题目由 search.index_pending() 补算），触发器按指纹维护分段索引。
+"""
+import collections
+import itertools
+import re
+import unicodedata
+import click
+from flask.cli import with_appcontext
+
+BAND_BITS = 16
+BAND_COUNT = 4
+BAND_MASK = (1 << BAND_BITS) - 1
+MASK64 = (1 << 64) - 1
+SHINGLE_SIZE = 3
+# 分段索引只保证检出距离不超过 BAND_COUNT - 1 的题目
+MAX_BAND_DISTANCE = BAND_COUNT - 1
+# 题库查重的距离上限：距离越大 _block_masks() 的掩码越窄，分桶失效，比较次数接近题目数的平方
+MAX_CLUSTER_DISTANCE = 8
+
+# 题号（1. 1、 (1) （一） 一、）、解析器保留在题目开头的题型和难度（简答题： 单选题（困难）：）、
+# Markdown 加粗和所有非文字字符不参与指纹计算
+NUMBERING_PATTERN = re.compile(
+    r'^\s*(?:[(（]\s*[0-9一二三四五六七八九十]+\s*[)）]|[0-9一二三四五六七八九十]+\s*[.、．)）])?'
+    r'\s*(?:(?:单选题|多选题|不定项选择题|选择题|判断题|填空题|简答题|问答题|论述题|计算题|名词解释)'
+    r'\s*(?:[(（]\s*(?:简单|中等|困难)\s*[)）])?\s*[:：])?'
+)
+IGNORED_PATTERN = re.compile(r'[\W_]+')
+
+
+def normalize_text(text):
+    """去掉题号、标点和空白，全角转半角并统一小写"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = NUMBERING_PATTERN.sub('', text)
+    return IGNORED_PATTERN.sub('', text)
+
+
+def _shingle_hash(a, b, c):
+    """三个字符的码位（不超过 21 位）拼成 63 位整数，再用 splitmix64 的混合函数散列"""
+    x = (a << 42) | (b << 21) | c
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & MASK64
+    return x ^ (x >> 31)
+
+
+def simhash(text):
+    """
+    计算题目文本的 64 位 SimHash，返回 SQLite 可以保存的有符号整数；文本为空时返回 None
+
+    64 位各自的计数按位切片保存：planes[k] 的第 i 位是第 i 位计数的二进制第 k 位，
+    每加入一个特征哈希只需要几次整数位运算，最后与特征数的一半逐位比较。
+    """
+    codes = [ord(char) for char in normalize_text(text)]
+    if not codes:
+        return None
+    codes += [0] * (SHINGLE_SIZE - len(codes))
+    # 重复出现的三字组只计一次，避免常用词主导指纹
+    shingles = set(zip(codes, codes[1:], codes[2:]))
+    planes = []
+    count = len(shingles)
+    for a, b, c in shingles:
+        carry = _shingle_hash(a, b, c)
+        for k, plane in enumerate(planes):
+            planes[k] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        else:
+            planes.append(carry)
+    # 计数大于 count // 2 的位为 1：从高位到低位逐位比较
+    threshold = count // 2
+    greater, equal = 0, MASK64
+    for k in range(max(len(planes), threshold.bit_length()) - 1, -1, -1):
+        plane = planes[k] if k < len(planes) else 0
+        if threshold >> k & 1:
+            equal &= plane
+        else:
+            greater |= equal & plane
+            equal &= ~plane & MASK64
+    return greater - (1 << 64) if greater >= 1 << 63 else greater
+
+
+def band_keys(fingerprint):
+    """指纹各段在 question_simhash_bands 中的键"""
+    return [(band << BAND_BITS) | ((fingerprint >> (band * BAND_BITS)) & BAND_MASK) for band in range(BAND_COUNT)]
+
+
+def hamming(a, b):
+    return ((a ^ b) & MASK64).bit_count()
+
+
+def candidates(conn, fingerprint, max_distance):
+    """按分段索引查找与指纹距离不超过 max_distance 的题目，返回 {题目 id: 距离}"""
+    keys = band_keys(fingerprint)
+    found = {}
+    for question_id, other in conn.execute(
+        f'SELECT question_id, simhash FROM question_simhash_bands WHERE band_key IN ({",".join("?" * len(keys))})',
+        keys
+    ):
+        distance = hamming(fingerprint, other)
+        if distance <= max_distance:
+            found[question_id] = distance
+    return found
+
+
+def find_near_duplicates(conn, question_id, max_distance):
+    """查找与指定题目近似重复的其他题目（包括其他题库），按距离排序"""
+    row = conn.execute('SELECT simhash FROM questions WHERE id = ?', [question_id]).fetchone()
+    if row is None or row[0] is None:
+        return []
+    found = candidates(conn, row[0], max_distance)
+    found.pop(question_id, None)
+    if not found:
+        return []
+    placeholders = ','.join('?' * len(found))
+    rows = conn.execute(
+        f'SELECT id, library_id, question_text, question_type FROM questions WHERE id IN ({placeholders})',
+        list(found)
+    ).fetchall()
+    return sorted(({**dict(q), 'distance': found[q['id']]} for q in rows), key=lambda q: (q['distance'], q['id']))
+
+
+def count_near_duplicates(conn, library_id, rows, max_distance, seen=None):
+    """
+    统计一批待导入题目中与已有题目（任意题库）近似重复的数量，在插入这批题目之前调用
+
+    rows 为 (指纹, question_hash)；与本题库已有题目完全相同（将被唯一索引忽略）的题目不计入。
+    seen 为 {段键: [(指纹, question_hash)]}，记录本批中已检查过的题目，同一批中后出现的近似题目也会被统计。
+    """
+    if seen is None:
+        seen = {}
+    count = 0
+    for fingerprint, text_hash in rows:
+        if fingerprint is None:
+            continue
+        keys = band_keys(fingerprint)
+        earlier = [(other, other_hash) for key in keys for other, other_hash in seen.get(key, ())]
+        if any(other_hash == text_hash for _, other_hash in earlier):
+            continue
+        found = candidates(conn, fingerprint, max_distance)
+        exact = False
+        if found:
+            placeholders = ','.join('?' * len(found))
+            exact = conn.execute(
+                f'SELECT 1 FROM questions WHERE id IN ({placeholders}) AND library_id = ? AND question_hash = ? LIMIT 1',
+                [*found, library_id, text_hash]
+            ).fetchone() is not None
+        if not exact:
+            if found or any(hamming(fingerprint, other) <= max_distance for other, _ in earlier):
+                count += 1
+            for key in keys:
+                seen.setdefault(key, []).append((fingerprint, text_hash))
+    return count
+
+
+def _block_masks(max_distance):
+    """
+    把 64 位分为 max_distance + 2 块，返回每两块组合的掩码
+
+    距离不超过 max_distance 的两个指纹最多有 max_distance 块不同，至少有两块完全相同，
+    因此一定会在某个掩码下取值相同；两块合起来位数较多，随机碰撞的候选对很少。
+    """
+    blocks = max_distance + 2
+    bounds = [64 * i // blocks for i in range(blocks + 1)]
+    masks = [((1 << (bounds[i + 1] - bounds[i])) - 1) << bounds[i] for i in range(blocks)]
+    return [a | b for a, b in itertools.combinations(masks, 2)]
+
+
+def duplicate_clusters(conn, library_id, max_distance):
+    """
+    找出题库中的近似重复题目簇，返回按大小倒序排列的题目 id 列表
+
+    指纹完全相同的题目先合并，其余指纹按 _block_masks() 分桶，只比较同一桶中的指纹，
+    用并查集合并距离不超过 max_distance 的指纹。
+    """
+    groups = {}
+    cursor = conn.cursor()
+    cursor.row_factory = None  # 数十万行时按元组读取明显更快
+    for question_id, fingerprint in cursor.execute(
+        'SELECT id, simhash FROM questions WHERE library_id = ? AND simhash IS NOT NULL', [library_id]
+    ):
+        groups.setdefault(fingerprint & MASK64, []).append(question_id)
+    fingerprints = list(groups)
+    parent = list(range(len(fingerprints)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if max_distance > 0:
+        for mask in _block_masks(max_distance):
+            # 先用 Counter 找出有碰撞的键，只为这些键建桶
+            keys = [fingerprint & mask for fingerprint in fingerprints]
+            colliding = {key for key, count in collections.Counter(keys).items() if count > 1}
+            buckets = {}
+            for i in [i for i, key in enumerate(keys) if key in colliding]:
+                buckets.setdefault(keys[i], []).append(i)
+            for bucket in buckets.values():
+                for n, i in enumerate(bucket):
+                    fingerprint = fingerprints[i]
+                    for j in bucket[n + 1:]:
+                        if (fingerprint ^ fingerprints[j]).bit_count() <= max_distance:
+                            root_i, root_j = find(i), find(j)
+                            if root_i != root_j:
+                                parent[root_j] = root_i
+
+    clusters = {}
+    for i, fingerprint in enumerate(fingerprints):
+        clusters.setdefault(find(i), []).extend(groups[fingerprint])
+    return sorted((sorted(c) for c in clusters.values() if len(c) > 1), key=lambda c: (-len(c), c[0]))
+
+
+@click.command('near-duplicates')
+@click.argument('library_id', type=int)
+@click.option('--distance', type=int, default=None, help='汉明距离阈值，默认使用 NEAR_DUPLICATE_DISTANCE 配置')
+@click.option('--limit', type=int, default=20, help='最多显示多少个题目簇')
+@with_appcontext
+def near_duplicates_command(library_id, distance, limit):
+    """列出题库中的近似重复题目簇"""
+    from flask import current_app
+    from app.database import get_db
+    if distance is None:
+        distance = current_app.config['NEAR_DUPLICATE_DISTANCE']
+    conn = get_db()
+    clusters = duplicate_clusters(conn, library_id, distance)
+    click.echo(f'共 {len(clusters)} 个近似重复题目簇，涉及 {sum(len(c) for c in clusters)} 道题目')
+    for cluster in clusters[:limit]:
+        click.echo(f'- {len(cluster)} 道题目：')
+        for question_id in cluster:
+            text = conn.execute('SELECT question_text FROM questions WHERE id = ?', [question_id]).fetchone()[0]
+            click.echo(f'    [{question_id}] {" ".join(text.split())[:60]}')
+
+
+def init_app(app):
+    app.cli.add_command(near_duplicates_command)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+试卷渲染模块
+
+把试卷标题、题库名称和已排好顺序的题目渲染为 Word 文档，以及生成题目上传模板。
+相同内容渲染出的文件逐字节相同，渲染结果由 app/render_cache.py 按内容缓存，
+可以直接使用强 ETag。
+
+试卷有两种写入方式，版式相同：
+- python-docx：通过 python-docx 的对象模型逐段构建文档
+- ooxml：直接把转义好的 WordprocessingML 片段流式写入 zip 中的 word/document.xml，
+  其余部件（样式、主题等）取自预先压缩好的模板，不需要每次重新压缩
+"""
+import io
+import re
+import threading
+import zipfile
+from xml.sax.saxutils import escape
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from app import metrics
+
+# 题型标题
+QUESTION_SECTION_TITLES = {
+    'single_choice': '一、单选题',
+    'multiple_choice': '二、多选题',
+    'true_false': '三、判断题',
+    'short_answer': '四、简答题',
+    'essay': '五、论述题'
+}
+
+# 答案部分题型标题
+ANSWER_SECTION_TITLES = {
+    'single_choice': '一、单选题答案',
+    'multiple_choice': '二、多选题答案',
+    'true_false': '三、判断题答案',
+    'short_answer': '四、简答题答案',
+    'essay': '五、论述题答案'
+}
+
+# 题型不在上面的标题中时（如直接写入数据库的题目）使用的标题
+OTHER_SECTION_TITLE = '其他题型'
+
+
+def _add_sections(doc, questions, field, section_titles):
+    """按题型分节添加题目或答案，题型变化时添加题型标题并重新编号"""
+    current_type = None
+    question_num = 1
+    for q in questions:
+        if q['question_type'] != current_type:
+            current_type = q['question_type']
+            doc.add_heading(section_titles.get(current_type, OTHER_SECTION_TITLE), level=1)
+            question_num = 1
+        doc.add_paragraph(f'{question_num}. {q[field]}')
+        question_num += 1
+
+
+def render_paper(title, library_name, questions):
+    """生成试卷 Word 文档（试题部分和参考答案部分）"""
+    doc = Document()
+
+    # 添加标题和副标题
+    heading = doc.add_heading(title, 0)
+    heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    subtitle = doc.add_paragraph(f'题库：{library_name}')
+    subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph('')  # 空行
+
+    _add_sections(doc, questions, 'question_text', QUESTION_SECTION_TITLES)
+
+    # 添加答案部分
+    doc.add_page_break()
+    doc.add_heading('参考答案', 0)
+    _add_sections(doc, questions, 'answer_text', ANSWER_SECTION_TITLES)
+    return doc
+
+
+def document_bytes(doc):
+    """
+    保存 Word 文档并返回文件内容。
+
+    python-docx 按当前时间写入 zip 条目的时间戳，这里统一改为固定时间，
+    使相同内容渲染出的文件逐字节相同。
+    """
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    source = zipfile.ZipFile(buffer)
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            entry = zipfile.ZipInfo(info.filename, date_time=(1980, 1, 1, 0, 0, 0))
+            entry.compress_type = info.compress_type
+            target.writestr(entry, source.read(info.filename))
+    return output.getvalue()
+
+
+def render_paper_bytes(title, library_name, questions):
+    """生成试卷 Word 文档并返回文件内容"""
+    return document_bytes(render_paper(title, library_name, questions))
+
+
+# 直接写入 WordprocessingML
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# XML 1.0 不允许的控制字符（python-docx 遇到会报错，这里直接去掉）
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+# 与 python-docx 相同：制表符写为 <w:tab/>，换行写为 <w:br/>
+RUN_BREAKS = re.compile('([\t\r\n])')
+# 每积累多少个片段写入一次 zip 流
+FLUSH_FRAGMENTS = 512
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def _ooxml_template():
+    """
+    从 python-docx 的默认模板生成 (预先压缩好的 zip 内容, document.xml 开头, document.xml 结尾)。
+
+    zip 中包含除 word/document.xml 外的所有部件，时间戳固定；只在进程中生成一次。
+    """
+    global _template
+    with _template_lock:
+        if _template is None:
+            buffer = io.BytesIO()
+            Document().save(buffer)
+            source = zipfile.ZipFile(buffer)
+            document = source.read('word/document.xml').decode('utf-8')
+            head = document[:document.index('<w:body>') + len('<w:body>')]
+            tail = document[document.index('<w:sectPr'):]
+
+            output = io.BytesIO()
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+                for info in source.infolist():
+                    if info.filename != 'word/document.xml':
+                        entry = zipfile.ZipInfo(info.filename, date_time=ZIP_DATE_TIME)
+                        entry.compress_type = zipfile.ZIP_DEFLATED
+                        target.writestr(entry, source.read(info.filename))
+            _template = (output.getvalue(), head.encode('utf-8'), tail.encode('utf-8'))
+        return _template
+
+
+def _run(text):
+    """文本转换为 <w:r> 片段"""
+    parts = []
+    for piece in RUN_BREAKS.split(INVALID_XML_CHARS.sub('', text)):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\r', '\n'):
+            parts.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if piece != piece.strip() else ''
+            parts.append(f'<w:t{space}>{escape(piece)}</w:t>')
+    return f'<w:r>{"".join(parts)}</w:r>' if parts else ''
+
+
+def _paragraph(text, style=None, center=False):
+    """文本转换为 <w:p> 片段，style 为段落样式（Title、Heading1）"""
+    properties = ''
+    if style or center:
+        properties = ('<w:pPr>' + (f'<w:pStyle w:val="{style}"/>' if style else '')
+                      + ('<w:jc w:val="center"/>' if center else '') + '</w:pPr>')
+    run = _run(text)
+    if not properties and not run:
+        return '<w:p/>'
+    return f'<w:p>{properties}{run}</w:p>'
+
+
+def _iter_sections(questions, field, section_titles):
+    """按题型分节产出题目或答案段落，与 _add_sections 的版式相同"""
+    current_type = None
+    question_num = 1
+    for q in questions:
+        if q['question_type'] != current_type:
+            current_type = q['question_type']
+            yield _paragraph(section_titles.get(current_type, OTHER_SECTION_TITLE), 'Heading1')
+            question_num = 1
+        yield _paragraph(f'{question_num}. {q[field]}')
+        question_num += 1
+
+
+def _iter_paper_body(title, library_name, questions):
+    yield _paragraph(title, 'Title', center=True)
+    yield _paragraph(f'题库：{library_name}', center=True)
+    yield _paragraph('')  # 空行
+    yield from _iter_sections(questions, 'question_text', QUESTION_SECTION_TITLES)
+    # 答案部分另起一页
+    yield '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+    yield _paragraph('参考答案', 'Title')
+    yield from _iter_sections(questions, 'answer_text', ANSWER_SECTION_TITLES)
+
+
+def write_paper_ooxml(fileobj, title, library_name, questions):
+    """把试卷直接写为 WordprocessingML，fileobj 必须是可读写、可定位的空文件对象"""
+    prebuilt, head, tail = _ooxml_template()
+    fileobj.write(prebuilt)
+    with zipfile.ZipFile(fileobj, 'a') as archive:
+        entry = zipfile.ZipInfo('word/document.xml', date_time=ZIP_DATE_TIME)
+        entry.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(entry, 'w') as document:
+            document.write(head)
+            fragments = []
+            for fragment in _iter_paper_body(title, library_name, questions):
+                fragments.append(fragment)
+                if len(fragments) >= FLUSH_FRAGMENTS:
+                    document.write(''.join(fragments).encode('utf-8'))
+                    fragments = []
+            document.write(''.join(fragments).encode('utf-8'))
+            document.write(tail)
+
+
+# 试卷写入方式
+PAPER_WRITERS = ('python-docx', 'ooxml')
+
+
+def write_paper(fileobj, title, library_name, questions, writer='python-docx'):
+    """按指定的写入方式把试卷写入 fileobj"""
+    with metrics.span('paper_render'):
+        if writer == 'ooxml':
+            write_paper_ooxml(fileobj, title, library_name, questions)
+        else:
+            fileobj.write(render_paper_bytes(title, library_name, questions))
+
+
+def render_upload_template():
+    """生成题目上传模板 Word 文档并返回文件内容"""
+    doc = Document()
+    doc.add_heading('题目上传模板', 0)
+    doc.add_paragraph('请按照以下格式编写题目：')
+    
+    doc.add_heading('单选题示例：', level=1)
+    doc.add_paragraph('1. 以下哪个是Python的关键字？')
+    doc.add_paragraph('A. print')
+    doc.add_paragraph('B. def')
+    doc.add_paragraph('C. function')
+    doc.add_paragraph('D. var')
+    doc.add_paragraph('答案：B')
+    
+    doc.add_heading('多选题示例：', level=1)
+    doc.add_paragraph('2. 以下哪些是Python的内置数据类型？')
+    doc.add_paragraph('A. list')
+    doc.add_paragraph('B. dict')
+    doc.add_paragraph('C. array')
+    doc.add_paragraph('D. tuple')
+    doc.add_paragraph('答案：ABD')
+    
+    doc.add_heading('判断题示例：', level=1)
+    doc.add_paragraph('3. Python是一种编译型语言。')
+    doc.add_paragraph('答案：错误')
+    
+    doc.add_heading('简答题示例：', level=1)
+    doc.add_paragraph('4. 请简述Python的特点。')
+    doc.add_paragraph('答案：Python是一种解释型、面向对象、动态数据类型的高级程序设计语言。')
+    return document_bytes(doc)
+
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+密码哈希模块
+
+新密码按 PASSWORD_HASH_METHOD 配置生成哈希（Werkzeug 的写法，例如 pbkdf2:sha256:600000、scrypt:32768:8:1）。
+登录验证通过后，如果保存的哈希使用的算法或参数与配置不同，就按当前配置重新生成哈希，
+调整配置后用户在下次登录时自动迁移。
+
+密码验证在每个进程的有界线程池中执行（hashlib 计算哈希时会释放 GIL），
+同时最多 PASSWORD_VERIFY_WORKERS 个验证占用 CPU，考试开始前集中登录时不会拖慢其他请求；
+排队的验证超过 PASSWORD_VERIFY_MAX_PENDING 个时等待 PASSWORD_VERIFY_TIMEOUT 秒，仍没有空位则抛出 PasswordVerifyBusy。
+"""
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+# 保护验证线程池的创建：并发的第一批登录请求只创建一个线程池
+_verifier_lock = threading.Lock()
+
+
+class PasswordVerifyBusy(RuntimeError):
+    """排队验证的密码过多"""
+
+
+@functools.lru_cache(maxsize=None)
+def hash_prefix(method):
+    """按 method 生成的哈希中 $ 之前的部分，例如 pbkdf2:sha256 的前缀为 pbkdf2:sha256:600000（补全了默认参数）"""
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def hash_password(password, method=None):
+    """按配置的算法和参数生成密码哈希"""
+    return generate_password_hash(password, method or current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def needs_rehash(password_hash, method=None):
+    """保存的哈希使用的算法或参数与配置不同"""
+    method = method or current_app.config['PASSWORD_HASH_METHOD']
+    return password_hash.split('$', 1)[0] != hash_prefix(method)
+
+
+class PasswordVerifier:
+    """有界的密码验证线程池"""
+
+    def __init__(self, workers, max_pending, timeout):
+        self.pid = os.getpid()
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-verify')
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def verify(self, password_hash, password):
+        if not self._pending.acquire(timeout=self.timeout):
+            raise PasswordVerifyBusy('登录人数较多，请稍后重试！')
+        try:
+            return self._executor.submit(check_password_hash, password_hash, password).result()
+        finally:
+            self._pending.release()
+
+
+def get_verifier(app=None):
+    """获取当前进程的密码验证线程池，fork 之后会重新创建"""
+    app = app or current_app._get_current_object()
+    verifier = app.extensions.get('password_verifier')
+    if verifier is None or verifier.pid != os.getpid():
+        with _verifier_lock:
+            verifier = app.extensions.get('password_verifier')
+            if verifier is None or verifier.pid != os.getpid():
+                verifier = PasswordVerifier(
+                    app.config['PASSWORD_VERIFY_WORKERS'],
+                    app.config['PASSWORD_VERIFY_MAX_PENDING'],
+                    app.config['PASSWORD_VERIFY_TIMEOUT']
+                )
+                app.extensions['password_verifier'] = verifier
+    return verifier
+
+
+def _reset_after_fork():
+    """fork 时其他线程可能持有锁，子进程重新创建"""
+    global _verifier_lock
+    _verifier_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def verify_password(password_hash, password):
+    """在验证线程池中检查密码，排队过多时抛出 PasswordVerifyBusy"""
+    if not password_hash or password is None:
+        return False
+    return get_verifier().verify(password_hash, password)
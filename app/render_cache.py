@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+试卷渲染缓存模块
+
+渲染好的试卷 Word 文档按内容寻址保存在 RENDER_CACHE_FOLDER 中，文件名为缓存键。
+缓存键是试卷标题、题库名称、按题号排列的 (题目 id, 版本号) 和渲染选项的哈希，
+题目被编辑后版本号变化，缓存键随之变化，不会再命中旧文件。
+缓存总大小超过 RENDER_CACHE_MAX_BYTES 时淘汰最久未使用的文件。
+写入方式（python-docx 或 ooxml）作为渲染选项计入缓存键，未指定时使用 PAPER_WRITER 配置。
+"""
+import hashlib
+import io
+import json
+import os
+import time
+import uuid
+import zipfile
+from flask import current_app
+from app.paper_render import write_paper
+from app.sampling import fetch_questions
+
+# 命中缓存时最多每隔多少秒更新一次最近使用时间，避免每次下载都写数据库
+TOUCH_INTERVAL = 60
+
+
+def render_key(title, library_name, entries, options=None):
+    """计算缓存键，entries 为按题号排列的 (题目 id, 版本号)"""
+    payload = json.dumps([title, library_name, [list(e) for e in entries], options or {}],
+                         ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def cache_path(cache_key):
+    return os.path.join(current_app.config['RENDER_CACHE_FOLDER'], cache_key + '.docx')
+
+
+def paper_library_name(conn, paper):
+    """试卷所属题库名称；早期试卷没有记录题库，取第一道题目所在的题库"""
+    if paper['library_id'] is not None:
+        row = conn.execute('SELECT name FROM libraries WHERE id = ?', [paper['library_id']]).fetchone()
+    else:
+        row = conn.execute(
+            'SELECT l.name FROM paper_questions pq JOIN questions q ON q.id = pq.question_id '
+            'JOIN libraries l ON l.id = q.library_id WHERE pq.paper_id = ? ORDER BY pq.question_order LIMIT 1',
+            [paper['id']]
+        ).fetchone()
+    return row[0] if row else ''
+
+
+def paper_entries(conn, paper_id):
+    """试卷中按题号排列的 (题目 id, 版本号)，已删除的题目不计入"""
+    rows = conn.execute(
+        'SELECT q.id, q.version FROM paper_questions pq JOIN questions q ON q.id = pq.question_id '
+        'WHERE pq.paper_id = ? ORDER BY pq.question_order',
+        [paper_id]
+    )
+    return [(row[0], row[1]) for row in rows]
+
+
+def _write_file(path, write):
+    """调用 write(f) 写入临时文件再替换，其他进程不会读到写了一半的文件；返回文件大小"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(temp_path, 'w+b') as f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove_file(temp_path)
+        raise
+    return os.path.getsize(path)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict(conn, max_bytes=None, keep=None):
+    """淘汰最久未使用的缓存文件，直到总大小不超过上限；keep 为不淘汰的缓存键（刚写入、即将返回的文件）"""
+    if max_bytes is None:
+        max_bytes = current_app.config['RENDER_CACHE_MAX_BYTES']
+    total = conn.execute('SELECT COALESCE(SUM(file_size), 0) FROM paper_renders').fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    evicted = []
+    for cache_key, file_size in conn.execute('SELECT cache_key, file_size FROM paper_renders ORDER BY last_used_at'):
+        if total <= max_bytes:
+            break
+        if cache_key == keep:
+            continue
+        evicted.append(cache_key)
+        total -= file_size
+    with conn:
+        conn.executemany('DELETE FROM paper_renders WHERE cache_key = ?', [(k,) for k in evicted])
+    for cache_key in evicted:
+        _remove_file(cache_path(cache_key))
+    return len(evicted)
+
+
+def get_paper_file(conn, paper_id, title, library_name, options=None):
+    """返回试卷 Word 文档的缓存文件路径，未命中时渲染并写入缓存；options 中的 writer 为写入方式"""
+    options = dict(options or {})
+    options.setdefault('writer', current_app.config['PAPER_WRITER'])
+    entries = paper_entries(conn, paper_id)
+    cache_key = render_key(title, library_name, entries, options)
+    path = cache_path(cache_key)
+    now = time.time()
+
+    row = conn.execute('SELECT last_used_at FROM paper_renders WHERE cache_key = ?', [cache_key]).fetchone()
+    if row is not None and os.path.exists(path):
+        if now - row[0] > TOUCH_INTERVAL:
+            with conn:
+                conn.execute('UPDATE paper_renders SET last_used_at = ? WHERE cache_key = ?', [now, cache_key])
+        return path
+
+    questions = fetch_questions(conn, [question_id for question_id, _ in entries])
+    file_size = _write_file(path, lambda f: write_paper(f, title, library_name, questions, options['writer']))
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO paper_renders (cache_key, paper_id, file_size, last_used_at) VALUES (?, ?, ?, ?)',
+            [cache_key, paper_id, file_size, now]
+        )
+    evict(conn, keep=cache_key)
+    return path
+
+
+def _purge(conn, keys):
+    """删除渲染缓存记录和对应的文件"""
+    if keys:
+        with conn:
+            conn.executemany('DELETE FROM paper_renders WHERE cache_key = ?', [(k,) for k in keys])
+        for cache_key in keys:
+            _remove_file(cache_path(cache_key))
+    return len(keys)
+
+
+def invalidate_questions(conn, question_ids):
+    """删除引用了这些题目的试卷的渲染缓存（题目编辑或删除时调用）"""
+    keys = []
+    question_ids = list(question_ids)
+    for start in range(0, len(question_ids), 500):
+        chunk = question_ids[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        keys += [row[0] for row in conn.execute(
+            f'SELECT cache_key FROM paper_renders WHERE paper_id IN '
+            f'(SELECT paper_id FROM paper_questions WHERE question_id IN ({placeholders}))',
+            chunk
+        )]
+    return _purge(conn, keys)
+
+
+def invalidate_library(conn, library_id):
+    """删除该题库的试卷以及引用了该题库题目的试卷的渲染缓存（删除题库时调用）"""
+    keys = [row[0] for row in conn.execute(
+        'SELECT cache_key FROM paper_renders WHERE paper_id IN ('
+        'SELECT id FROM papers WHERE library_id = ? UNION '
+        'SELECT paper_id FROM paper_questions WHERE question_id IN (SELECT id FROM questions WHERE library_id = ?))',
+        [library_id, library_id]
+    )]
+    return _purge(conn, keys)
+
+
+def papers_zip(conn, papers, library_name, options=None):
+    """把多套试卷的 Word 文档打包为 zip，papers 为 (试卷 id, 标题) 列表，文档取自缓存"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        # docx 本身已经压缩，直接存储即可
+        for paper_id, title in papers:
+            archive.write(get_paper_file(conn, paper_id, title, library_name, options), f'试卷_{title}.docx')
+    buffer.seek(0)
+    return buffer
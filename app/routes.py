@@ -2,23 +2,106 @@
 """
 路由模块
 """
-import os
-import sqlite3
+import hashlib
+import io
 import json
-import random
-from flask import Blueprint, render_template, redirect, url_for, request, flash, send_file, jsonify, session
+import sqlite3
+from datetime import datetime, timezone
+from urllib.parse import quote
+from flask import Blueprint, render_template, redirect, url_for, request, flash, send_file, send_from_directory, jsonify, session, current_app, make_response, Response, stream_with_context
 from flask_login import login_required, current_user
-from docx import Document
-from docx.shared import Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from app import jobs
 from app.auth import get_db, query_db, execute_db, admin_required
-from app.utils import allowed_file, extract_questions_from_file
+from app.utils import allowed_file, question_hash, encode_cursor, decode_cursor
+from app.sampling import QuestionSampler, InsufficientQuestions, fetch_questions
+from app import batch_write, export, near_duplicates, render_cache, search
+from app.user_cache import get_user_cache
+from app.paper_render import PAPER_WRITERS, render_upload_template
+from app.assembly import parse_blueprint, assemble, BlueprintError, AssemblyError
 
 # 创建蓝图
 main_bp = Blueprint('main', __name__)
 library_bp = Blueprint('library', __name__, url_prefix='/libraries')
 question_bp = Blueprint('question', __name__, url_prefix='/questions')
 paper_bp = Blueprint('paper', __name__, url_prefix='/papers')
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+
+def get_page_size():
+    """读取请求中的每页数量"""
+    page_size = request.args.get('page_size', type=int) or current_app.config['PAGE_SIZE']
+    return max(1, min(page_size, current_app.config['MAX_PAGE_SIZE']))
+
+
+def get_question_filters():
+    """读取请求中的题型和难度筛选条件，取值不在配置中时抛出 ValueError"""
+    question_type = request.args.get('question_type') or None
+    difficulty = request.args.get('difficulty') or None
+    if question_type and question_type not in current_app.config['QUESTION_TYPES']:
+        raise ValueError('无效的题型！')
+    if difficulty and difficulty not in current_app.config['QUESTION_DIFFICULTIES']:
+        raise ValueError('无效的难度！')
+    return question_type, difficulty
+
+
+def check_question_fields(question_type, difficulty):
+    """检查表单提交的题型和难度，取值不在配置中时抛出 ValueError（试卷按题型分节渲染）"""
+    if question_type not in current_app.config['QUESTION_TYPES']:
+        raise ValueError('无效的题型！')
+    if difficulty not in current_app.config['QUESTION_DIFFICULTIES']:
+        raise ValueError('无效的难度！')
+
+
+def fetch_question_page(library_id, cursor=None, page_size=50, question_type=None, difficulty=None):
+    """按 (created_at, id) 倒序游标分页查询题目，不读取答案文本
+
+    返回 (题目列表, 下一页游标)，没有下一页时游标为 None。
+    """
+    query = 'SELECT id, library_id, question_text, question_type, difficulty, created_at, updated_at FROM questions WHERE library_id = ?'
+    params = [library_id]
+    if question_type:
+        query += ' AND question_type = ?'
+        params.append(question_type)
+    if difficulty:
+        query += ' AND difficulty = ?'
+        params.append(difficulty)
+    if cursor:
+        query += ' AND (created_at, id) < (?, ?)'
+        params.extend(decode_cursor(cursor))
+    query += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    params.append(page_size + 1)
+    
+    rows = query_db(query, params)
+    next_cursor = None
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    return rows[:page_size], next_cursor
+
+
+def fetch_library_page(cursor=None, page_size=50):
+    """按 (created_at, id) 倒序游标分页查询题库，返回 (题库列表, 下一页游标)"""
+    query = 'SELECT id, name, description, user_id, created_at, updated_at FROM libraries'
+    params = []
+    if cursor:
+        query += ' WHERE (created_at, id) < (?, ?)'
+        params.extend(decode_cursor(cursor))
+    query += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    params.append(page_size + 1)
+    
+    rows = query_db(query, params)
+    next_cursor = None
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    return rows[:page_size], next_cursor
+
+
+def index_pending_questions():
+    """为刚写入的题目计算全文索引词元和缺少的指纹（见 search.index_pending）"""
+    conn = get_db()
+    search.index_pending(conn)
+    conn.commit()
 
 
 @main_bp.route('/')
@@ -27,57 +110,28 @@ def index():
     return render_template('index.html')
 
 
+@main_bp.record_once
+def build_upload_template(state):
+    """启动时生成上传模板，保存在内存中"""
+    content = render_upload_template()
+    state.app.extensions['upload_template'] = (content, hashlib.sha256(content).hexdigest())
+
+
 @main_bp.route('/upload_template', methods=['GET'])
 def upload_template():
-    """下载上传模板"""
-    # 创建模板文件
-    doc = Document()
-    doc.add_heading('题目上传模板', 0)
-    doc.add_paragraph('请按照以下格式编写题目：')
-    
-    doc.add_heading('单选题示例：', level=1)
-    doc.add_paragraph('1. 以下哪个是Python的关键字？')
-    doc.add_paragraph('A. print')
-    doc.add_paragraph('B. def')
-    doc.add_paragraph('C. function')
-    doc.add_paragraph('D. var')
-    doc.add_paragraph('答案：B')
-    
-    doc.add_heading('多选题示例：', level=1)
-    doc.add_paragraph('2. 以下哪些是Python的内置数据类型？')
-    doc.add_paragraph('A. list')
-    doc.add_paragraph('B. dict')
-    doc.add_paragraph('C. array')
-    doc.add_paragraph('D. tuple')
-    doc.add_paragraph('答案：ABD')
-    
-    doc.add_heading('判断题示例：', level=1)
-    doc.add_paragraph('3. Python是一种编译型语言。')
-    doc.add_paragraph('答案：错误')
-    
-    doc.add_heading('简答题示例：', level=1)
-    doc.add_paragraph('4. 请简述Python的特点。')
-    doc.add_paragraph('答案：Python是一种解释型、面向对象、动态数据类型的高级程序设计语言。')
-    
-    # 保存文件到临时位置
-    temp_file = os.path.join('uploads', 'template.docx')
-    os.makedirs(os.path.dirname(temp_file), exist_ok=True)
-    doc.save(temp_file)
-    
-    return send_file(temp_file, as_attachment=True, download_name='题目上传模板.docx')
+    """下载上传模板（带 If-None-Match 的请求在模板未变时返回 304）"""
+    content, etag = current_app.extensions['upload_template']
+    return send_file(io.BytesIO(content), as_attachment=True, download_name='题目上传模板.docx',
+                     etag=etag, max_age=3600, conditional=True)
 
 
-@main_bp.route('/statistics')
-@login_required
-def statistics():
-    """统计分析路由"""
-    # 获取题库统计
-    libraries = query_db('SELECT * FROM libraries')
-    total_libraries = len(libraries)
-    
-    # 获取题目统计
-    questions = query_db('SELECT * FROM questions')
-    total_questions = len(questions)
+def get_statistics():
+    """汇总统计数据
+
+    题目数量来自触发器维护的 library_stats 计数表，只需读取 O(题库数) 行。
+    """
+    total_libraries = query_db('SELECT COUNT(*) AS total FROM libraries', one=True)['total']
+    total_papers = query_db('SELECT COUNT(*) AS total FROM papers', one=True)['total']
     
     # 按题型统计
     question_types = {
@@ -88,10 +142,6 @@ def statistics():
         'essay': 0
     }
     
-    for q in questions:
-        if q['question_type'] in question_types:
-            question_types[q['question_type']] += 1
-    
     # 按难度统计
     question_difficulties = {
         'easy': 0,
@@ -99,28 +149,77 @@ def statistics():
         'hard': 0
     }
     
-    for q in questions:
-        if q['difficulty'] in question_difficulties:
-            question_difficulties[q['difficulty']] += 1
-    
-    # 获取试卷统计
-    papers = query_db('SELECT * FROM papers')
-    total_papers = len(papers)
+    # 按题库统计
+    libraries = {}
+    for library in query_db('SELECT id, name FROM libraries ORDER BY id'):
+        libraries[library['id']] = {
+            'id': library['id'],
+            'name': library['name'],
+            'total_questions': 0,
+            'question_types': dict.fromkeys(question_types, 0),
+            'question_difficulties': dict.fromkeys(question_difficulties, 0)
+        }
     
+    total_questions = 0
+    rows = query_db('SELECT library_id, question_type, difficulty, question_count FROM library_stats WHERE question_count > 0')
+    for row in rows:
+        count = row['question_count']
+        total_questions += count
+        if row['question_type'] in question_types:
+            question_types[row['question_type']] += count
+        if row['difficulty'] in question_difficulties:
+            question_difficulties[row['difficulty']] += count
+        
+        library = libraries.get(row['library_id'])
+        if library:
+            library['total_questions'] += count
+            if row['question_type'] in library['question_types']:
+                library['question_types'][row['question_type']] += count
+            if row['difficulty'] in library['question_difficulties']:
+                library['question_difficulties'][row['difficulty']] += count
+    
+    return {
+        'total_libraries': total_libraries,
+        'total_questions': total_questions,
+        'question_types': question_types,
+        'question_difficulties': question_difficulties,
+        'total_papers': total_papers,
+        'libraries': list(libraries.values())
+    }
+
+
+@main_bp.route('/statistics')
+@login_required
+def statistics():
+    """统计分析路由"""
+    stats = get_statistics()
     return render_template('statistics.html',
-                         total_libraries=total_libraries,
-                         total_questions=total_questions,
-                         question_types=question_types,
-                         question_difficulties=question_difficulties,
-                         total_papers=total_papers)
+                         total_libraries=stats['total_libraries'],
+                         total_questions=stats['total_questions'],
+                         question_types=stats['question_types'],
+                         question_difficulties=stats['question_difficulties'],
+                         total_papers=stats['total_papers'],
+                         library_stats=stats['libraries'])
+
+
+@main_bp.route('/statistics.json')
+@login_required
+def statistics_json():
+    """统计数据 JSON 接口"""
+    return jsonify(get_statistics())
 
 
 @library_bp.route('/')
 @login_required
 def libraries():
     """题库列表路由"""
-    libraries = query_db('SELECT * FROM libraries ORDER BY created_at DESC')
-    return render_template('libraries.html', libraries=libraries)
+    try:
+        libraries, next_cursor = fetch_library_page(request.args.get('cursor'), get_page_size())
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('library.libraries'))
+    
+    return render_template('libraries.html', libraries=libraries, next_cursor=next_cursor)
 
 
 @library_bp.route('/create', methods=['POST'])
@@ -160,6 +259,9 @@ def delete_library(library_id):
         flash('题库不存在！', 'danger')
         return redirect(url_for('library.libraries'))
     
+    # 先删除引用了该题库题目的试卷的渲染缓存，删除题目后就无法再按题目查到这些试卷
+    render_cache.invalidate_library(get_db(), library_id)
+    
     # 检查是否有题目关联
     questions = query_db('SELECT * FROM questions WHERE library_id = ?', [library_id])
     if questions:
@@ -173,6 +275,41 @@ def delete_library(library_id):
     return redirect(url_for('library.libraries'))
 
 
+@library_bp.route('/<int:library_id>/export')
+@login_required
+def export_library(library_id):
+    """流式导出题库，format 为 ndjson、csv 或 md
+
+    gzip=1 时下载 .gz 压缩文件；否则请求头 Accept-Encoding 包含 gzip 时压缩传输（Content-Encoding: gzip）。
+    """
+    library = query_db('SELECT id, name FROM libraries WHERE id = ?', [library_id], one=True)
+    if not library:
+        flash('题库不存在！', 'danger')
+        return redirect(url_for('library.libraries'))
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in export.EXPORT_FORMATS:
+        flash('不支持的导出格式！', 'danger')
+        return redirect(url_for('library.libraries'))
+    
+    chunks = export.iter_export(get_db(), library_id, library['name'], export_format)
+    mimetype = export.EXPORT_FORMATS[export_format]
+    extension = export_format
+    headers = {'Vary': 'Accept-Encoding'}
+    if request.args.get('gzip') == '1':
+        body = export.gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        extension += '.gz'
+    elif request.accept_encodings['gzip']:
+        body = export.gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        body = export.encode_chunks(chunks)
+    headers['Content-Disposition'] = (f"attachment; filename=library-{library_id}.{extension}; "
+                                      f"filename*=UTF-8''{quote(library['name'] + '.' + extension)}")
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
 @question_bp.route('/<int:library_id>')
 @login_required
 def questions(library_id):
@@ -182,8 +319,47 @@ def questions(library_id):
         flash('题库不存在！', 'danger')
         return redirect(url_for('library.libraries'))
     
-    questions = query_db('SELECT * FROM questions WHERE library_id = ? ORDER BY created_at DESC', [library_id])
-    return render_template('questions.html', library=library, questions=questions)
+    try:
+        question_type, difficulty = get_question_filters()
+        questions, next_cursor = fetch_question_page(
+            library_id, request.args.get('cursor'), get_page_size(), question_type, difficulty
+        )
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('question.questions', library_id=library_id))
+    
+    return render_template('questions.html', library=library, questions=questions, next_cursor=next_cursor,
+                           question_type=question_type, difficulty=difficulty)
+
+
+@question_bp.route('/search')
+@login_required
+def search_questions():
+    """
+    题目全文检索 JSON 接口，按相关度排序
+
+    参数：q 检索词，library_id/question_type/difficulty 筛选条件，page/page_size 分页。
+    """
+    query = request.args.get('q', '').strip()
+    library_id = request.args.get('library_id', type=int)
+    page = request.args.get('page', 1, type=int)
+    try:
+        question_type, difficulty = get_question_filters()
+        if not query:
+            raise ValueError('请输入检索词！')
+        if page < 1:
+            raise ValueError('无效的页码！')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    results, has_more = search.search_questions(get_db(), query, library_id, question_type, difficulty,
+                                                page, get_page_size())
+    return jsonify({
+        'success': True,
+        'questions': results,
+        'page': page,
+        'next_page': page + 1 if has_more else None
+    })
 
 
 @question_bp.route('/<int:library_id>/create', methods=['POST'])
@@ -194,16 +370,28 @@ def create_question(library_id):
     answer_text = request.form.get('answer_text')
     question_type = request.form.get('question_type')
     difficulty = request.form.get('difficulty')
+    chapter = request.form.get('chapter', '').strip() or None
     
     if not question_text or not answer_text:
         flash('题目和答案不能为空！', 'danger')
         return redirect(url_for('question.questions', library_id=library_id))
+    try:
+        check_question_fields(question_type, difficulty)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('question.questions', library_id=library_id))
     
     # 创建题目
-    execute_db(
-        'INSERT INTO questions (library_id, question_text, answer_text, question_type, difficulty) VALUES (?, ?, ?, ?, ?)',
-        [library_id, question_text, answer_text, question_type, difficulty]
-    )
+    try:
+        execute_db(
+            'INSERT INTO questions (library_id, question_text, answer_text, question_type, difficulty, chapter, question_hash, simhash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [library_id, question_text, answer_text, question_type, difficulty, chapter, question_hash(question_text),
+             near_duplicates.simhash(question_text)]
+        )
+    except sqlite3.IntegrityError:
+        flash('题库中已存在相同的题目！', 'danger')
+        return redirect(url_for('question.questions', library_id=library_id))
+    index_pending_questions()
     
     flash('题目创建成功！', 'success')
     return redirect(url_for('question.questions', library_id=library_id))
@@ -223,17 +411,30 @@ def edit_question(question_id):
         answer_text = request.form.get('answer_text')
         question_type = request.form.get('question_type')
         difficulty = request.form.get('difficulty')
+        chapter = request.form.get('chapter', '').strip() or None
         
         if not question_text or not answer_text:
             flash('题目和答案不能为空！', 'danger')
             return redirect(url_for('question.edit_question', question_id=question_id))
+        try:
+            check_question_fields(question_type, difficulty)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('question.edit_question', question_id=question_id))
         
         # 更新题目
-        execute_db(
-            'UPDATE questions SET question_text = ?, answer_text = ?, question_type = ?, difficulty = ? WHERE id = ?',
-            [question_text, answer_text, question_type, difficulty, question_id]
-        )
+        try:
+            execute_db(
+                'UPDATE questions SET question_text = ?, answer_text = ?, question_type = ?, difficulty = ?, chapter = ?, question_hash = ?, simhash = ? WHERE id = ?',
+                [question_text, answer_text, question_type, difficulty, chapter, question_hash(question_text),
+                 near_duplicates.simhash(question_text), question_id]
+            )
+        except sqlite3.IntegrityError:
+            flash('题库中已存在相同的题目！', 'danger')
+            return redirect(url_for('question.edit_question', question_id=question_id))
+        index_pending_questions()
         
+        render_cache.invalidate_questions(get_db(), [question_id])
         flash('题目更新成功！', 'success')
         return redirect(url_for('question.questions', library_id=question['library_id']))
     
@@ -250,6 +451,7 @@ def delete_question(question_id):
         return redirect(url_for('library.libraries'))
     
     execute_db('DELETE FROM questions WHERE id = ?', [question_id])
+    render_cache.invalidate_questions(get_db(), [question_id])
     flash('题目删除成功！', 'success')
     return redirect(url_for('question.questions', library_id=question['library_id']))
 
@@ -281,42 +483,47 @@ def upload_questions(library_id):
             flash('不支持的文件类型！', 'danger')
             return redirect(request.url)
         
-        # 保存文件
-        upload_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        filename = file.filename
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
-        
+        # 保存文件并提交后台导入任务，由工作进程解析并写入数据库；限制每个用户同时进行的导入任务数量
         try:
-            # 解析文件并添加题目
-            questions = extract_questions_from_file(file_path)
-            
-            if not questions:
-                flash('未解析到题目！', 'danger')
-                return redirect(url_for('question.upload_questions', library_id=library_id))
-            
-            # 添加题目到数据库
-            for q in questions:
-                execute_db(
-                    'INSERT INTO questions (library_id, question_text, answer_text, question_type, difficulty) VALUES (?, ?, ?, ?, ?)',
-                    [library_id, q['question_text'], q['answer_text'], q['question_type'], q['difficulty']]
-                )
-            
-            flash(f'成功导入 {len(questions)} 道题目！', 'success')
-        except Exception as e:
-            flash(f'导入失败：{str(e)}', 'danger')
-        finally:
-            # 删除上传的文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            job_id = jobs.create_job(file, library_id, current_user.id,
+                                     max_jobs=current_app.config['IMPORT_MAX_JOBS_PER_USER'])
+        except jobs.TooManyJobs as e:
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'success': False, 'message': str(e)}), 429
+            flash(str(e), 'danger')
+            return redirect(request.url)
         
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status_url': url_for('question.import_job', job_id=job_id)
+            }), 202
+        
+        flash(f'导入任务已提交（任务编号 {job_id}），导入完成后题目会出现在列表中。', 'info')
         return redirect(url_for('question.questions', library_id=library_id))
     
     return render_template('upload.html', library=library)
 
 
+@question_bp.route('/jobs/<job_id>')
+@login_required
+def import_job(job_id):
+    """导入任务进度路由"""
+    job = jobs.get_job(job_id)
+    if not job or (job['user_id'] != current_user.id and not current_user.is_admin):
+        return jsonify({'success': False, 'message': '导入任务不存在！'}), 404
+    
+    return jsonify(jobs.job_to_dict(job))
+
+
+@question_bp.route('/media/<path:filename>')
+@login_required
+def question_media(filename):
+    """从 Word 文档导入的题目图片"""
+    return send_from_directory(current_app.config['QUESTION_MEDIA_FOLDER'], filename)
+
+
 @question_bp.route('/<int:library_id>/batch_delete', methods=['POST'])
 @login_required
 def batch_delete_questions(library_id):
@@ -330,8 +537,10 @@ def batch_delete_questions(library_id):
         question_ids = [int(id) for id in question_ids]
         
         # 批量删除题目
+        # +library_id 阻止查询规划器改用 library_id 上的索引扫描整个题库，按主键逐个查找
         placeholders = ','.join(['?'] * len(question_ids))
-        execute_db(f'DELETE FROM questions WHERE id IN ({placeholders}) AND library_id = ?', question_ids + [library_id])
+        execute_db(f'DELETE FROM questions WHERE id IN ({placeholders}) AND +library_id = ?', question_ids + [library_id])
+        render_cache.invalidate_questions(get_db(), question_ids)
         
         return jsonify({'success': True, 'message': f'成功删除 {len(question_ids)} 道题目！'})
     except Exception as e:
@@ -375,136 +584,200 @@ def generate_paper(library_id):
             flash('请至少选择一道题目！', 'danger')
             return redirect(request.url)
         
-        # 创建试卷
-        execute_db(
-            'INSERT INTO papers (title, description, user_id) VALUES (?, ?, ?)',
-            [paper_title, paper_description, current_user.id]
-        )
+        # 随机种子，留空则自动生成；相同种子和题库数据可复现抽题结果
+        seed = request.form.get('seed', '').strip()
+        try:
+            seed = int(seed) if seed else None
+        except ValueError:
+            flash('随机种子必须是整数！', 'danger')
+            return redirect(request.url)
         
-        # 获取试卷ID
-        paper = query_db('SELECT * FROM papers WHERE title = ? AND user_id = ? ORDER BY created_at DESC', 
-                        [paper_title, current_user.id], one=True)
-        paper_id = paper['id']
+        # 多套试卷（A/B/C 卷）数量，以及每种题型与前面各套试卷最多重复的题目比例（百分比）
+        variant_count = request.form.get('variant_count', 1, type=int) or 1
+        max_overlap = request.form.get('max_overlap', 0, type=int) or 0
+        if not 1 <= variant_count <= current_app.config['PAPER_MAX_VARIANTS']:
+            flash(f'试卷套数必须在 1 到 {current_app.config["PAPER_MAX_VARIANTS"]} 之间！', 'danger')
+            return redirect(request.url)
+        if not 0 <= max_overlap <= 100:
+            flash('试卷之间的重复比例必须在 0 到 100 之间！', 'danger')
+            return redirect(request.url)
+        
+        writer = paper_writer(request.form.get('writer'))
+        if writer is None:
+            flash('不支持的试卷写入方式！', 'danger')
+            return redirect(request.url)
         
-        # 收集题目
-        selected_questions = []
-        question_order = 0
+        # 先抽题，题目不足时不会留下空试卷
+        conn = get_db()
+        sampler = QuestionSampler(conn, library_id, seed)
+        try:
+            if variant_count == 1:
+                variants = [[]]
+                for q_type, count in question_counts.items():
+                    if count > 0:
+                        variants[0].extend(sampler.sample(q_type, count, question_difficulties[q_type]))
+            else:
+                # 每个题型只读取一次候选题目，再为各套试卷抽题
+                variant_ids = [[] for _ in range(variant_count)]
+                for q_type, count in question_counts.items():
+                    if count > 0:
+                        drawn = sampler.sample_variants(q_type, count, variant_count, question_difficulties[q_type],
+                                                        count * max_overlap // 100)
+                        for ids, picked in zip(variant_ids, drawn):
+                            ids.extend(picked)
+                rows = {q['id']: q for q in sampler.fetch(list({i for ids in variant_ids for i in ids}))}
+                variants = [[rows[i] for i in ids] for ids in variant_ids]
+        except InsufficientQuestions as e:
+            flash(f'{e.question_type} 题目数量不足！', 'danger')
+            return redirect(request.url)
         
-        for q_type, count in question_counts.items():
-            if count == 0:
-                continue
-            
-            # 构建查询
-            query = 'SELECT * FROM questions WHERE library_id = ? AND question_type = ?'
-            params = [library_id, q_type]
-            
-            # 添加难度条件
-            if question_difficulties[q_type] != 'all':
-                query += ' AND difficulty = ?'
-                params.append(question_difficulties[q_type])
-            
-            # 执行查询
-            available_questions = query_db(query, params)
-            
-            # 检查题目数量是否足够
-            if len(available_questions) < count:
-                flash(f'{q_type} 题目数量不足！', 'danger')
-                return redirect(request.url)
-            
-            # 随机选择题目
-            selected = random.sample(available_questions, count)
-            
-            # 添加到试卷
-            for q in selected:
-                question_order += 1
-                selected_questions.append(q)
-                
-                # 保存试卷题目关联
-                execute_db(
+        if variant_count == 1:
+            titles = [paper_title]
+        else:
+            titles = [f'{paper_title}（{chr(ord("A") + i)}卷）' for i in range(variant_count)]
+        
+        # 在一个事务中创建所有试卷并保存试卷题目关联
+        paper_ids = []
+        with conn:
+            for title, selected_questions in zip(titles, variants):
+                cursor = conn.execute(
+                    'INSERT INTO papers (title, description, user_id, library_id, seed) VALUES (?, ?, ?, ?, ?)',
+                    [title, paper_description, current_user.id, library_id, sampler.seed]
+                )
+                paper_id = cursor.lastrowid
+                paper_ids.append(paper_id)
+                conn.executemany(
                     'INSERT INTO paper_questions (paper_id, question_id, question_order) VALUES (?, ?, ?)',
-                    [paper_id, q['id'], question_order]
+                    [(paper_id, q['id'], order) for order, q in enumerate(selected_questions, 1)]
                 )
         
-        # 生成Word文档
-        doc = Document()
-        
-        # 添加标题
-        title = doc.add_heading(paper_title, 0)
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # 添加副标题
-        subtitle = doc.add_paragraph(f'题库：{library["name"]}')
-        subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        doc.add_paragraph('')  # 空行
-        
-        # 添加题目
-        current_type = None
-        question_num = 1
-        
-        for q in selected_questions:
-            # 如果题型变化，添加题型标题
-            if q['question_type'] != current_type:
-                current_type = q['question_type']
-                
-                # 题型中文名称
-                type_names = {
-                    'single_choice': '一、单选题',
-                    'multiple_choice': '二、多选题',
-                    'true_false': '三、判断题',
-                    'short_answer': '四、简答题',
-                    'essay': '五、论述题'
-                }
-                
-                doc.add_heading(type_names[current_type], level=1)
-                question_num = 1
-            
-            # 添加题目
-            doc.add_paragraph(f'{question_num}. {q["question_text"]}')
-            question_num += 1
-        
-        # 添加答案部分
-        doc.add_page_break()
-        doc.add_heading('参考答案', 0)
-        
-        current_type = None
-        question_num = 1
-        
-        for q in selected_questions:
-            # 如果题型变化，添加题型标题
-            if q['question_type'] != current_type:
-                current_type = q['question_type']
-                
-                # 题型中文名称
-                type_names = {
-                    'single_choice': '一、单选题答案',
-                    'multiple_choice': '二、多选题答案',
-                    'true_false': '三、判断题答案',
-                    'short_answer': '四、简答题答案',
-                    'essay': '五、论述题答案'
-                }
-                
-                doc.add_heading(type_names[current_type], level=1)
-                question_num = 1
-            
-            # 添加答案
-            doc.add_paragraph(f'{question_num}. {q["answer_text"]}')
-            question_num += 1
-        
-        # 保存文件
-        upload_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
+        # 多套试卷打包为 zip 下载
+        if variant_count > 1:
+            archive = render_cache.papers_zip(conn, zip(paper_ids, titles), library['name'], {'writer': writer})
+            return send_file(archive, as_attachment=True, download_name=f'试卷_{paper_title}.zip',
+                             mimetype='application/zip')
         
-        filename = f'试卷_{paper_title}.docx'
-        file_path = os.path.join(upload_folder, filename)
-        doc.save(file_path)
-        
-        # 返回文件下载
-        return send_file(file_path, as_attachment=True, download_name=filename)
+        # 生成 Word 文档（按内容缓存）并返回文件下载
+        file_path = render_cache.get_paper_file(conn, paper_ids[0], paper_title, library['name'], {'writer': writer})
+        return send_file(file_path, as_attachment=True, download_name=f'试卷_{paper_title}.docx')
     
     return render_template('generate_paper.html', library=library)
 
 
+@paper_bp.route('/assemble/<int:library_id>', methods=['POST'])
+@login_required
+def assemble_paper(library_id):
+    """
+    按组卷蓝图生成试卷路由（蓝图格式见 app/assembly.py）
+
+    JSON 请求：{"paper_title", "paper_description", "seed", "writer", "blueprint": {...}}，返回试卷 id 和组卷统计；
+    表单提交：blueprint 字段为 JSON 文本，直接下载生成的 Word 文档。
+    """
+    wants_json = request.is_json
+    
+    def fail(message, reasons=(), status=400):
+        if wants_json:
+            return jsonify({'success': False, 'message': message, 'reasons': list(reasons)}), status
+        flash(message, 'danger')
+        for reason in reasons:
+            flash(reason, 'danger')
+        return redirect(url_for('paper.generate_paper', library_id=library_id))
+    
+    library = query_db('SELECT * FROM libraries WHERE id = ?', [library_id], one=True)
+    if not library:
+        if wants_json:
+            return jsonify({'success': False, 'message': '题库不存在！'}), 404
+        flash('题库不存在！', 'danger')
+        return redirect(url_for('library.libraries'))
+    
+    if wants_json:
+        data = request.get_json(silent=True) or {}
+        blueprint_data = data.get('blueprint')
+    else:
+        data = request.form
+        try:
+            blueprint_data = json.loads(request.form.get('blueprint') or 'null')
+        except ValueError:
+            return fail('蓝图不是有效的 JSON！')
+    paper_title = data.get('paper_title') or f'{library["name"]}试卷'
+    paper_description = data.get('paper_description')
+    
+    seed = data.get('seed')
+    try:
+        seed = int(seed) if seed not in (None, '') else None
+    except (TypeError, ValueError):
+        return fail('随机种子必须是整数！')
+    
+    writer = paper_writer(data.get('writer'))
+    if writer is None:
+        return fail('不支持的试卷写入方式！')
+    
+    conn = get_db()
+    try:
+        result = assemble(conn, library_id, parse_blueprint(blueprint_data), seed)
+    except BlueprintError as e:
+        return fail(f'蓝图有误：{e}')
+    except AssemblyError as e:
+        return fail('无法按蓝图组卷！', e.reasons, 422)
+    
+    # 创建试卷并保存试卷题目关联
+    with conn:
+        cursor = conn.execute(
+            'INSERT INTO papers (title, description, user_id, library_id, seed) VALUES (?, ?, ?, ?, ?)',
+            [paper_title, paper_description, current_user.id, library_id, result['seed']]
+        )
+        paper_id = cursor.lastrowid
+        conn.executemany(
+            'INSERT INTO paper_questions (paper_id, question_id, question_order) VALUES (?, ?, ?)',
+            [(paper_id, question_id, order) for order, question_id in enumerate(result['question_ids'], 1)]
+        )
+    
+    if wants_json:
+        return jsonify({
+            'success': True,
+            'paper_id': paper_id,
+            'seed': result['seed'],
+            'question_ids': result['question_ids'],
+            'stats': result['stats']
+        }), 201
+    
+    file_path = render_cache.get_paper_file(conn, paper_id, paper_title, library['name'], {'writer': writer})
+    return send_file(file_path, as_attachment=True, download_name=f'试卷_{paper_title}.docx')
+
+
+def paper_writer(value):
+    """请求中指定的试卷写入方式，未指定时使用 PAPER_WRITER 配置，不支持时返回 None"""
+    writer = value or current_app.config['PAPER_WRITER']
+    return writer if writer in PAPER_WRITERS else None
+
+
+def paper_validators(paper, *parts):
+    """试卷的 ETag 和 Last-Modified，ETag 由试卷 id、版本号和 parts 组成"""
+    etag = '-'.join(str(part) for part in ('paper', paper['id'], paper['version']) + parts)
+    last_modified = datetime.strptime(paper['updated_at'] or paper['created_at'], '%Y-%m-%d %H:%M:%S')
+    return etag, last_modified.replace(tzinfo=timezone.utc)
+
+
+def with_validators(response, etag, last_modified):
+    """设置 ETag 和 Last-Modified；试卷需要登录才能查看，只允许浏览器缓存且每次使用前都要验证"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag, last_modified):
+    """If-None-Match/If-Modified-Since 与当前版本一致时返回 304 响应，否则返回 None"""
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    else:
+        matched = request.if_modified_since is not None and last_modified <= request.if_modified_since
+    if not matched:
+        return None
+    return with_validators(current_app.response_class(status=304), etag, last_modified)
+
+
 @paper_bp.route('/')
 @login_required
 def papers():
@@ -522,10 +795,148 @@ def paper(paper_id):
         flash('试卷不存在！', 'danger')
         return redirect(url_for('paper.papers'))
     
+    # 页面中显示当前用户，ETag 按用户区分；有待显示的提示消息时不返回 304
+    etag, last_modified = paper_validators(paper, 'user', current_user.id)
+    if not session.get('_flashes'):
+        response = not_modified(etag, last_modified)
+        if response:
+            return response
+    
     # 获取试卷题目
     paper_questions = query_db(
         'SELECT q.*, pq.question_order FROM questions q JOIN paper_questions pq ON q.id = pq.question_id WHERE pq.paper_id = ? ORDER BY pq.question_order', 
         [paper_id]
     )
     
-    return render_template('view_paper.html', paper=paper, questions=paper_questions)
\ No newline at end of file
+    response = make_response(render_template('view_paper.html', paper=paper, questions=paper_questions))
+    return with_validators(response, etag, last_modified)
+
+
+@paper_bp.route('/<int:paper_id>/download')
+@login_required
+def download_paper(paper_id):
+    """下载试卷 Word 文档路由，优先使用渲染缓存，支持 ETag/Last-Modified 条件请求；?writer= 指定写入方式"""
+    paper = query_db('SELECT * FROM papers WHERE id = ?', [paper_id], one=True)
+    if not paper:
+        flash('试卷不存在！', 'danger')
+        return redirect(url_for('paper.papers'))
+    
+    writer = paper_writer(request.args.get('writer'))
+    if writer is None:
+        flash('不支持的试卷写入方式！', 'danger')
+        return redirect(url_for('paper.paper', paper_id=paper_id))
+    
+    # 版本未变时直接返回 304，不查询题目也不读取缓存文件；两种写入方式生成的文件不同，ETag 中区分
+    etag, last_modified = paper_validators(paper, 'docx', writer)
+    response = not_modified(etag, last_modified)
+    if response:
+        return response
+    
+    conn = get_db()
+    library_name = render_cache.paper_library_name(conn, paper)
+    file_path = render_cache.get_paper_file(conn, paper_id, paper['title'], library_name, {'writer': writer})
+    response = send_file(file_path, as_attachment=True, download_name=f'试卷_{paper["title"]}.docx',
+                         etag=False, conditional=False)
+    return with_validators(response, etag, last_modified)
+
+
+@api_bp.route('/libraries/<int:library_id>/questions')
+@login_required
+def library_questions(library_id):
+    """题目分页 JSON 接口"""
+    library = query_db('SELECT id FROM libraries WHERE id = ?', [library_id], one=True)
+    if not library:
+        return jsonify({'success': False, 'message': '题库不存在！'}), 404
+    
+    try:
+        question_type, difficulty = get_question_filters()
+        questions, next_cursor = fetch_question_page(
+            library_id, request.args.get('cursor'), get_page_size(), question_type, difficulty
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'questions': [dict(q) for q in questions],
+        'next_cursor': next_cursor
+    })
+
+
+@api_bp.route('/libraries/<int:library_id>/questions:batch', methods=['POST'])
+@login_required
+def batch_write_questions(library_id):
+    """批量创建、修改、删除题目：请求体为 NDJSON，分批提交并逐行返回结果（格式见 app.batch_write）"""
+    library = query_db('SELECT id FROM libraries WHERE id = ?', [library_id], one=True)
+    if not library:
+        return jsonify({'success': False, 'message': '题库不存在！'}), 404
+    
+    results = batch_write.apply_batch(
+        get_db(), library_id, batch_write.iter_lines(request.stream),
+        current_app.config['QUESTION_TYPES'], current_app.config['QUESTION_DIFFICULTIES'],
+        current_app.config['BATCH_WRITE_CHUNK_SIZE']
+    )
+    return Response(stream_with_context(json.dumps(result, ensure_ascii=False) + '\n' for result in results),
+                    mimetype='application/x-ndjson')
+
+
+@api_bp.route('/user-cache')
+@admin_required
+def user_cache_stats():
+    """用户缓存命中统计（仅统计处理本次请求的进程）"""
+    return jsonify({'success': True, 'user_cache': get_user_cache().stats()})
+
+
+def get_near_duplicate_distance(max_distance):
+    """读取请求中的汉明距离阈值，默认使用 NEAR_DUPLICATE_DISTANCE 配置，超出 0 到 max_distance 时抛出 ValueError"""
+    distance = request.args.get('distance', type=int)
+    if distance is None:
+        distance = min(current_app.config['NEAR_DUPLICATE_DISTANCE'] or 0, max_distance)
+    if not 0 <= distance <= max_distance:
+        raise ValueError(f'距离阈值必须在 0 到 {max_distance} 之间！')
+    return distance
+
+
+@api_bp.route('/libraries/<int:library_id>/duplicates')
+@login_required
+def library_duplicates(library_id):
+    """题库近似重复题目簇 JSON 接口，按簇大小倒序，每页 page_size 个簇"""
+    library = query_db('SELECT id FROM libraries WHERE id = ?', [library_id], one=True)
+    if not library:
+        return jsonify({'success': False, 'message': '题库不存在！'}), 404
+    try:
+        distance = get_near_duplicate_distance(near_duplicates.MAX_CLUSTER_DISTANCE)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    conn = get_db()
+    clusters = near_duplicates.duplicate_clusters(conn, library_id, distance)
+    shown = clusters[:get_page_size()]
+    question_ids = [question_id for cluster in shown for question_id in cluster]
+    texts = {q['id']: q['question_text'] for q in fetch_questions(conn, question_ids)}
+    return jsonify({
+        'success': True,
+        'distance': distance,
+        'cluster_count': len(clusters),
+        'question_count': sum(len(cluster) for cluster in clusters),
+        'clusters': [[{'id': question_id, 'question_text': texts.get(question_id)} for question_id in cluster]
+                     for cluster in shown]
+    })
+
+
+@api_bp.route('/questions/<int:question_id>/duplicates')
+@login_required
+def question_duplicates(question_id):
+    """与指定题目近似重复的题目（包括其他题库）JSON 接口"""
+    if not query_db('SELECT id FROM questions WHERE id = ?', [question_id], one=True):
+        return jsonify({'success': False, 'message': '题目不存在！'}), 404
+    try:
+        distance = get_near_duplicate_distance(near_duplicates.MAX_BAND_DISTANCE)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'distance': distance,
+        'questions': near_duplicates.find_near_duplicates(get_db(), question_id, distance)
+    })
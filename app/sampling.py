@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+抽题引擎
+
+只通过索引读取候选题目的 id，抽样后再按 id 读取被选中题目的完整内容。
+
+候选题目较多且 id 分布较密时使用随机探测：在候选 id 的范围内取随机数 r，
+通过索引找到第一个 >= r 的候选 id，再以 1/间隔 的概率接受（间隔为它与前一个候选 id 的差），
+保证每道题被抽中的概率相同，耗时只与抽题数量有关，与题库大小无关。
+按估算的索引查找次数与候选数量比较，候选较少或 id 分布稀疏时直接扫描覆盖索引取出所有候选 id 再抽样。
+使用相同的种子和相同的题库数据可以得到相同的抽题结果。
+"""
+import random
+
+# 一次索引查找的耗时约相当于扫描索引读取多少个 id
+PROBE_COST = 12
+# 抽题数量超过候选数量的该比例时，随机探测会产生大量重复，改为扫描索引
+MAX_PROBE_FRACTION = 0.25
+
+
+class InsufficientQuestions(ValueError):
+    """候选题目数量不足"""
+
+    def __init__(self, question_type, available, requested):
+        self.question_type = question_type
+        self.available = available
+        self.requested = requested
+        super().__init__(f'{question_type} 题目数量不足（需要 {requested} 道，只有 {available} 道）')
+
+
+def new_seed():
+    """生成新的随机种子"""
+    return random.SystemRandom().randrange(2 ** 31)
+
+
+def fetch_questions(conn, ids):
+    """按 id 读取题目完整内容，保持 ids 的顺序"""
+    rows = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        for row in conn.execute(f'SELECT * FROM questions WHERE id IN ({placeholders})', chunk):
+            rows[row['id']] = row
+    return [rows[i] for i in ids if i in rows]
+
+
+class QuestionSampler:
+    """按题库、题型、难度随机抽题"""
+
+    def __init__(self, conn, library_id, seed=None):
+        self.conn = conn
+        self.library_id = library_id
+        self.seed = new_seed() if seed is None else seed
+        self.rng = random.Random(self.seed)
+
+    def buckets(self, question_type, difficulty=None):
+        """候选题目所在的 (难度, 数量) 列表，数量来自 library_stats 计数表"""
+        query = 'SELECT difficulty, question_count FROM library_stats WHERE library_id = ? AND question_type = ? AND question_count > 0'
+        params = [self.library_id, question_type]
+        if difficulty and difficulty != 'all':
+            query += ' AND difficulty = ?'
+            params.append(difficulty)
+        return [(row[0], row[1]) for row in self.conn.execute(query + ' ORDER BY difficulty', params)]
+
+    def count(self, question_type, difficulty=None):
+        """候选题目数量"""
+        return sum(count for _, count in self.buckets(question_type, difficulty))
+
+    def candidate_ids(self, question_type, difficulty=None):
+        """通过覆盖索引读取全部候选 id（按 id 排序，保证结果可复现）"""
+        query = 'SELECT id FROM questions WHERE library_id = ? AND question_type = ?'
+        params = [self.library_id, question_type]
+        if difficulty and difficulty != 'all':
+            query += ' AND difficulty = ?'
+            params.append(difficulty)
+        return sorted(row[0] for row in self.conn.execute(query, params))
+
+    def _probe(self, question_type, difficulties, condition, value):
+        """在各难度分桶中按索引查找一个 id，返回各分桶的查找结果"""
+        sql = f'SELECT id FROM questions WHERE library_id = ? AND question_type = ? AND difficulty = ? AND {condition}'
+        results = []
+        for difficulty in difficulties:
+            row = self.conn.execute(sql, [self.library_id, question_type, difficulty, value]).fetchone()
+            if row is not None:
+                results.append(row[0])
+        return results
+
+    def _probe_sample(self, question_type, difficulties, lo, hi, count, exclude):
+        """随机探测抽样"""
+        selected = []
+        seen = set(exclude)
+        while len(selected) < count:
+            r = self.rng.randint(lo, hi)
+            candidate = min(self._probe(question_type, difficulties, 'id >= ? ORDER BY id LIMIT 1', r))
+            previous = self._probe(question_type, difficulties, 'id < ? ORDER BY id DESC LIMIT 1', candidate)
+            gap = candidate - (max(previous) if previous else lo - 1)
+            # r 落在 (前一个候选 id, candidate] 内都会命中 candidate，按 1/间隔 接受才能保证等概率
+            if gap > 1 and self.rng.random() * gap >= 1:
+                continue
+            if candidate not in seen:
+                seen.add(candidate)
+                selected.append(candidate)
+        return selected
+
+    def sample_ids(self, question_type, count, difficulty=None, exclude=()):
+        """抽取 count 道题目的 id；exclude 中的 id 不会被抽中"""
+        if count <= 0:
+            return []
+        buckets = self.buckets(question_type, difficulty)
+        available = sum(n for _, n in buckets)
+        exclude = set(exclude)
+
+        # 每次探测需要在每个难度分桶各查找两次，命中率为候选 id 的密度
+        probe_cost = count * len(buckets) * 2 * PROBE_COST
+        if probe_cost < available and count + len(exclude) <= available * MAX_PROBE_FRACTION:
+            difficulties = [d for d, _ in buckets]
+            lo = min(self._probe(question_type, difficulties, 'id >= ? ORDER BY id LIMIT 1', 0))
+            hi = max(self._probe(question_type, difficulties, 'id <= ? ORDER BY id DESC LIMIT 1', 2 ** 63 - 1))
+            if probe_cost * (hi - lo + 1) / available < available:
+                return self._probe_sample(question_type, difficulties, lo, hi, count, exclude)
+
+        candidates = [i for i in self.candidate_ids(question_type, difficulty) if i not in exclude]
+        if len(candidates) < count:
+            raise InsufficientQuestions(question_type, len(candidates), count)
+        return self.rng.sample(candidates, count)
+
+    def fetch(self, ids):
+        """按 id 读取题目完整内容，保持 ids 的顺序"""
+        return fetch_questions(self.conn, ids)
+
+    def sample(self, question_type, count, difficulty=None, exclude=()):
+        """抽取 count 道题目并返回完整内容"""
+        return self.fetch(self.sample_ids(question_type, count, difficulty, exclude))
+
+    def sample_variants(self, question_type, count, variants, difficulty=None, max_overlap=0):
+        """
+        为多套试卷抽取同一题型的题目，返回每套试卷的 id 列表。
+
+        候选题目足够时一次抽取所有试卷的题目，各套试卷互不重复。
+        否则候选 id 只读取一次，每套试卷优先抽取前面各套都没用过的题目，
+        不够时才从已用过的题目中补足，与前面各套重复的题目不超过 max_overlap 道。
+        """
+        if count <= 0:
+            return [[] for _ in range(variants)]
+        total = count * variants
+        if self.count(question_type, difficulty) >= total:
+            # 候选题目足够时各套试卷互不重复，一次抽取后分组即可
+            ids = self.sample_ids(question_type, total, difficulty)
+            return [ids[start:start + count] for start in range(0, total, count)]
+
+        unused = self.candidate_ids(question_type, difficulty)
+        needed = count + (variants - 1) * max(0, count - max_overlap)
+        if len(unused) < needed:
+            raise InsufficientQuestions(question_type, len(unused), needed)
+
+        used = []
+        result = []
+        for variant in range(variants):
+            # 为后面每套试卷预留至少 count - max_overlap 道未用过的题目
+            reserved = (variants - 1 - variant) * max(0, count - max_overlap)
+            fresh = min(count, len(unused) - reserved)
+            indexes = self.rng.sample(range(len(unused)), fresh)
+            picked = [unused[i] for i in indexes]
+            # 从后往前用末尾元素覆盖被抽中的位置，避免每套试卷都重建候选列表
+            for i in sorted(indexes, reverse=True):
+                unused[i] = unused[-1]
+                unused.pop()
+            picked += self.rng.sample(used, count - fresh)
+            used += picked[:fresh]
+            self.rng.shuffle(picked)
+            result.append(picked)
+        return result
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+题目全文检索模块
+
+questions_fts 是以 questions_search 为外部内容的 FTS5 表，rowid 为题目 id。
+FTS5 自带的分词器不能切分中文，写入前先用 search_tokens() 把文本转换为以空格分隔的词元：
+- 连续的汉字切分为相邻两字的二元组，并在末尾补上最后一个字，例如“椭圆形”为“椭圆 圆形 形”
+- 字母和数字按单词切分并转为小写
+题库、题型和难度写入 tags 列，筛选条件作为 MATCH 表达式的一部分在全文索引中求交集。
+
+词元由应用计算并写入 questions_search，触发器只使用纯 SQL（任何连接都可以写入 questions）：
+题目新增或修改时触发器删除旧词元，把题目 id 登记到 questions_search_pending；
+写入题目的代码在同一事务中调用 index_pending() 计算这些题目的词元（同时补算缺少的 SimHash 指纹）。
+不经过应用写入的题目在下一次应用写入题目时一并索引，在此之前检索不到。
+修改分词规则后执行 flask search-rebuild 重新计算全部词元并重建索引。
+"""
+import re
+import unicodedata
+import click
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+from app.near_duplicates import simhash
+
+CJK_CHARS = '㐀-䶿一-鿿豈-﫿'
+TOKEN_PATTERN = re.compile(f'([{CJK_CHARS}]+)|([^\\W_{CJK_CHARS}]+)')
+
+# index_pending() 每批处理的题目数
+INDEX_CHUNK_SIZE = 500
+
+# 检索结果中每段摘要前后保留的字符数
+SNIPPET_CONTEXT = 30
+# 只对最新的这么多条命中结果按相关度排序。BM25 要为所有命中结果打分，
+# 常见词在百万题目中可能命中大部分题目，全部排序要数百毫秒
+SEARCH_RANK_WINDOW = 2000
+
+
+def _normalize(text):
+    """全角转半角并转为小写"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def search_tokens(text):
+    """把文本转换为以空格分隔的索引词元"""
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(_normalize(text)):
+        if cjk:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.append(cjk[-1])
+        else:
+            tokens.append(word)
+    return ' '.join(tokens)
+
+
+def search_tags(library_id, question_type, difficulty):
+    """题库、题型和难度标签，下划线会被 FTS5 当作分隔符，先去掉"""
+    return ' '.join([f'l{library_id}', 't' + (question_type or '').replace('_', ''),
+                     'd' + (difficulty or '').replace('_', '')])
+
+
+def query_terms(query):
+    """
+    解析检索词，返回 [(原文, FTS5 短语)]
+
+    汉字串检索其中连续的二元组短语，单个汉字按前缀检索（索引中每个字都是某个词元的开头）。
+    """
+    terms = []
+    for cjk, word in TOKEN_PATTERN.findall(_normalize(query)):
+        if cjk and len(cjk) == 1:
+            terms.append((cjk, f'"{cjk}"*'))
+        elif cjk:
+            terms.append((cjk, '"' + ' '.join(cjk[i:i + 2] for i in range(len(cjk) - 1)) + '"'))
+        else:
+            terms.append((word, f'"{word}"'))
+    return terms
+
+
+def match_expression(terms, library_id=None, question_type=None, difficulty=None):
+    """由检索词和筛选条件生成 MATCH 表达式：各检索词同时出现在题目或答案中，且满足全部筛选条件"""
+    expression = ' AND '.join(f'{{question_text answer_text}} : {phrase}' for _, phrase in terms)
+    tags = search_tags(library_id, question_type, difficulty).split()
+    filters = [tag for tag, value in zip(tags, (library_id, question_type, difficulty)) if value]
+    if filters:
+        expression += ' AND tags : (' + ' AND '.join(f'"{tag}"' for tag in filters) + ')'
+    return expression
+
+
+def _normalize_with_offsets(text):
+    """逐字归一化，返回 (归一化文本, 每个字符在原文中的位置)"""
+    chars, offsets = [], []
+    for i, char in enumerate(text):
+        normalized = _normalize(char)
+        chars.append(normalized)
+        offsets.extend([i] * len(normalized))
+    offsets.append(len(text))
+    return ''.join(chars), offsets
+
+
+def snippet(text, terms, context=SNIPPET_CONTEXT):
+    """从原文中截取第一处命中前后的片段并用 <mark> 标出检索词，没有命中时返回 None；结果已做 HTML 转义"""
+    text = text or ''
+    normalized, offsets = _normalize_with_offsets(text)
+    pattern = re.compile('|'.join(re.escape(term) for term, _ in sorted(terms, key=lambda t: -len(t[0]))))
+    first = pattern.search(normalized)
+    if first is None:
+        return None
+    start = max(0, offsets[first.start()] - context)
+    end = min(len(text), offsets[first.end()] + context * 2)
+    parts = ['…' if start > 0 else '']
+    position = start
+    for match in pattern.finditer(normalized, first.start()):
+        match_start, match_end = offsets[match.start()], offsets[match.end()]
+        if match_end > end:
+            break
+        parts.append(escape(text[position:match_start]))
+        parts.append(Markup('<mark>%s</mark>') % text[match_start:match_end])
+        position = match_end
+    parts.append(escape(text[position:end]))
+    parts.append('…' if end < len(text) else '')
+    return Markup('').join(parts)
+
+
+def search_questions(conn, query, library_id=None, question_type=None, difficulty=None, page=1, page_size=20):
+    """
+    按 BM25 相关度检索题目，返回 (结果列表, 是否还有下一页)
+
+    命中结果超过 SEARCH_RANK_WINDOW 条时只在最新的 SEARCH_RANK_WINDOW 条中排序和分页。
+    结果包含题目字段和 question_snippet/answer_snippet（带 <mark> 的 HTML 片段）。
+    检索词中没有可检索的文字时返回空结果。
+    """
+    terms = query_terms(query)
+    if not terms:
+        return [], False
+    rows = conn.execute(
+        # 题目文本的权重高于答案，标签列不参与评分
+        'SELECT rowid, score FROM ('
+        '    SELECT rowid, bm25(questions_fts, 2.0, 1.0, 0.0) AS score FROM questions_fts '
+        '    WHERE questions_fts MATCH ? ORDER BY rowid DESC LIMIT ?'
+        ') ORDER BY score, rowid DESC LIMIT ? OFFSET ?',
+        [match_expression(terms, library_id, question_type, difficulty), SEARCH_RANK_WINDOW,
+         page_size + 1, (page - 1) * page_size]
+    ).fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not rows:
+        return [], has_more
+
+    scores = {row[0]: row[1] for row in rows}
+    placeholders = ','.join('?' * len(scores))
+    questions = {q['id']: q for q in conn.execute(
+        'SELECT id, library_id, question_text, answer_text, question_type, difficulty, chapter, created_at '
+        f'FROM questions WHERE id IN ({placeholders})',
+        list(scores)
+    )}
+    results = []
+    for question_id, score in scores.items():
+        q = questions.get(question_id)
+        if q is None:
+            continue
+        result = dict(q)
+        result['score'] = -score
+        result['question_snippet'] = snippet(q['question_text'], terms) or escape(q['question_text'][:SNIPPET_CONTEXT * 3])
+        result['answer_snippet'] = snippet(q['answer_text'], terms)
+        results.append(result)
+    return results, has_more
+
+
+def _index_rows(conn, rows):
+    """写入题目的词元（已有词元的题目覆盖旧值，不经过触发器），并补算缺少的指纹"""
+    conn.executemany(
+        'INSERT INTO questions_search (id, question_text, answer_text, tags) VALUES (?, ?, ?, ?) '
+        'ON CONFLICT (id) DO UPDATE SET question_text = excluded.question_text, '
+        'answer_text = excluded.answer_text, tags = excluded.tags',
+        [(row['id'], search_tokens(row['question_text']), search_tokens(row['answer_text']),
+          search_tags(row['library_id'], row['question_type'], row['difficulty'])) for row in rows]
+    )
+    conn.executemany('UPDATE questions SET simhash = ? WHERE id = ?',
+                     [(simhash(row['question_text']), row['id']) for row in rows if row['simhash'] is None])
+
+
+def index_pending(conn, chunk_size=INDEX_CHUNK_SIZE):
+    """
+    为 questions_search_pending 中登记的题目写入全文索引并补算指纹，返回处理的题目数量。
+    在写入题目的事务中、提交之前调用，不提交事务
+    """
+    total = 0
+    while True:
+        ids = [row[0] for row in conn.execute('SELECT question_id FROM questions_search_pending LIMIT ?', [chunk_size])]
+        if not ids:
+            return total
+        placeholders = ','.join('?' * len(ids))
+        _index_rows(conn, conn.execute(
+            'SELECT id, library_id, question_text, answer_text, question_type, difficulty, simhash '
+            f'FROM questions WHERE id IN ({placeholders})', ids
+        ).fetchall())
+        conn.execute(f'DELETE FROM questions_search_pending WHERE question_id IN ({placeholders})', ids)
+        total += len(ids)
+
+
+def rebuild_index(conn, chunk_size=INDEX_CHUNK_SIZE):
+    """重新计算全部题目的词元并重建全文索引（修改分词规则后执行），不提交事务；返回题目数量"""
+    conn.execute('DELETE FROM questions_search_pending')
+    conn.execute('DELETE FROM questions_search WHERE id NOT IN (SELECT id FROM questions)')
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, library_id, question_text, answer_text, question_type, difficulty, simhash '
+            'FROM questions WHERE id > ? ORDER BY id LIMIT ?', [last_id, chunk_size]
+        ).fetchall()
+        if not rows:
+            break
+        _index_rows(conn, rows)
+        last_id = rows[-1]['id']
+    # 按 questions_search 的当前内容重写全文索引
+    conn.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO questions_fts (questions_fts) VALUES ('optimize')")
+    return conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+
+
+@click.command('search-rebuild')
+@with_appcontext
+def rebuild_index_command():
+    """重建题目全文索引"""
+    from app.database import get_db
+    conn = get_db()
+    with conn:
+        count = rebuild_index(conn)
+    click.echo(f'已重建 {count} 道题目的全文索引')
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_index_command)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试数据生成模块
+
+按固定随机种子生成可复现的合成题目：题干和答案由常用汉字组成的词按 Zipf 分布拼接，
+夹带学科术语、Markdown 加粗、行内代码、选项和编号列表，题型和难度按常见题库的比例分布。
+flask seed-bench 把 N 个题库 × M 道题目批量写入数据库，benchmarks/run.py 用它准备不同规模的数据。
+"""
+import itertools
+import random
+import click
+from flask.cli import with_appcontext
+from app.export import question_markdown
+from app.near_duplicates import simhash
+from app.utils import bulk_insert_questions, question_hash
+
+COMMON_CHARS = (
+    '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行'
+    '学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外'
+    '天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情'
+    '者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角'
+    '期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交'
+    '受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节'
+    '话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备'
+    '半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片'
+    '始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严'
+)
+TERMS = [
+    '操作系统', '进程调度', '虚拟内存', '死锁', '文件系统', '数据库', '事务隔离', '索引', '范式', '查询优化',
+    '计算机网络', '三次握手', '拥塞控制', '路由协议', '数据结构', '二叉树', '哈希表', '动态规划', '排序算法', '图的遍历',
+    '编译原理', '词法分析', '语法分析', '中间代码', '牛顿第一定律', '动量守恒', '电磁感应', '光的折射', '化学平衡', '氧化还原',
+    '细胞分裂', '光合作用', '遗传规律', '市场经济', '边际效用', '供求关系', '宏观调控', '唯物辩证法', '认识论', '社会主义',
+]
+STEMS = ['简述{}的基本原理', '说明{}的主要特点', '下列关于{}的说法正确的是', '{}的作用是什么', '比较{}与{}的区别',
+         '论述{}在实际中的应用', '判断：{}属于{}的范畴', '解释{}的含义']
+INLINE_CODE = ['`fork()`', '`SELECT *`', '`O(n log n)`', '`malloc`', '`TCP/IP`', '`x = x + 1`']
+
+# 题型和难度的分布
+QUESTION_TYPE_WEIGHTS = {'single_choice': 40, 'multiple_choice': 20, 'true_false': 20, 'short_answer': 15, 'essay': 5}
+DIFFICULTY_WEIGHTS = {'easy': 30, 'medium': 50, 'hard': 20}
+
+
+class QuestionGenerator:
+    """按随机种子生成合成题目，同一种子生成的题目序列完全相同"""
+
+    def __init__(self, seed=0, vocabulary_size=5000):
+        self.random = random.Random(seed)
+        self.words = [
+            ''.join(self.random.choices(COMMON_CHARS, k=self.random.choice((1, 2, 2, 2, 3, 4))))
+            for _ in range(vocabulary_size)
+        ]
+        # 词频按 Zipf 分布，少数常用词出现得最多
+        self.word_weights = list(itertools.accumulate(1 / (i + 1) ** 0.8 for i in range(vocabulary_size)))
+        self.types = list(QUESTION_TYPE_WEIGHTS)
+        self.type_weights = list(itertools.accumulate(QUESTION_TYPE_WEIGHTS.values()))
+        self.difficulties = list(DIFFICULTY_WEIGHTS)
+        self.difficulty_weights = list(itertools.accumulate(DIFFICULTY_WEIGHTS.values()))
+
+    def sentence(self, min_words=4, max_words=14):
+        r = self.random
+        text = ''.join(r.choices(self.words, cum_weights=self.word_weights, k=r.randint(min_words, max_words)))
+        roll = r.random()
+        if roll < 0.1:
+            return f'**{text}**'
+        if roll < 0.15:
+            return text + r.choice(INLINE_CODE)
+        return text
+
+    def stem(self):
+        r = self.random
+        terms = r.sample(TERMS, 2)
+        return r.choice(STEMS).format(*terms) + '，' + self.sentence()
+
+    def question(self):
+        """生成一道题目，返回 {'question_text', 'answer_text', 'question_type', 'difficulty'}"""
+        r = self.random
+        question_type = r.choices(self.types, cum_weights=self.type_weights)[0]
+        difficulty = r.choices(self.difficulties, cum_weights=self.difficulty_weights)[0]
+        text = self.stem() + '？'
+        if question_type in ('single_choice', 'multiple_choice'):
+            text += ''.join(f'\n{label}. {self.sentence(2, 6)}' for label in 'ABCD')
+            count = 1 if question_type == 'single_choice' else r.randint(2, 4)
+            answer = ''.join(sorted(r.sample('ABCD', count)))
+        elif question_type == 'true_false':
+            answer = r.choice(('正确', '错误'))
+        elif question_type == 'short_answer':
+            answer = '\n'.join(f'{i}. {self.sentence()}' for i in range(1, r.randint(2, 4) + 1))
+        else:
+            answer = '\n\n'.join(
+                self.sentence(20, 40) + '。' + self.sentence(10, 30) + '。' for _ in range(r.randint(2, 4))
+            )
+        return {'question_text': text, 'answer_text': answer, 'question_type': question_type, 'difficulty': difficulty}
+
+    def questions(self, count):
+        """生成 count 道可直接交给 bulk_insert_questions 的题目"""
+        for _ in range(count):
+            q = self.question()
+            q['question_hash'] = question_hash(q['question_text'])
+            q['simhash'] = simhash(q['question_text'])
+            yield q
+
+
+def write_markdown(fileobj, questions, title='基准测试题库'):
+    """把题目写成可导入的 Markdown 文本（fileobj 以文本方式打开），返回题目数量"""
+    fileobj.write(f'# {title}\n\n')
+    count = 0
+    for count, q in enumerate(questions, 1):
+        fileobj.write(question_markdown(count, q))
+    return count
+
+
+def seed_bench(conn, libraries, questions_per_library, seed=0, user_id=1, chunk_size=2000, progress=None):
+    """
+    创建 libraries 个基准题库，每个写入 questions_per_library 道合成题目
+
+    不做近似重复检测；每批单独提交。progress(已写入题目数) 在每批写入后调用。
+    返回新建题库的 id 列表。
+    """
+    generator = QuestionGenerator(seed)
+    library_ids = []
+    written = 0
+    for i in range(libraries):
+        with conn:
+            cur = conn.execute(
+                'INSERT INTO libraries (name, description, user_id) VALUES (?, ?, ?)',
+                [f'基准题库 {seed}-{i + 1}', f'seed-bench 生成的合成题目（种子 {seed}）', user_id]
+            )
+        library_id = cur.lastrowid
+        library_ids.append(library_id)
+
+        def on_chunk(stats):
+            if progress:
+                progress(written + stats['inserted'] + stats['duplicates'])
+
+        stats = bulk_insert_questions(conn, library_id, generator.questions(questions_per_library), chunk_size,
+                                      on_chunk, commit_chunks=True)
+        written += stats['inserted'] + stats['duplicates']
+    return library_ids
+
+
+@click.command('seed-bench')
+@click.option('--libraries', type=int, default=1, help='题库数量')
+@click.option('--questions', type=int, default=1000, help='每个题库的题目数量')
+@click.option('--seed', type=int, default=0, help='随机种子，相同种子生成相同的题目')
+@click.option('--user-id', type=int, default=1, help='题库所属用户')
+@with_appcontext
+def seed_bench_command(libraries, questions, seed, user_id):
+    """批量生成基准测试用的题库和题目"""
+    from app.database import get_db
+    total = libraries * questions
+    with click.progressbar(length=total, label='写入题目') as bar:
+        done = 0
+
+        def progress(count):
+            nonlocal done
+            bar.update(count - done)
+            done = count
+
+        library_ids = seed_bench(get_db(), libraries, questions, seed, user_id, progress=progress)
+    click.echo(f'已创建题库 {", ".join(map(str, library_ids))}，共 {total} 道题目')
+
+
+def init_app(app):
+    app.cli.add_command(seed_bench_command)
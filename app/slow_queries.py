@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+慢查询日志
+
+database.connect() 创建的连接上执行的语句（执行和读取结果的总耗时，见 metrics.TimedCursor）
+达到 SLOW_QUERY_SECONDS 时，把规范化后的 SQL、参数形状、耗时、行数（读取或修改的行数）和 EXPLAIN QUERY PLAN 的结果
+追加到 SLOW_QUERY_LOG（每行一个 JSON）。后台导入进程使用同样的配置。
+规范化时字面量替换为 ?，IN (?, ?, ...) 合并为 IN (?...)，只有参数个数不同的动态 SQL 得到相同的指纹。
+EXPLAIN 的结果按指纹缓存在进程内，同一语句只分析一次。
+
+日志以追加方式写入，多个进程可以同时写。flask slow-queries 按指纹汇总，按总耗时列出最慢的语句。
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from functools import lru_cache
+import click
+from flask import current_app, has_request_context, request
+from flask.cli import with_appcontext
+
+# 进程内缓存执行计划的指纹数量上限
+PLAN_CACHE_SIZE = 256
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\bIN \(\?(?:, ?\?)*\)', re.IGNORECASE)
+# 没有使用索引的全表扫描，如 "SCAN questions"；"SCAN questions USING INDEX ..." 为索引扫描
+_FULL_SCAN = re.compile(r'^SCAN \w+(?: AS \w+)?$')
+
+# 慢查询阈值（秒），None 表示不记录；由 configure() 设置
+threshold = None
+_path = None
+_plans = collections.OrderedDict()
+_plans_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+def configure(seconds, path):
+    """设置慢查询阈值和日志文件"""
+    global threshold, _path
+    threshold = seconds
+    _path = path
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """把字面量替换为 ?，合并空白和 IN 列表"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip()
+    return _IN_LIST.sub('IN (?...)', sql)
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode('utf-8')).hexdigest()[:12]
+
+
+def _type_name(value):
+    return 'null' if value is None else type(value).__name__
+
+
+def param_shape(args):
+    """参数的类型和个数，连续的同类型参数合并，如 "int×300, int" """
+    if isinstance(args, dict):
+        return ', '.join(f':{name} {_type_name(value)}' for name, value in args.items())
+    runs = []
+    for value in args or ():
+        name = _type_name(value)
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return ', '.join(name if count == 1 else f'{name}×{count}' for name, count in runs)
+
+
+def explain(conn, sql, args):
+    """EXPLAIN QUERY PLAN 的结果，按层级缩进"""
+    try:
+        # 使用未计时的游标，EXPLAIN 本身不计入统计
+        rows = sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, args).fetchall()
+    except sqlite3.Error as e:
+        return [f'EXPLAIN 失败：{e}']
+    depth = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append('  ' * depth[node_id] + detail)
+    return plan
+
+
+def _cached_plan(conn, key, sql, args):
+    with _plans_lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+    plan = explain(conn, sql, args)
+    with _plans_lock:
+        _plans[key] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+
+def is_full_scan(plan):
+    return any(_FULL_SCAN.match(line.strip()) for line in plan)
+
+
+def record(conn, sql, args, seconds, rows):
+    """记录在 conn 上执行的一条慢查询"""
+    normalized = normalize_sql(sql)
+    key = fingerprint(normalized)
+    plan = _cached_plan(conn, key, sql, args)
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'fingerprint': key,
+        'sql': normalized,
+        'params': param_shape(args),
+        'ms': round(seconds * 1000, 3),
+        'rows': rows,
+        'endpoint': request.endpoint if has_request_context() else None,
+        'plan': plan
+    }
+    logger.warning('慢查询 %.1f ms（%s 行）：%s', entry['ms'], rows, normalized)
+    if _path:
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        # 一次 write 追加整行，多个进程同时写入时不会交错
+        fd = os.open(_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def iter_log(path):
+    """逐条读取慢查询日志，跳过损坏的行"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def summarize(entries):
+    """按指纹汇总，按总耗时从高到低排序"""
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'calls': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'rows': 0, 'params': set(), 'endpoints': set(), 'plan': [], 'last_seen': None
+            }
+        group['calls'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['rows'] += entry['rows'] or 0
+        group['params'].add(entry['params'])
+        if entry['endpoint']:
+            group['endpoints'].add(entry['endpoint'])
+        group['plan'] = entry['plan']
+        group['last_seen'] = entry['time']
+    for group in groups.values():
+        group['full_scan'] = is_full_scan(group['plan'])
+    return sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
+
+
+def log_path(app):
+    return app.config['SLOW_QUERY_LOG'] or app.config['DATABASE'] + '.slow-queries.jsonl'
+
+
+@click.command('slow-queries')
+@click.option('--limit', type=int, default=20, help='列出的语句数量')
+@click.option('--clear', is_flag=True, help='输出后清空日志')
+@with_appcontext
+def slow_queries_command(limit, clear):
+    """按总耗时列出慢查询日志中最慢的语句"""
+    path = log_path(current_app)
+    groups = summarize(iter_log(path))
+    if not groups:
+        click.echo(f'{path} 中没有慢查询记录')
+    for rank, group in enumerate(groups[:limit], 1):
+        click.echo(
+            f'#{rank} [{group["fingerprint"]}] 总计 {group["total_ms"]:.1f} ms，{group["calls"]} 次，'
+            f'平均 {group["total_ms"] / group["calls"]:.1f} ms，最长 {group["max_ms"]:.1f} ms，'
+            f'共 {group["rows"]} 行' + ('，全表扫描' if group['full_scan'] else '')
+        )
+        click.echo(f'    SQL：{group["sql"]}')
+        click.echo(f'    参数：{" | ".join(sorted(group["params"])) or "无"}')
+        click.echo(f'    端点：{", ".join(sorted(group["endpoints"])) or "无（后台或命令行）"}，最近 {group["last_seen"]}')
+        click.echo('    执行计划：')
+        for line in group['plan']:
+            click.echo(f'      {line}')
+    if len(groups) > limit:
+        click.echo(f'另有 {len(groups) - limit} 条语句未列出')
+    if clear and os.path.exists(path):
+        os.remove(path)
+        click.echo('已清空慢查询日志')
+
+
+def init_app(app):
+    configure(app.config['SLOW_QUERY_SECONDS'], log_path(app))
+    app.cli.add_command(slow_queries_command)
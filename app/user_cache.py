@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+用户对象缓存模块
+
+Flask-Login 在每个需要登录的请求中调用 load_user，按用户 id 查询 users 表。
+每个进程在内存中保存最近使用的 User 对象（LRU，最多 USER_CACHE_SIZE 个，USER_CACHE_TTL 秒后过期）。
+
+多个工作进程之间通过一个标记文件同步失效：修改用户资料、角色或密码后调用 invalidate_user()，
+清除本进程缓存并更新标记文件的修改时间；各进程每次查缓存前读取标记文件的修改时间（一次 stat），
+发现变化就清空自己的缓存。直接修改数据库而没有调用 invalidate_user() 时，最多 USER_CACHE_TTL 秒后生效。
+"""
+import collections
+import os
+import threading
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+class UserCache:
+    """进程内的 User 对象缓存，带命中和未命中计数"""
+
+    def __init__(self, stamp_path, size=1024, ttl=300):
+        self.stamp_path = stamp_path
+        self.size = size
+        self.ttl = ttl
+        self.pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = collections.OrderedDict()  # 用户 id -> (过期时间, User)
+        self._lock = threading.Lock()
+        self._stamp = self._read_stamp()
+
+    def _read_stamp(self):
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self, user_id, load):
+        """返回缓存的 User 对象，未命中或已过期时调用 load(user_id) 加载；不缓存不存在的用户"""
+        if self.size <= 0 or self.ttl <= 0:
+            with self._lock:
+                self.misses += 1
+            return load(user_id)
+
+        # 先读标记再查数据库：加载期间其他进程修改了用户，下次请求会发现标记变化并清空缓存
+        stamp = self._read_stamp()
+        now = time.monotonic()
+        with self._lock:
+            if stamp != self._stamp:
+                self._entries.clear()
+                self._stamp = stamp
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = load(user_id)
+        with self._lock:
+            if user is not None and stamp == self._stamp:
+                self._entries[user_id] = (now + self.ttl, user)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id=None):
+        """清除指定用户（user_id 为 None 时清除全部用户）的缓存，并通知其他进程"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+            self.invalidations += 1
+        # 不更新 self._stamp：同一时刻其他进程也可能更新了标记，下次查缓存时本进程会清空一次缓存
+        os.makedirs(os.path.dirname(self.stamp_path) or '.', exist_ok=True)
+        with open(self.stamp_path, 'a'):
+            pass
+        now = time.time_ns()
+        os.utime(self.stamp_path, ns=(now, now))
+
+    def stats(self):
+        """本进程的缓存统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': self.pid,
+                'size': len(self._entries),
+                'max_size': self.size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+def get_user_cache(app=None):
+    """获取当前进程的用户缓存，fork 之后会重新创建"""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('user_cache')
+    if cache is None or cache.pid != os.getpid():
+        cache = UserCache(
+            app.config.get('USER_CACHE_STAMP') or app.config['DATABASE'] + '.users-stamp',
+            size=app.config['USER_CACHE_SIZE'],
+            ttl=app.config['USER_CACHE_TTL']
+        )
+        app.extensions['user_cache'] = cache
+    return cache
+
+
+def invalidate_user(user_id=None):
+    """修改用户资料、角色或密码后调用，所有进程都会重新从数据库加载该用户"""
+    get_user_cache().invalidate(int(user_id) if user_id is not None else None)
+
+
+@click.command('user-cache-invalidate')
+@click.argument('user_id', type=int, required=False)
+@with_appcontext
+def invalidate_user_command(user_id):
+    """直接修改数据库中的用户后，通知所有工作进程重新加载用户（不指定用户 id 时清除全部）"""
+    invalidate_user(user_id)
+    click.echo('已通知所有进程清除用户缓存')
+
+
+def init_app(app):
+    app.cli.add_command(invalidate_user_command)
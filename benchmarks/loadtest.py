@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 压测工具
+
+按场景文件模拟多个用户并发访问：每个虚拟用户先通过 /auth/login 登录，然后按权重随机发出请求，
+请求之间停顿 think_time 秒。场景可以分为多个阶段，每个阶段设置持续时间、并发用户数和请求权重，
+用来重放考试当天早上先集中登录、再集中组卷的流量。结束后按接口输出吞吐量、p50/p95/p99 延迟和错误率。
+
+压测对象可以是已经启动的服务（--url http://127.0.0.1:5000），
+也可以是进程内的 WSGI 应用（--wsgi wsgi:app，通过 Flask 测试客户端调用，不经过网络和 WSGI 服务器）。
+
+用法：
+    python benchmarks/loadtest.py benchmarks/scenarios/exam_morning.json --url http://127.0.0.1:5000
+    python benchmarks/loadtest.py benchmarks/scenarios/exam_morning.json --wsgi wsgi:app --output result.json
+
+场景文件格式见 benchmarks/scenarios/exam_morning.json：
+- users: 登录账号列表，虚拟用户轮流使用
+- variables: 路径和表单中 {name} 占位符的取值，值为列表时每次请求随机取一个
+- requests: 请求列表，每项包含 name、method、path、weight，可选 form（表单）、upload（上传生成的题目文件）、
+  headers 和 expect（视为成功的状态码，默认 2xx 和 3xx）；login 为 true 的项表示重新登录
+- phases: 阶段列表，每项包含 duration（秒）、users（并发用户数），可选 weights（按 name 覆盖权重）
+"""
+import argparse
+import http.client
+import http.cookies
+import importlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class HttpClient:
+    """基于 http.client 的客户端，保持连接并自行保存 Cookie，不跟随重定向"""
+
+    def __init__(self, base_url, timeout=30):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parsed.netloc
+        self.prefix = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookies.SimpleCookie()
+        self.connection = None
+
+    def request(self, method, path, form=None, files=None, headers=None):
+        """发出请求并读完响应，返回 (状态码, 响应头字典)"""
+        headers = dict(headers or {})
+        body = None
+        if files:
+            body, headers['Content-Type'] = encode_multipart(form or {}, files)
+        elif form is not None:
+            body = urllib.parse.urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={m.value}' for k, m in self.cookies.items())
+        # 路径和查询参数中的中文需要百分号编码
+        url = urllib.parse.quote(self.prefix + path, safe="/?&=%:+,;@")
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.netloc, timeout=self.timeout)
+            try:
+                self.connection.request(method, url, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                break
+            except Exception as e:
+                # 出错后连接状态不确定，丢弃；服务端关闭了空闲连接（如 gunicorn 同步 worker）时重新连接一次
+                self.connection.close()
+                self.connection = None
+                if attempt or not isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)):
+                    raise
+        for value in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(value)
+        if response.headers.get('Connection', '').lower() == 'close':
+            self.connection.close()
+            self.connection = None
+        return response.status, dict(response.headers)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+class WsgiClient:
+    """通过 Flask 测试客户端直接调用 WSGI 应用"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None, files=None, headers=None):
+        data = dict(form or {})
+        for field, (filename, content) in (files or {}).items():
+            data[field] = (io.BytesIO(content), filename)
+        response = self.client.open(path, method=method, data=data or None, headers=headers)
+        response.get_data()
+        response.close()
+        return response.status_code, dict(response.headers)
+
+    def close(self):
+        pass
+
+
+def encode_multipart(form, files):
+    """编码 multipart/form-data 请求体，files 为 {字段: (文件名, 内容)}"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in form.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8') + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def upload_content(spec, rng):
+    """生成上传用的 Markdown 题目文件，每次使用不同的随机种子"""
+    from app.seed import QuestionGenerator, write_markdown
+    generator = QuestionGenerator(rng.randrange(1 << 30))
+    buffer = io.StringIO()
+    write_markdown(buffer, (generator.question() for _ in range(spec.get('questions', 100))))
+    return buffer.getvalue().encode('utf-8')
+
+
+class Stats:
+    """按接口汇总请求结果"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def record(self, name, latency, status, ok):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(latency)
+            statuses = self.statuses.setdefault(name, {})
+            statuses[status] = statuses.get(status, 0) + 1
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        def percentile(values, p):
+            return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))] * 1000
+
+        report = {}
+        with self.lock:
+            for name, values in sorted(self.latencies.items()):
+                values = sorted(values)
+                report[name] = {
+                    'requests': len(values),
+                    'rps': round(len(values) / elapsed, 2),
+                    'p50_ms': round(percentile(values, 50), 1),
+                    'p95_ms': round(percentile(values, 95), 1),
+                    'p99_ms': round(percentile(values, 99), 1),
+                    'max_ms': round(values[-1] * 1000, 1),
+                    'error_rate': round(self.errors.get(name, 0) / len(values), 4),
+                    'statuses': {str(k): v for k, v in sorted(self.statuses[name].items(), key=lambda s: str(s[0]))}
+                }
+        return report
+
+
+class LoadTest:
+    def __init__(self, scenario, make_client, seed=None):
+        self.scenario = scenario
+        self.make_client = make_client
+        self.requests = scenario['requests']
+        self.variables = scenario.get('variables', {})
+        self.users = scenario.get('users') or [{'username': 'admin', 'password': 'admin123'}]
+        self.think_time = scenario.get('think_time', [0, 0])
+        self.stats = Stats()
+        self.seed = seed
+        self.active_users = 0
+        self.weights = None
+        self.stopping = threading.Event()
+
+    def set_phase(self, phase):
+        overrides = phase.get('weights', {})
+        self.weights = [overrides.get(r['name'], r.get('weight', 1)) for r in self.requests]
+        self.active_users = phase['users']
+
+    def fill(self, value, rng):
+        """替换 {name} 占位符"""
+        if not isinstance(value, str):
+            return value
+        chosen = {k: rng.choice(v) if isinstance(v, list) else v for k, v in self.variables.items()}
+        return value.format(**chosen)
+
+    def call(self, client, name, method, path, expect=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            status, headers = client.request(method, path, **kwargs)
+            ok = status in expect if expect else 200 <= status < 400
+        except Exception as e:
+            status, headers, ok = type(e).__name__, {}, False
+        self.stats.record(name, time.perf_counter() - start, status, ok)
+        return status, headers
+
+    def login(self, client, index):
+        user = self.users[index % len(self.users)]
+        status, headers = self.call(client, 'login', 'POST', '/auth/login',
+                                    form={'username': user['username'], 'password': user['password']}, expect=(302,))
+        return status == 302 and '/auth/login' not in headers.get('Location', '')
+
+    def virtual_user(self, index):
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        client = None
+        try:
+            while not self.stopping.is_set():
+                if index >= self.active_users:
+                    # 当前阶段不需要这个用户，空闲等待
+                    time.sleep(0.05)
+                    continue
+                if client is None:
+                    client = self.make_client()
+                    if not self.login(client, index):
+                        client.close()
+                        client = None
+                        self.stopping.wait(1)
+                        continue
+                spec = rng.choices(self.requests, weights=self.weights)[0]
+                if spec.get('login'):
+                    # 重新登录：丢弃当前会话，用新的连接登录
+                    client.close()
+                    client = self.make_client()
+                    if not self.login(client, index):
+                        client.close()
+                        client = None
+                    continue
+                form = {k: self.fill(v, rng) for k, v in spec.get('form', {}).items()} if 'form' in spec else None
+                files = None
+                if 'upload' in spec:
+                    upload = spec['upload']
+                    files = {upload.get('field', 'file'): (upload.get('filename', 'loadtest.md'), upload_content(upload, rng))}
+                self.call(client, spec['name'], spec.get('method', 'GET'), self.fill(spec['path'], rng),
+                          expect=spec.get('expect'), form=form, files=files, headers=spec.get('headers'))
+                low, high = self.think_time
+                if high:
+                    self.stopping.wait(rng.uniform(low, high))
+        finally:
+            if client is not None:
+                client.close()
+
+    def run(self, progress=None):
+        phases = self.scenario['phases']
+        self.set_phase(phases[0])
+        threads = [threading.Thread(target=self.virtual_user, args=(i,), daemon=True)
+                   for i in range(max(phase['users'] for phase in phases))]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        try:
+            for number, phase in enumerate(phases, 1):
+                self.set_phase(phase)
+                if progress:
+                    progress(f'阶段 {number}/{len(phases)}：{phase["users"]} 个用户，{phase["duration"]} 秒')
+                time.sleep(phase['duration'])
+        finally:
+            self.stopping.set()
+            for t in threads:
+                t.join()
+        return time.perf_counter() - start
+
+
+def load_wsgi_app(target):
+    """按 module:attribute 导入 WSGI 应用，默认属性为 app"""
+    module_name, _, attribute = target.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute or 'app')
+
+
+def print_report(report, elapsed):
+    print(f'总时长 {elapsed:.1f} 秒')
+    print(f'{"接口":<20}{"请求数":>8}{"每秒":>9}{"p50ms":>9}{"p95ms":>9}{"p99ms":>9}{"最大ms":>9}{"错误率":>8}  状态码')
+    for name, r in report.items():
+        statuses = ' '.join(f'{k}×{v}' for k, v in r['statuses'].items())
+        print(f'{name:<22}{r["requests"]:>8}{r["rps"]:>9.1f}{r["p50_ms"]:>9.1f}{r["p95_ms"]:>9.1f}'
+              f'{r["p99_ms"]:>9.1f}{r["max_ms"]:>9.1f}{r["error_rate"]:>9.1%}  {statuses}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='题库管理系统 HTTP 压测')
+    parser.add_argument('scenario', help='场景文件（JSON）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='已启动服务的地址，如 http://127.0.0.1:5000')
+    target.add_argument('--wsgi', help='进程内调用的 WSGI 应用，如 wsgi:app')
+    parser.add_argument('--scale', type=float, default=1.0, help='按比例缩放各阶段的时长，用于快速试跑')
+    parser.add_argument('--seed', type=int, help='随机种子，指定后请求序列可复现')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    with open(args.scenario, encoding='utf-8') as f:
+        scenario = json.load(f)
+    for phase in scenario['phases']:
+        phase['duration'] *= args.scale
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        app = load_wsgi_app(args.wsgi)
+
+        def make_client():
+            return WsgiClient(app)
+
+    test = LoadTest(scenario, make_client, args.seed)
+    elapsed = test.run(progress=lambda message: print(message, file=sys.stderr))
+    report = test.stats.summary(elapsed)
+    print_report(report, elapsed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'scenario': scenario.get('name'), 'elapsed': round(elapsed, 2), 'endpoints': report},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+登录密码验证吞吐量基准测试
+
+对每种哈希配置测量单线程每秒可验证的登录次数（即每个 CPU 核心的吞吐量），
+以及通过 PasswordVerifier 线程池并发验证时整个进程的吞吐量，用于选择 PASSWORD_HASH_METHOD。
+
+用法：python benchmarks/password_hash.py [--methods pbkdf2:sha256:600000 scrypt:32768:8:1] [--seconds 2]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash, check_password_hash  # noqa: E402
+from app.passwords import PasswordVerifier  # noqa: E402
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:150000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+]
+
+
+def single_thread(password_hash, seconds):
+    """单线程每秒验证次数"""
+    count = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        check_password_hash(password_hash, 'correct horse')
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def pooled(password_hash, seconds, workers, clients):
+    """clients 个线程同时通过 workers 个验证线程登录，返回 (每秒验证次数, 平均耗时毫秒)"""
+    verifier = PasswordVerifier(workers, max_pending=clients, timeout=60)
+    counts = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(i):
+        while time.perf_counter() < deadline:
+            verifier.verify(password_hash, 'correct horse')
+            counts[i] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = sum(counts)
+    return total / elapsed, elapsed * clients / total * 1000 if total else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS, help='要比较的哈希配置')
+    parser.add_argument('--seconds', type=float, default=2.0, help='每项测量的时长')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='验证线程数')
+    parser.add_argument('--clients', type=int, default=32, help='并发登录的客户端线程数')
+    args = parser.parse_args()
+
+    print(f'CPU 核心数 {os.cpu_count()}，验证线程 {args.workers}，并发客户端 {args.clients}')
+    print(f'{"哈希配置":<24}{"每核登录/秒":>7}{"进程登录/秒":>9}{"平均耗时ms":>10}')
+    for method in args.methods:
+        password_hash = generate_password_hash('correct horse', method)
+        per_core = single_thread(password_hash, args.seconds)
+        total, latency = pooled(password_hash, args.seconds, args.workers, args.clients)
+        print(f'{method:<28}{per_core:>12.1f}{total:>14.1f}{latency:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
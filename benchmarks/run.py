@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+
+在 1k/100k/1m 等规模的合成题库上测量常用路径的耗时：并发请求的数据库连接开销、解析导入文件、导入、
+统计、题目分页、全文检索、组卷抽题（与读出全部候选题目再随机抽取的做法对比）和试卷渲染；
+另外在 10 万道题目的 Markdown 文件上比较流式解析与整文件读入后解析的峰值内存和吞吐量。
+数据由 app.seed 按固定种子生成（与 flask seed-bench 相同），每个规模的数据库保存在工作目录中，
+再次运行时直接复用。结果写入 JSON 文件，
+可以与保存的基线比较，中位数变慢超过阈值的项目视为性能回退。
+
+用法：
+    python benchmarks/run.py run --scales 1k 100k --output results.json [--baseline baseline.json] [--parse-size 0]
+    python benchmarks/run.py compare baseline.json results.json [--threshold 0.2]
+
+登录密码验证的吞吐量见 benchmarks/password_hash.py。
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+# 导入测试使用的文件题目数（不超过题库规模）
+IMPORT_SIZE = 10_000
+# 组卷测试的题型数量
+PAPER_COUNTS = {'single_choice': 20, 'multiple_choice': 10, 'true_false': 10, 'short_answer': 5, 'essay': 2}
+SEARCH_QUERIES = ['操作系统', '数据库 索引', '光']
+# 连接开销测试：并发线程数、每轮请求数、每个请求的查询次数
+CHURN_THREADS = 8
+CHURN_REQUESTS = 100
+CHURN_QUERIES = 25
+
+
+def measure(fn, repeat, setup=None, teardown=None):
+    """执行 fn repeat 次，返回 {'min_ms', 'median_ms', 'max_ms', 'runs'}；setup/teardown 不计时"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+        if teardown:
+            teardown()
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'runs': repeat
+    }
+
+
+def connection_churn(db_path, question_ids, pool=None):
+    """
+    CHURN_THREADS 个线程并发处理 CHURN_REQUESTS 个请求，每个请求按主键查询 CHURN_QUERIES 道题目
+
+    pool 为 None 时每次查询新建并关闭连接（使用连接池之前的 query_db），否则每个请求从连接池取一个连接。
+    """
+    def handle(n):
+        ids = [question_ids[(n * CHURN_QUERIES + i) % len(question_ids)] for i in range(CHURN_QUERIES)]
+        if pool is None:
+            for question_id in ids:
+                conn = sqlite3.connect(db_path)
+                conn.row_factory = sqlite3.Row
+                conn.execute('SELECT * FROM questions WHERE id = ?', [question_id]).fetchall()
+                conn.close()
+            return
+        conn = pool.acquire()
+        try:
+            for question_id in ids:
+                conn.execute('SELECT * FROM questions WHERE id = ?', [question_id]).fetchall()
+        finally:
+            pool.release(conn)
+
+    with ThreadPoolExecutor(CHURN_THREADS) as executor:
+        list(executor.map(handle, range(CHURN_REQUESTS)))
+
+
+def run_parse(args):
+    """解析 args.parse_size 道题目的 Markdown 文件：流式解析与整文件读入后解析的耗时、峰值内存和吞吐量"""
+    from app.seed import QuestionGenerator, write_markdown
+    from app.utils import iter_cleaned_questions, iter_source_lines, normalize_lines
+
+    os.makedirs(args.workdir, exist_ok=True)
+    path = os.path.join(args.workdir, f'parse-{args.parse_size}-{args.seed}.md')
+    if not os.path.exists(path):
+        generator = QuestionGenerator(args.seed + 2)
+        with open(path, 'w', encoding='utf-8') as f:
+            write_markdown(f, (generator.question() for _ in range(args.parse_size)))
+
+    def stream():
+        with open(path, 'rb') as f:
+            return sum(1 for _ in iter_cleaned_questions(iter_source_lines(f, path), 1))
+
+    def buffered():
+        # 流式解析之前的做法：读入整个文件，解析出全部题目后再写入
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        return len(list(iter_cleaned_questions(normalize_lines(lines), 1)))
+
+    results = {}
+    for name, parse in (('stream', stream), ('buffered', buffered)):
+        result = measure(parse, max(1, args.repeat // 3))
+        tracemalloc.start()
+        count = parse()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result.update(questions=count, peak_mib=round(peak / 2 ** 20, 1),
+                      questions_per_second=round(count / result['median_ms'] * 1000))
+        results[f'{name}_{args.parse_size}'] = result
+    return results
+
+
+def prepare_database(path, total, libraries, seed):
+    """建库并生成数据，已存在且题目数量一致时直接复用；返回 (题库 id 列表, 生成耗时秒数或 None)"""
+    from app.database import connect, upgrade_db
+    from app.seed import seed_bench
+    conn = connect(path, {'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+    try:
+        upgrade_db(conn)
+        library_ids = [row[0] for row in conn.execute(
+            'SELECT id FROM libraries WHERE name LIKE ? ORDER BY id', [f'基准题库 {seed}-%']
+        )]
+        count = conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+        if library_ids and count == total:
+            return library_ids, None
+        if library_ids or count:
+            raise SystemExit(f'{path} 中的数据与规模不一致，请删除后重新运行')
+        start = time.perf_counter()
+        library_ids = seed_bench(conn, libraries, total // libraries, seed)
+        elapsed = time.perf_counter() - start
+        conn.execute('ANALYZE')
+        conn.commit()
+        return library_ids, elapsed
+    finally:
+        conn.close()
+
+
+def run_scale(name, total, args):
+    """在一个规模上运行所有基准测试，返回 {测试名: 结果}"""
+    from app import create_app
+    from app.database import ConnectionPool, get_db
+    from app.paper_render import PAPER_WRITERS, write_paper
+    from app.routes import fetch_question_page, get_statistics
+    from app.sampling import QuestionSampler
+    from app.search import search_questions
+    from app.seed import QuestionGenerator, write_markdown
+    from app.utils import extract_questions_from_file, iter_cleaned_questions, iter_source_lines
+
+    os.makedirs(args.workdir, exist_ok=True)
+    db_path = os.path.join(args.workdir, f'bench-{name}-{args.seed}.db')
+    libraries = max(1, min(args.libraries, total // 100))
+    library_ids, seed_seconds = prepare_database(db_path, total, libraries, args.seed)
+    library_id = library_ids[0]
+
+    app = create_app('production')
+    app.config.update(DATABASE=db_path, RENDER_CACHE_FOLDER=os.path.join(args.workdir, 'renders'))
+    results = {}
+    if seed_seconds is not None:
+        results['seed'] = {'rows_per_second': round(total / seed_seconds), 'seconds': round(seed_seconds, 1)}
+
+    # 导入文件使用另一个种子，内容与已有题目不重复
+    import_size = min(total, IMPORT_SIZE)
+    import_path = os.path.join(args.workdir, f'import-{import_size}-{args.seed}.md')
+    if not os.path.exists(import_path):
+        generator = QuestionGenerator(args.seed + 1)
+        with open(import_path, 'w', encoding='utf-8') as f:
+            write_markdown(f, (generator.question() for _ in range(import_size)))
+
+    with app.app_context():
+        conn = get_db()
+
+        def parse():
+            with open(import_path, 'rb') as f:
+                for _ in iter_cleaned_questions(iter_source_lines(f, import_path), library_id):
+                    pass
+
+        target = {}
+
+        def create_target():
+            with conn:
+                target['id'] = conn.execute(
+                    "INSERT INTO libraries (name, user_id) VALUES ('基准导入', 1)"
+                ).lastrowid
+
+        def drop_target():
+            with conn:
+                conn.execute('DELETE FROM questions WHERE library_id = ?', [target['id']])
+                conn.execute('DELETE FROM libraries WHERE id = ?', [target['id']])
+
+        def import_file():
+            stats = extract_questions_from_file(import_path, target['id'], conn=conn,
+                                                near_duplicate_distance=app.config['NEAR_DUPLICATE_DISTANCE'])
+            assert stats['inserted'], stats
+
+        question_ids = [row[0] for row in conn.execute(
+            'SELECT id FROM questions WHERE library_id = ? LIMIT 1000', [library_id]
+        )]
+        results['requests_connect_per_query'] = measure(lambda: connection_churn(db_path, question_ids), args.repeat)
+        pool = ConnectionPool(db_path, CHURN_THREADS, pragmas=app.config['DB_PRAGMAS'])
+        results['requests_pooled'] = measure(lambda: connection_churn(db_path, question_ids, pool), args.repeat)
+        pool.close()
+
+        results[f'parse_{import_size}'] = measure(parse, args.repeat)
+        results[f'import_{import_size}'] = measure(import_file, max(1, args.repeat // 2), create_target, drop_target)
+        results['statistics'] = measure(get_statistics, args.repeat)
+        results['list_first_page'] = measure(lambda: fetch_question_page(library_id, None, 50), args.repeat)
+
+        def list_20_pages():
+            cursor = None
+            for _ in range(20):
+                _, cursor = fetch_question_page(library_id, cursor, 50)
+                if cursor is None:
+                    break
+
+        results['list_20_pages'] = measure(list_20_pages, args.repeat)
+        results['list_filtered'] = measure(
+            lambda: fetch_question_page(library_id, None, 50, 'essay', 'hard'), args.repeat
+        )
+        for i, query in enumerate(SEARCH_QUERIES):
+            results[f'search_{i + 1}'] = measure(lambda: search_questions(conn, query, library_id), args.repeat)
+
+        seeds = iter(range(10 ** 6))
+
+        def sample_paper():
+            sampler = QuestionSampler(conn, library_id, next(seeds))
+            questions = []
+            for question_type, count in PAPER_COUNTS.items():
+                available = sampler.count(question_type)
+                questions += sampler.sample(question_type, min(count, available))
+            return questions
+
+        def sample_paper_select_all():
+            # 按索引抽样之前的做法：读出题型的全部题目再 random.sample
+            rng = random.Random(next(seeds))
+            questions = []
+            for question_type, count in PAPER_COUNTS.items():
+                rows = conn.execute('SELECT * FROM questions WHERE library_id = ? AND question_type = ?',
+                                    [library_id, question_type]).fetchall()
+                questions += rng.sample(rows, min(count, len(rows)))
+            return questions
+
+        results['sample_paper'] = measure(sample_paper, args.repeat)
+        results['sample_paper_select_all'] = measure(sample_paper_select_all, args.repeat)
+        paper = sample_paper()
+        for writer in PAPER_WRITERS:
+            results[f'render_{writer}'] = measure(
+                lambda: write_paper(io.BytesIO(), '基准试卷', '基准题库', paper, writer), args.repeat
+            )
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold, min_delta_ms):
+    """比较两份结果，打印对比表，返回回退的项目列表"""
+    regressions = []
+    print(f'{"规模/项目":<28}{"基线ms":>12}{"本次ms":>12}{"变化":>9}')
+    for scale, tests in current['results'].items():
+        for test, result in tests.items():
+            before = baseline['results'].get(scale, {}).get(test)
+            if 'median_ms' not in result or not before or 'median_ms' not in before:
+                continue
+            old, new = before['median_ms'], result['median_ms']
+            change = (new - old) / old if old else 0.0
+            regressed = change > threshold and new - old > min_delta_ms
+            if regressed:
+                regressions.append(f'{scale}/{test}')
+            print(f'{scale + "/" + test:<30}{old:>12.2f}{new:>12.2f}{change:>+10.0%}{"  回退" if regressed else ""}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='题库管理系统性能基准测试')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='运行基准测试')
+    run.add_argument('--scales', nargs='+', default=['1k', '100k'], choices=list(SCALES), help='题库规模')
+    run.add_argument('--libraries', type=int, default=10, help='题目平均分布到多少个题库')
+    run.add_argument('--seed', type=int, default=0, help='数据生成的随机种子')
+    run.add_argument('--repeat', type=int, default=7, help='每项测试的重复次数，结果取中位数')
+    run.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'question-bank-bench'),
+                     help='保存基准数据库和导入文件的目录')
+    run.add_argument('--parse-size', type=int, default=100_000, help='解析内存测试的文件题目数，0 表示不测试')
+    run.add_argument('--output', help='结果 JSON 文件，默认输出到标准输出')
+    run.add_argument('--baseline', help='运行后与该基线比较')
+    run.add_argument('--threshold', type=float, default=0.2, help='中位数变慢超过该比例视为回退')
+    run.add_argument('--min-delta-ms', type=float, default=1.0, help='变慢不超过该毫秒数时忽略（计时噪声）')
+
+    cmp = commands.add_parser('compare', help='比较两份结果')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.2)
+    cmp.add_argument('--min-delta-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold, args.min_delta_ms)
+        print(f'{len(regressions)} 项回退' + (f'：{", ".join(regressions)}' if regressions else ''))
+        sys.exit(1 if regressions else 0)
+
+    report = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'repeat': args.repeat
+        },
+        'results': {}
+    }
+    for scale in args.scales:
+        print(f'运行 {scale} 规模…', file=sys.stderr)
+        report['results'][scale] = run_scale(scale, SCALES[scale], args)
+    if args.parse_size:
+        print(f'解析 {args.parse_size} 道题目的文件…', file=sys.stderr)
+        report['results']['parse'] = run_parse(args)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold, args.min_delta_ms)
+        print(f'{len(regressions)} 项回退' + (f'：{", ".join(regressions)}' if regressions else ''))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,14 +4,83 @@
 """
 import os
 
+
+def env_seconds(name, default):
+    """读取秒数环境变量：未设置时取 default，设为空或 off 时返回 None（关闭）"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if value.strip().lower() in ('', 'off'):
+        return None
+    return float(value)
+
 class Config:
     """基础配置类"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DATABASE = os.environ.get('DATABASE') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app.db')
+    
+    # 启动时自动执行数据库迁移（生产环境请使用 flask db-upgrade）
+    AUTO_MIGRATE = False
+    
+    # 数据库连接池配置
+    DB_POOL_SIZE = 8
+    DB_POOL_TIMEOUT = 10  # 秒
+    DB_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,  # 16MB
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 5000  # 毫秒
+    }
+    
+    # 用户缓存配置：每个进程缓存最近使用的用户对象，修改用户后通过标记文件通知其他进程
+    USER_CACHE_SIZE = 1024  # 每个进程最多缓存的用户数，设为 0 时不缓存
+    USER_CACHE_TTL = 300  # 秒，直接修改数据库中的用户时最多这么久后生效
+    USER_CACHE_STAMP = None  # 失效标记文件，默认为数据库文件名加 .users-stamp
+    
+    # 密码哈希配置（Werkzeug 写法），修改后用户在下次登录时自动按新配置重新生成哈希
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_VERIFY_WORKERS = os.cpu_count() or 1  # 每个进程同时验证密码的线程数
+    PASSWORD_VERIFY_MAX_PENDING = 64  # 每个进程排队验证的登录请求上限
+    PASSWORD_VERIFY_TIMEOUT = 5  # 秒，排队已满时最多等待这么久，超时返回 503
+    
+    # 性能指标配置：/metrics 输出 Prometheus 格式的请求耗时和 SQL 统计
+    METRICS_ENABLED = True
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # 多进程部署时各进程写入指标的目录，用于汇总；为空时只统计当前进程
+    SERVER_TIMING = os.environ.get('SERVER_TIMING') == '1'  # 在响应头 Server-Timing 中列出 SQL 和渲染等耗时
+    # 慢查询日志：数据库连接上的语句（执行和读取结果）耗时达到该秒数时记录执行计划，
+    # 设为 None（环境变量为空或 off）时不记录；用 flask slow-queries 查看
+    SLOW_QUERY_SECONDS = env_seconds('SLOW_QUERY_SECONDS', 0.1)
+    SLOW_QUERY_LOG = None  # 日志文件，默认为数据库文件名加 .slow-queries.jsonl
+    
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'uploads')
-    ALLOWED_EXTENSIONS = {'txt', 'md', 'docx'}
+    QUESTION_MEDIA_FOLDER = os.path.join(UPLOAD_FOLDER, 'media')  # 从 Word 文档导入的题目图片
+    ALLOWED_EXTENSIONS = {'txt', 'md', 'docx', 'zip'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    IMPORT_CHUNK_SIZE = 500  # 导入题目时每批插入的数量
+    BATCH_WRITE_CHUNK_SIZE = 1000  # 批量写入接口每个事务执行的操作数
+    
+    # 分页配置
+    PAGE_SIZE = 50  # 列表默认每页数量
+    MAX_PAGE_SIZE = 200  # 每页数量上限
+    
+    # 组卷配置
+    PAPER_MAX_VARIANTS = 10  # 一次最多生成的试卷套数
+    PAPER_WRITER = os.environ.get('PAPER_WRITER') or 'python-docx'  # 试卷写入方式：python-docx 或 ooxml（直接写入，大试卷更快）
+    RENDER_CACHE_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'uploads', 'renders')
+    RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 试卷渲染缓存总大小上限，超出后淘汰最久未使用的文件
+    
+    # 后台导入任务配置
+    IMPORT_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'uploads', 'imports')
+    IMPORT_WORKERS = min(4, os.cpu_count() or 1)  # 导入进程池大小
+    IMPORT_MAX_JOBS_PER_USER = 2  # 每个用户同时进行的导入任务上限
+    IMPORT_JOB_STALE_SECONDS = 600  # running 状态超过该时间没有进度视为中断并重新执行（执行进程已退出的任务不等待）
+    ARCHIVE_WORKERS = os.cpu_count() or 1  # 压缩包导入时并行解析文件的进程数
+    # 近似重复检测：题目 SimHash 指纹的汉明距离不超过该值视为近似重复（0-3，超过 3 时分段索引可能漏检），
+    # 导入时统计近似重复数量；设为 None 时导入不做检测。接口中的距离参数：单题查询最大 3，题库查重最大 8
+    NEAR_DUPLICATE_DISTANCE = 3
     
     # 题目类型配置
     QUESTION_TYPES = {
@@ -28,15 +97,21 @@ class Config:
         'medium': '中等',
         'hard': '困难'
     }
+    
+    @staticmethod
+    def init_app(app):
+        pass
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True
+    AUTO_MIGRATE = True
 
 class TestingConfig(Config):
     """测试环境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'test.db')
+    DATABASE = os.environ.get('DATABASE') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'test.db')
 
 class ProductionConfig(Config):
     """生产环境配置"""
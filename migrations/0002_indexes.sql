@@ -0,0 +1,23 @@
+-- 常用查询的索引
+
+-- 生成试卷：按题库、题型、难度筛选题目
+CREATE INDEX IF NOT EXISTS idx_questions_library_type_difficulty
+    ON questions (library_id, question_type, difficulty);
+
+-- 题目列表：按题库筛选并按创建时间倒序
+CREATE INDEX IF NOT EXISTS idx_questions_library_created
+    ON questions (library_id, created_at);
+
+-- 试卷详情：按试卷取题目并按顺序排列（覆盖索引）
+CREATE INDEX IF NOT EXISTS idx_paper_questions_paper_order
+    ON paper_questions (paper_id, question_order, question_id);
+
+-- 题库列表与重名检查
+CREATE INDEX IF NOT EXISTS idx_libraries_created ON libraries (created_at);
+CREATE INDEX IF NOT EXISTS idx_libraries_name ON libraries (name);
+
+-- 试卷列表与按标题查找
+CREATE INDEX IF NOT EXISTS idx_papers_created ON papers (created_at);
+CREATE INDEX IF NOT EXISTS idx_papers_user_title ON papers (user_id, title, created_at);
+
+ANALYZE;
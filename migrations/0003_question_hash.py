@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+为题目增加归一化文本哈希，导入时按 (library_id, question_hash) 去重
+
+已有数据中重复的题目只为第一条回填哈希，其余保持 NULL，避免唯一索引冲突。
+哈希按这一版本的归一化规则计算，复制在本文件中，不随 app.utils.question_hash 变化。
+"""
+import hashlib
+import re
+import unicodedata
+
+
+def question_hash(question_text):
+    """全角转半角（NFKC）、去掉Markdown加粗符号和所有空白、统一小写后的 SHA-1"""
+    text = unicodedata.normalize('NFKC', question_text or '')
+    text = re.sub(r'\*\*|\s+', '', text).lower()
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def upgrade(conn):
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(questions)')]
+    if 'question_hash' not in columns:
+        conn.execute('ALTER TABLE questions ADD COLUMN question_hash TEXT')
+
+    seen = set()
+    updates = []
+    for row in conn.execute('SELECT id, library_id, question_text FROM questions ORDER BY id'):
+        key = (row[1], question_hash(row[2]))
+        if key in seen:
+            continue
+        seen.add(key)
+        updates.append((key[1], row[0]))
+    conn.executemany('UPDATE questions SET question_hash = ? WHERE id = ?', updates)
+
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_library_hash ON questions (library_id, question_hash)')
@@ -0,0 +1,23 @@
+-- 后台导入任务
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER,
+    library_id INTEGER,
+    filename TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',  -- queued / running / done / failed
+    lines_processed INTEGER DEFAULT 0,
+    questions_found INTEGER DEFAULT 0,
+    inserted INTEGER DEFAULT 0,
+    duplicates INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (library_id) REFERENCES libraries(id)
+);
+
+-- 统计用户进行中的任务、启动时恢复未完成的任务
+CREATE INDEX IF NOT EXISTS idx_import_jobs_user_state ON import_jobs (user_id, state);
+CREATE INDEX IF NOT EXISTS idx_import_jobs_state ON import_jobs (state, updated_at);
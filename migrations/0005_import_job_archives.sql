@@ -0,0 +1,3 @@
+-- 压缩包导入：任务类型和每个文件的导入汇总（JSON）
+ALTER TABLE import_jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'file';
+ALTER TABLE import_jobs ADD COLUMN result TEXT;
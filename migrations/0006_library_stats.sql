@@ -0,0 +1,57 @@
+-- 题库统计计数表，由 questions 表上的触发器维护
+-- 没有所属题库的题目记在 library_id = 0 下，保证全局统计准确
+CREATE TABLE IF NOT EXISTS library_stats (
+    library_id INTEGER NOT NULL,
+    question_type TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    question_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (library_id, question_type, difficulty)
+) WITHOUT ROWID;
+
+DELETE FROM library_stats;
+INSERT INTO library_stats (library_id, question_type, difficulty, question_count)
+SELECT COALESCE(library_id, 0), question_type, difficulty, COUNT(*)
+FROM questions
+GROUP BY COALESCE(library_id, 0), question_type, difficulty;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_stats_insert
+AFTER INSERT ON questions
+BEGIN
+    INSERT INTO library_stats (library_id, question_type, difficulty, question_count)
+    VALUES (COALESCE(NEW.library_id, 0), NEW.question_type, NEW.difficulty, 1)
+    ON CONFLICT (library_id, question_type, difficulty) DO UPDATE SET question_count = question_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_stats_delete
+AFTER DELETE ON questions
+BEGIN
+    UPDATE library_stats SET question_count = question_count - 1
+    WHERE library_id = COALESCE(OLD.library_id, 0)
+      AND question_type = OLD.question_type
+      AND difficulty = OLD.difficulty;
+    DELETE FROM library_stats
+    WHERE library_id = COALESCE(OLD.library_id, 0)
+      AND question_type = OLD.question_type
+      AND difficulty = OLD.difficulty
+      AND question_count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_stats_update
+AFTER UPDATE OF library_id, question_type, difficulty ON questions
+WHEN OLD.library_id IS NOT NEW.library_id
+  OR OLD.question_type IS NOT NEW.question_type
+  OR OLD.difficulty IS NOT NEW.difficulty
+BEGIN
+    UPDATE library_stats SET question_count = question_count - 1
+    WHERE library_id = COALESCE(OLD.library_id, 0)
+      AND question_type = OLD.question_type
+      AND difficulty = OLD.difficulty;
+    DELETE FROM library_stats
+    WHERE library_id = COALESCE(OLD.library_id, 0)
+      AND question_type = OLD.question_type
+      AND difficulty = OLD.difficulty
+      AND question_count <= 0;
+    INSERT INTO library_stats (library_id, question_type, difficulty, question_count)
+    VALUES (COALESCE(NEW.library_id, 0), NEW.question_type, NEW.difficulty, 1)
+    ON CONFLICT (library_id, question_type, difficulty) DO UPDATE SET question_count = question_count + 1;
+END;
@@ -0,0 +1,6 @@
+-- 题目列表按题型、难度筛选后仍能按创建时间顺序分页；
+-- 0002 中的 (library_id, question_type, difficulty) 索引保留给抽题引擎，它需要在分组内按 rowid 排序
+CREATE INDEX IF NOT EXISTS idx_questions_library_type_difficulty_created
+    ON questions (library_id, question_type, difficulty, created_at);
+
+ANALYZE;
@@ -0,0 +1,7 @@
+-- 记录试卷来源题库和随机种子，便于复现抽题结果
+-- 抽题引擎按 id 在 (题库, 题型, 难度) 内随机探测，使用 0002 中的 idx_questions_library_type_difficulty
+ALTER TABLE papers ADD COLUMN library_id INTEGER REFERENCES libraries(id);
+ALTER TABLE papers ADD COLUMN seed INTEGER;
+CREATE INDEX IF NOT EXISTS idx_papers_library_created ON papers (library_id, created_at);
+
+ANALYZE;
@@ -0,0 +1,8 @@
+-- 题目所属章节，组卷蓝图按章节覆盖约束使用，可为空
+ALTER TABLE questions ADD COLUMN chapter TEXT;
+
+-- 组卷时一次读取题库中所有候选题目的元数据（id、题型、难度、章节），覆盖索引避免回表
+CREATE INDEX IF NOT EXISTS idx_questions_library_chapter
+    ON questions (library_id, chapter, question_type, difficulty);
+
+ANALYZE;
@@ -0,0 +1,28 @@
+-- 题目内容版本号，题目内容修改时由触发器递增，试卷渲染缓存的键包含该版本号
+ALTER TABLE questions ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_version
+AFTER UPDATE OF question_text, answer_text, question_type ON questions
+WHEN OLD.question_text IS NOT NEW.question_text
+  OR OLD.answer_text IS NOT NEW.answer_text
+  OR OLD.question_type IS NOT NEW.question_type
+BEGIN
+    UPDATE questions SET version = OLD.version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+-- 试卷 Word 文档渲染缓存，文件保存在 RENDER_CACHE_FOLDER/<cache_key>.docx
+-- cache_key 为试卷标题、题库名称、题目 id 及版本号、渲染选项的哈希
+CREATE TABLE IF NOT EXISTS paper_renders (
+    cache_key TEXT PRIMARY KEY,
+    paper_id INTEGER,
+    file_size INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_paper_renders_paper ON paper_renders (paper_id);
+CREATE INDEX IF NOT EXISTS idx_paper_renders_last_used ON paper_renders (last_used_at);
+
+-- 编辑题目时查找引用它的试卷
+CREATE INDEX IF NOT EXISTS idx_paper_questions_question ON paper_questions (question_id);
+
+ANALYZE;
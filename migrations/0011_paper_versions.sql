@@ -0,0 +1,30 @@
+-- 试卷版本号，与 updated_at 一起用于生成试卷页面和下载的 ETag/Last-Modified
+-- 试卷引用的题目内容变化、被删除，或试卷/题库名称变化时由触发器递增版本号并更新 updated_at
+ALTER TABLE papers ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_paper_version_update
+AFTER UPDATE OF version ON questions
+BEGIN
+    UPDATE papers SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE id IN (SELECT paper_id FROM paper_questions WHERE question_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_paper_version_delete
+AFTER DELETE ON questions
+BEGIN
+    UPDATE papers SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE id IN (SELECT paper_id FROM paper_questions WHERE question_id = OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_papers_version
+AFTER UPDATE OF title, description ON papers
+BEGIN
+    UPDATE papers SET version = OLD.version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_libraries_paper_version
+AFTER UPDATE OF name ON libraries
+WHEN OLD.name IS NOT NEW.name
+BEGIN
+    UPDATE papers SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE library_id = NEW.id;
+END;
@@ -0,0 +1,49 @@
+-- 题目全文索引，词元由 fts_tokens()/fts_tags() 生成（见 app/search.py），
+-- 这两个函数在应用的数据库连接上注册，没有注册这两个函数的连接无法写入 questions 表
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5 (
+    question_text,
+    answer_text,
+    tags,
+    content = '',
+    tokenize = 'unicode61',
+    prefix = '1'  -- 单个汉字按前缀检索，需要单字前缀索引
+);
+
+INSERT INTO questions_fts (rowid, question_text, answer_text, tags)
+SELECT id, fts_tokens(question_text), fts_tokens(answer_text), fts_tags(library_id, question_type, difficulty)
+FROM questions;
+
+INSERT INTO questions_fts (questions_fts) VALUES ('optimize');
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_fts_insert
+AFTER INSERT ON questions
+BEGIN
+    INSERT INTO questions_fts (rowid, question_text, answer_text, tags)
+    VALUES (NEW.id, fts_tokens(NEW.question_text), fts_tokens(NEW.answer_text),
+            fts_tags(NEW.library_id, NEW.question_type, NEW.difficulty));
+END;
+
+-- 无内容表删除条目时需要提供写入时的词元
+CREATE TRIGGER IF NOT EXISTS trg_questions_fts_delete
+AFTER DELETE ON questions
+BEGIN
+    INSERT INTO questions_fts (questions_fts, rowid, question_text, answer_text, tags)
+    VALUES ('delete', OLD.id, fts_tokens(OLD.question_text), fts_tokens(OLD.answer_text),
+            fts_tags(OLD.library_id, OLD.question_type, OLD.difficulty));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_fts_update
+AFTER UPDATE OF question_text, answer_text, library_id, question_type, difficulty ON questions
+WHEN OLD.question_text IS NOT NEW.question_text
+  OR OLD.answer_text IS NOT NEW.answer_text
+  OR OLD.library_id IS NOT NEW.library_id
+  OR OLD.question_type IS NOT NEW.question_type
+  OR OLD.difficulty IS NOT NEW.difficulty
+BEGIN
+    INSERT INTO questions_fts (questions_fts, rowid, question_text, answer_text, tags)
+    VALUES ('delete', OLD.id, fts_tokens(OLD.question_text), fts_tokens(OLD.answer_text),
+            fts_tags(OLD.library_id, OLD.question_type, OLD.difficulty));
+    INSERT INTO questions_fts (rowid, question_text, answer_text, tags)
+    VALUES (NEW.id, fts_tokens(NEW.question_text), fts_tokens(NEW.answer_text),
+            fts_tags(NEW.library_id, NEW.question_type, NEW.difficulty));
+END;
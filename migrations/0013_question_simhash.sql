@@ -0,0 +1,58 @@
+-- 题目近似重复检测：SimHash 指纹由 question_simhash() 计算（见 app/near_duplicates.py），
+-- 按 16 位分为 4 段写入 question_simhash_bands，键为 (段号 << 16) | 段值，同时保存完整指纹用于计算距离
+ALTER TABLE questions ADD COLUMN simhash INTEGER;
+ALTER TABLE import_jobs ADD COLUMN near_duplicates INTEGER DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS question_simhash_bands (
+    band_key INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    simhash INTEGER NOT NULL,
+    PRIMARY KEY (band_key, question_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_simhash_bands
+AFTER UPDATE OF simhash ON questions
+WHEN OLD.simhash IS NOT NEW.simhash
+BEGIN
+    DELETE FROM question_simhash_bands
+    WHERE question_id = OLD.id AND OLD.simhash IS NOT NULL
+      AND band_key IN ((OLD.simhash & 65535), 65536 | ((OLD.simhash >> 16) & 65535),
+                       131072 | ((OLD.simhash >> 32) & 65535), 196608 | ((OLD.simhash >> 48) & 65535));
+    INSERT INTO question_simhash_bands (band_key, question_id, simhash)
+    SELECT (band << 16) | ((NEW.simhash >> (band * 16)) & 65535), NEW.id, NEW.simhash
+    FROM (SELECT 0 AS band UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3)
+    WHERE NEW.simhash IS NOT NULL;
+END;
+
+UPDATE questions SET simhash = question_simhash(question_text);
+
+-- 按题库列出近似重复题目簇时只读取指纹
+CREATE INDEX IF NOT EXISTS idx_questions_library_simhash ON questions (library_id, simhash);
+
+-- 导入时已经计算好指纹的题目直接写入分段索引，其余题目由触发器计算指纹
+CREATE TRIGGER IF NOT EXISTS trg_questions_simhash_insert
+AFTER INSERT ON questions
+BEGIN
+    UPDATE questions SET simhash = question_simhash(NEW.question_text) WHERE id = NEW.id AND NEW.simhash IS NULL;
+    INSERT INTO question_simhash_bands (band_key, question_id, simhash)
+    SELECT (band << 16) | ((NEW.simhash >> (band * 16)) & 65535), NEW.id, NEW.simhash
+    FROM (SELECT 0 AS band UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3)
+    WHERE NEW.simhash IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_simhash_update
+AFTER UPDATE OF question_text ON questions
+WHEN OLD.question_text IS NOT NEW.question_text
+BEGIN
+    UPDATE questions SET simhash = question_simhash(NEW.question_text) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_simhash_delete
+AFTER DELETE ON questions
+WHEN OLD.simhash IS NOT NULL
+BEGIN
+    DELETE FROM question_simhash_bands
+    WHERE question_id = OLD.id
+      AND band_key IN ((OLD.simhash & 65535), 65536 | ((OLD.simhash >> 16) & 65535),
+                       131072 | ((OLD.simhash >> 32) & 65535), 196608 | ((OLD.simhash >> 48) & 65535));
+END;
@@ -0,0 +1,4 @@
+-- 初始化脚本中默认管理员的密码哈希无法通过验证（迭代次数也与当前配置不同），
+-- 替换为按 pbkdf2:sha256:600000 生成的 admin123 哈希；已修改过密码的管理员不受影响
+UPDATE users SET password = 'pbkdf2:sha256:600000$FIIAuxudIGSPRxRI$fad7609ab7b3c653f3ae5a8d1b10bf0d0a5ffc437613101078e4d49dd8067736'
+WHERE username = 'admin' AND password = 'pbkdf2:sha256:150000$R8J3F7m7$528b38205721042802b102462c702019593b908399310739074793372394335a';
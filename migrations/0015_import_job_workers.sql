@@ -0,0 +1,2 @@
+-- 记录执行导入任务的工作进程，进程退出后立即重新执行它认领的任务（不必等待 IMPORT_JOB_STALE_SECONDS）
+ALTER TABLE import_jobs ADD COLUMN worker_pid INTEGER;
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+全文索引和 SimHash 指纹改由应用计算，questions 上的触发器只使用纯 SQL
+
+0012/0013 的触发器调用 fts_tokens/fts_tags/question_simhash，这些函数只在 database.connect() 打开的连接上注册，
+其他连接（sqlite3 命令行、脚本）写入 questions 时会失败。现在：
+- 词元保存在 questions_search 中，questions_fts 改为以它为外部内容的 FTS5 表，由 questions_search 上的触发器维护；
+- 题目新增或修改时触发器删除旧词元并把题目 id 登记到 questions_search_pending，
+  由应用在写入题目的事务中调用 search.index_pending() 计算词元和缺少的指纹；
+- 修改题目文本但没有同时写入指纹时，触发器把 simhash 置为 NULL，分段索引随之删除，等待应用补算。
+"""
+from app.database import split_sql
+from app.search import rebuild_index
+
+SCHEMA = '''
+DROP TRIGGER IF EXISTS trg_questions_fts_insert;
+DROP TRIGGER IF EXISTS trg_questions_fts_delete;
+DROP TRIGGER IF EXISTS trg_questions_fts_update;
+DROP TRIGGER IF EXISTS trg_questions_simhash_insert;
+DROP TRIGGER IF EXISTS trg_questions_simhash_update;
+DROP TABLE IF EXISTS questions_fts;
+
+CREATE TABLE IF NOT EXISTS questions_search (
+    id INTEGER PRIMARY KEY,  -- 题目 id
+    question_text TEXT,
+    answer_text TEXT,
+    tags TEXT
+);
+
+CREATE TABLE IF NOT EXISTS questions_search_pending (
+    question_id INTEGER PRIMARY KEY
+);
+
+CREATE VIRTUAL TABLE questions_fts USING fts5 (
+    question_text,
+    answer_text,
+    tags,
+    content = 'questions_search',
+    content_rowid = 'id',
+    tokenize = 'unicode61',
+    prefix = '1'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_search_insert
+AFTER INSERT ON questions_search
+BEGIN
+    INSERT INTO questions_fts (rowid, question_text, answer_text, tags)
+    VALUES (NEW.id, NEW.question_text, NEW.answer_text, NEW.tags);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_search_delete
+AFTER DELETE ON questions_search
+BEGIN
+    INSERT INTO questions_fts (questions_fts, rowid, question_text, answer_text, tags)
+    VALUES ('delete', OLD.id, OLD.question_text, OLD.answer_text, OLD.tags);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_pending_insert
+AFTER INSERT ON questions
+BEGIN
+    INSERT OR IGNORE INTO questions_search_pending (question_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_pending_update
+AFTER UPDATE OF question_text, answer_text, library_id, question_type, difficulty ON questions
+WHEN OLD.question_text IS NOT NEW.question_text
+  OR OLD.answer_text IS NOT NEW.answer_text
+  OR OLD.library_id IS NOT NEW.library_id
+  OR OLD.question_type IS NOT NEW.question_type
+  OR OLD.difficulty IS NOT NEW.difficulty
+BEGIN
+    DELETE FROM questions_search WHERE id = OLD.id;
+    INSERT OR IGNORE INTO questions_search_pending (question_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_pending_delete
+AFTER DELETE ON questions
+BEGIN
+    DELETE FROM questions_search WHERE id = OLD.id;
+    DELETE FROM questions_search_pending WHERE question_id = OLD.id;
+END;
+
+-- 写入时已经计算好指纹的题目直接写入分段索引，其余题目由 search.index_pending() 补算
+CREATE TRIGGER IF NOT EXISTS trg_questions_simhash_insert
+AFTER INSERT ON questions
+WHEN NEW.simhash IS NOT NULL
+BEGIN
+    INSERT INTO question_simhash_bands (band_key, question_id, simhash)
+    SELECT (band << 16) | ((NEW.simhash >> (band * 16)) & 65535), NEW.id, NEW.simhash
+    FROM (SELECT 0 AS band UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_simhash_update
+AFTER UPDATE OF question_text ON questions
+WHEN OLD.question_text IS NOT NEW.question_text AND OLD.simhash IS NEW.simhash AND NEW.simhash IS NOT NULL
+BEGIN
+    UPDATE questions SET simhash = NULL WHERE id = NEW.id;
+END;
+'''
+
+
+def upgrade(conn):
+    for statement in split_sql(SCHEMA):
+        conn.execute(statement)
+    rebuild_index(conn)
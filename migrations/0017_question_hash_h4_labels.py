@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+按新的归一化规则重新计算已有题目的 question_hash 和 simhash
+
+之前的版本导入 H4 标题题目时把序号和“题型（难度）：”标签保留在题目文本中，现在导入时会去掉，
+question_hash 和 simhash 的归一化也忽略这部分，否则重新导入旧文件会产生重复题目。
+与 0003 相同，同一题库中哈希相同的题目只有 id 最小的一条保留哈希，其余置为 NULL；
+simhash 变化后由 trg_questions_simhash_bands 更新分段索引。
+
+question_hash 和 simhash 按这一版本的规则计算，复制在本文件中（题型和难度名称取自当时的 Config），
+之后修改 app.utils/app.near_duplicates 中的归一化不会改变这次迁移的结果。
+"""
+import hashlib
+import re
+import unicodedata
+
+CHUNK_SIZE = 1000
+
+H4_LABEL_PATTERN = re.compile(r'^(?:\d+[.、](?!\d)\s*)?(?:(单选题|多选题|判断题|简答题|论述题)(?:（(简单|中等|困难)）)?[：:]\s*)?')
+NUMBERING_PATTERN = re.compile(
+    r'^\s*(?:[(（]\s*[0-9一二三四五六七八九十]+\s*[)）]|[0-9一二三四五六七八九十]+\s*[.、．)）])?'
+    r'\s*(?:(?:单选题|多选题|不定项选择题|选择题|判断题|填空题|简答题|问答题|论述题|计算题|名词解释)'
+    r'\s*(?:[(（]\s*(?:简单|中等|困难)\s*[)）])?\s*[:：])?'
+)
+IGNORED_PATTERN = re.compile(r'[\W_]+')
+MASK64 = (1 << 64) - 1
+SHINGLE_SIZE = 3
+
+
+def question_hash(question_text):
+    """去掉开头的序号和“题型（难度）：”标签，全角转半角（NFKC）、去掉Markdown加粗符号和所有空白、统一小写后的 SHA-1"""
+    text = H4_LABEL_PATTERN.sub('', (question_text or '').strip(), count=1)
+    text = unicodedata.normalize('NFKC', text)
+    text = re.sub(r'\*\*|\s+', '', text).lower()
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _shingle_hash(a, b, c):
+    x = (a << 42) | (b << 21) | c
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & MASK64
+    return x ^ (x >> 31)
+
+
+def simhash(text):
+    """归一化文本相邻三字组的 64 位 SimHash（有符号整数），文本为空时返回 None"""
+    text = NUMBERING_PATTERN.sub('', unicodedata.normalize('NFKC', text or '').lower())
+    codes = [ord(char) for char in IGNORED_PATTERN.sub('', text)]
+    if not codes:
+        return None
+    codes += [0] * (SHINGLE_SIZE - len(codes))
+    shingles = set(zip(codes, codes[1:], codes[2:]))
+    # 64 位计数按位切片保存，见 app.near_duplicates.simhash
+    planes = []
+    count = len(shingles)
+    for a, b, c in shingles:
+        carry = _shingle_hash(a, b, c)
+        for k, plane in enumerate(planes):
+            planes[k] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        else:
+            planes.append(carry)
+    threshold = count // 2
+    greater, equal = 0, MASK64
+    for k in range(max(len(planes), threshold.bit_length()) - 1, -1, -1):
+        plane = planes[k] if k < len(planes) else 0
+        if threshold >> k & 1:
+            equal &= plane
+        else:
+            greater |= equal & plane
+            equal &= ~plane & MASK64
+    return greater - (1 << 64) if greater >= 1 << 63 else greater
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TEMP TABLE question_rehash (
+            id INTEGER PRIMARY KEY,
+            library_id INTEGER,
+            question_hash TEXT,
+            simhash INTEGER
+        )
+    ''')
+    last_id = 0
+    while True:
+        rows = conn.execute('SELECT id, library_id, question_text FROM questions WHERE id > ? ORDER BY id LIMIT ?',
+                            [last_id, CHUNK_SIZE]).fetchall()
+        if not rows:
+            break
+        conn.executemany('INSERT INTO temp.question_rehash VALUES (?, ?, ?, ?)',
+                         [(row[0], row[1], question_hash(row[2]), simhash(row[2])) for row in rows])
+        last_id = rows[-1][0]
+
+    conn.execute('''
+        UPDATE temp.question_rehash SET question_hash = NULL
+        WHERE id NOT IN (SELECT MIN(id) FROM temp.question_rehash GROUP BY library_id, question_hash)
+    ''')
+    # 只更新变化的题目；先把它们的哈希置空，避免更新过程中和尚未更新的题目冲突
+    conn.execute('''
+        DELETE FROM temp.question_rehash
+        WHERE EXISTS (SELECT 1 FROM questions q WHERE q.id = question_rehash.id
+                      AND q.question_hash IS question_rehash.question_hash AND q.simhash IS question_rehash.simhash)
+    ''')
+    conn.execute('UPDATE questions SET question_hash = NULL WHERE id IN (SELECT id FROM temp.question_rehash)')
+    conn.execute('''
+        UPDATE questions
+        SET question_hash = (SELECT question_hash FROM temp.question_rehash r WHERE r.id = questions.id),
+            simhash = (SELECT simhash FROM temp.question_rehash r WHERE r.id = questions.id)
+        WHERE id IN (SELECT id FROM temp.question_rehash)
+    ''')
+    conn.execute('DROP TABLE temp.question_rehash')
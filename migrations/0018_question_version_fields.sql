@@ -0,0 +1,13 @@
+-- 试卷页面显示题目的难度和章节，只修改这两个字段时也要递增题目版本号，使试卷的 ETag 和渲染缓存失效
+DROP TRIGGER IF EXISTS trg_questions_version;
+
+CREATE TRIGGER IF NOT EXISTS trg_questions_version
+AFTER UPDATE OF question_text, answer_text, question_type, difficulty, chapter ON questions
+WHEN OLD.question_text IS NOT NEW.question_text
+  OR OLD.answer_text IS NOT NEW.answer_text
+  OR OLD.question_type IS NOT NEW.question_type
+  OR OLD.difficulty IS NOT NEW.difficulty
+  OR OLD.chapter IS NOT NEW.chapter
+BEGIN
+    UPDATE questions SET version = OLD.version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
@@ -1,3 +1,5 @@
+-- 基础表结构；索引及后续结构变更见 migrations/ 目录，使用 flask db-upgrade 执行
+
 -- 创建用户表
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -65,4 +67,4 @@ INSERT INTO roles (name, description) VALUES ('admin', '管理员');
 INSERT INTO roles (name, description) VALUES ('user', '普通用户');
 
 -- 创建默认管理员用户 (密码: admin123)
-INSERT INTO users (username, password, email, role_id) VALUES ('admin', 'pbkdf2:sha256:150000$R8J3F7m7$528b38205721042802b102462c702019593b908399310739074793372394335a', 'admin@example.com', 1);
+INSERT INTO users (username, password, email, role_id) VALUES ('admin', 'pbkdf2:sha256:600000$FIIAuxudIGSPRxRI$fad7609ab7b3c653f3ae5a8d1b10bf0d0a5ffc437613101078e4d49dd8067736', 'admin@example.com', 1);
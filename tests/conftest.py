@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共夹具
+
+每个测试使用临时目录中的新数据库（按迁移建表），上传、导入和渲染缓存目录也指向临时目录。
+"""
+import os
+import tempfile
+
+# config 在导入时读取 DATABASE，先指向临时目录，避免在项目目录中生成数据库或日志文件
+os.environ['DATABASE'] = os.path.join(tempfile.mkdtemp(prefix='question-bank-tests-'), 'test.db')
+
+import jinja2
+import pytest
+from app import create_app
+from app.database import get_db, upgrade_db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing')
+    app.config.update(
+        DATABASE=str(tmp_path / 'test.db'),
+        UPLOAD_FOLDER=str(tmp_path / 'uploads'),
+        QUESTION_MEDIA_FOLDER=str(tmp_path / 'uploads' / 'media'),
+        IMPORT_FOLDER=str(tmp_path / 'imports'),
+        RENDER_CACHE_FOLDER=str(tmp_path / 'renders')
+    )
+    # 仓库中只有 templates/base.html，测试只检查路由逻辑和响应头，缺少的页面模板按空模板渲染
+    app.jinja_env.loader = jinja2.ChoiceLoader([app.jinja_env.loader, jinja2.FunctionLoader(lambda name: '')])
+    with app.app_context():
+        upgrade_db(get_db())
+    yield app
+    pool = app.extensions.get('sqlite_pool')
+    if pool is not None:
+        pool.close()
+
+
+@pytest.fixture
+def client(app):
+    """以管理员（迁移 0001 创建的 admin 用户）登录的测试客户端"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
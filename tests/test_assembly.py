@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+蓝图组卷在分组内抽取题目 id
+"""
+import random
+import pytest
+from app import assembly
+from app.database import get_db
+from app.seed import seed_bench
+
+
+@pytest.fixture
+def library(app):
+    """(连接, 题库 id)"""
+    with app.app_context():
+        conn = get_db()
+        yield conn, seed_bench(conn, 1, 3000, seed=2)[0]
+
+
+@pytest.mark.parametrize('count', [3, 200])  # 随机探测 / 读出分组的全部 id
+def test_draw_cell_ids_within_cell_and_skips_excluded(library, count):
+    conn, library_id = library
+    blueprint = assembly.parse_blueprint({'total': 1})
+    cell = max(assembly.load_cells(conn, library_id, blueprint), key=lambda c: c[3])
+    candidates = {row[0] for row in conn.execute(
+        'SELECT id FROM questions WHERE library_id = ? AND chapter IS ? AND question_type = ? AND difficulty = ?',
+        [library_id, *cell[:3]]
+    )}
+    excluded = set(sorted(candidates)[::10])
+    cell = next(c for c in assembly.load_cells(conn, library_id, blueprint, excluded) if c[:3] == cell[:3])
+
+    ids = assembly._draw_cell_ids(conn, library_id, cell, count, excluded, random.Random(1))
+
+    assert len(ids) == len(set(ids)) == count
+    assert set(ids) <= candidates - excluded
+    assert ids == assembly._draw_cell_ids(conn, library_id, cell, count, excluded, random.Random(1))
+
+
+def test_assemble_meets_type_counts(library):
+    conn, library_id = library
+    blueprint = assembly.parse_blueprint({'types': {'single_choice': 20, 'essay': 3},
+                                          'difficulty': {'average': 'medium'}})
+    result = assembly.assemble(conn, library_id, blueprint, seed=7)
+
+    ids = result['question_ids']
+    assert len(set(ids)) == 23
+    types = [conn.execute('SELECT question_type FROM questions WHERE id = ?', [i]).fetchone()[0] for i in ids]
+    assert types == ['single_choice'] * 20 + ['essay'] * 3
+    assert sum(result['stats']['difficulties'].values()) == 23
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+批量写入接口：逐行结果、单行失败和分批提交
+"""
+import json
+import sqlite3
+import pytest
+from app import batch_write
+from app.database import get_db
+
+
+@pytest.fixture
+def library_id(app):
+    with app.app_context():
+        conn = get_db()
+        library_id = conn.execute("INSERT INTO libraries (name, user_id) VALUES ('批量', 1)").lastrowid
+        conn.commit()
+        return library_id
+
+
+def create(text, **fields):
+    return {'op': 'create', 'question_text': text, 'answer_text': '答案', 'question_type': 'essay',
+            'difficulty': 'easy', **fields}
+
+
+def post_batch(client, library_id, operations):
+    body = '\n'.join(op if isinstance(op, str) else json.dumps(op, ensure_ascii=False) for op in operations)
+    response = client.post(f'/api/libraries/{library_id}/questions:batch', data=body.encode('utf-8'))
+    assert response.status_code == 200
+    *results, summary = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+    return results, summary
+
+
+def test_invalid_lines_fail_alone(app, client, library_id):
+    results, summary = post_batch(client, library_id, [
+        create('题目一'),
+        create('题目二', question_type=['essay']),
+        create('题目三', difficulty={'level': 1}),
+        '不是 JSON',
+        create('题目四', question_type='unknown'),
+    ])
+
+    assert [r['success'] for r in results] == [True, False, False, False, False]
+    assert [r['message'] for r in results[1:]] == ['无效的题型', '无效的难度', '不是有效的 JSON', '无效的题型']
+    assert summary == {'done': True, 'created': 1, 'updated': 0, 'deleted': 0, 'failed': 4}
+    with app.app_context():
+        texts = [row[0] for row in get_db().execute('SELECT question_text FROM questions WHERE library_id = ?',
+                                                     [library_id])]
+    assert texts == ['题目一']
+
+
+def test_duplicate_update_and_delete(app, client, library_id):
+    results, _ = post_batch(client, library_id, [create('进程调度'), create('进程调度'), create('内存管理')])
+    assert [r['success'] for r in results] == [True, False, True]
+    assert results[1]['message'] == '题库中已存在相同的题目'
+    first_id, second_id = results[0]['id'], results[2]['id']
+
+    results, summary = post_batch(client, library_id, [
+        {'op': 'update', 'id': first_id, 'difficulty': 'hard', 'chapter': ' 第一章 '},
+        {'op': 'update', 'id': second_id, 'question_text': '进程调度'},  # 改成与已有题目相同
+        {'op': 'update', 'id': 999999, 'answer_text': '略'},
+        {'op': 'delete', 'id': 999999},
+        {'op': 'delete', 'id': second_id},
+    ])
+    assert [r['success'] for r in results] == [True, False, False, False, True]
+    assert [r.get('message') for r in results[1:4]] == ['题库中已存在相同的题目', '题目不存在', '题目不存在']
+    assert summary == {'done': True, 'created': 0, 'updated': 1, 'deleted': 1, 'failed': 3}
+    with app.app_context():
+        rows = get_db().execute('SELECT id, difficulty, chapter FROM questions WHERE library_id = ?',
+                                [library_id]).fetchall()
+    assert [tuple(row) for row in rows] == [(first_id, 'hard', '第一章')]
+
+
+def test_each_chunk_committed_before_next(app, library_id):
+    lines = [json.dumps(create(f'题目{i}'), ensure_ascii=False).encode('utf-8') for i in range(5)]
+    with app.app_context():
+        results = batch_write.apply_batch(get_db(), library_id, iter(lines), app.config['QUESTION_TYPES'],
+                                          app.config['QUESTION_DIFFICULTIES'], chunk_size=2)
+        # 第一批的结果输出时已经提交，其他连接可以读到，后面的行还没有执行
+        assert next(results)['success']
+        other = sqlite3.connect(app.config['DATABASE'])
+        assert other.execute('SELECT COUNT(*) FROM questions WHERE library_id = ?', [library_id]).fetchone()[0] == 2
+        other.close()
+        assert list(results)[-1] == {'done': True, 'created': 5, 'updated': 0, 'deleted': 0, 'failed': 0}
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+bulk_insert_questions 的去重与失败计数，失败写入日志
+"""
+import io
+import logging
+from app.database import get_db
+from app.utils import bulk_insert_questions, extract_questions_from_file, question_hash
+
+
+def make_question(text):
+    return {'question_text': text, 'answer_text': '答案', 'question_type': 'short_answer', 'difficulty': 'easy',
+            'question_hash': question_hash(text or '')}
+
+
+def test_duplicates_ignored_but_constraint_failures_counted(app, caplog):
+    with app.app_context():
+        conn = get_db()
+        library_id = conn.execute("INSERT INTO libraries (name, user_id) VALUES ('导入', 1)").lastrowid
+        conn.commit()
+
+        # 题干为空违反 NOT NULL，应计为失败而不是重复
+        stats = bulk_insert_questions(conn, library_id, [
+            make_question('题目一'), make_question('题目一'), make_question(None), make_question('题目二')
+        ])
+
+        assert stats == {'inserted': 2, 'duplicates': 1, 'near_duplicates': 0, 'failed': 1}
+        assert [r.levelno for r in caplog.records if r.name == 'app.utils'] == [logging.WARNING]
+        count = conn.execute('SELECT COUNT(*) FROM questions WHERE library_id = ?', [library_id]).fetchone()[0]
+        assert count == 2
+
+
+def test_unreadable_file_logged_and_reported(app, caplog):
+    with app.app_context():
+        conn = get_db()
+        library_id = conn.execute("INSERT INTO libraries (name, user_id) VALUES ('导入', 1)").lastrowid
+        conn.commit()
+
+        stats = extract_questions_from_file(io.BytesIO(b'not a zip'), library_id, filename='题目.docx', conn=conn)
+
+    assert stats['inserted'] == 0 and stats['error']
+    record, = [r for r in caplog.records if r.name == 'app.utils']
+    assert record.levelno == logging.ERROR and record.exc_info
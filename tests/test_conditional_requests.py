@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+试卷页面、试卷下载和上传模板的 ETag 条件请求
+"""
+import pytest
+from app.database import get_db
+from app.seed import seed_bench
+
+
+@pytest.fixture
+def paper_id(app, client):
+    with app.app_context():
+        library_id = seed_bench(get_db(), 1, 100, seed=4)[0]
+    client.post(f'/papers/generate/{library_id}', data={
+        'paper_title': '条件请求', 'single_choice_count': 3, 'writer': 'ooxml'
+    })
+    clear_flashes(client)
+    with app.app_context():
+        return get_db().execute('SELECT MAX(id) FROM papers').fetchone()[0]
+
+
+def clear_flashes(client):
+    # 测试中没有页面模板，提示消息不会被取走
+    with client.session_transaction() as session:
+        session.pop('_flashes', None)
+
+
+def paper_question_id(app, paper_id):
+    with app.app_context():
+        return get_db().execute('SELECT question_id FROM paper_questions WHERE paper_id = ? ORDER BY question_order',
+                                [paper_id]).fetchone()[0]
+
+
+def test_upload_template_not_modified(client):
+    response = client.get('/upload_template')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get('/upload_template', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_paper_page_not_modified_until_question_changes(app, client, paper_id):
+    response = client.get(f'/papers/{paper_id}')
+    assert response.status_code == 200
+    assert response.cache_control.private and response.cache_control.no_cache
+    etag = response.headers['ETag']
+
+    response = client.get(f'/papers/{paper_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+    # 编辑试卷中的题目后题目和试卷的版本号递增，旧 ETag 不再匹配
+    question_id = paper_question_id(app, paper_id)
+    client.post(f'/questions/{question_id}/edit', data={
+        'question_text': '修改后的题目', 'answer_text': 'A', 'question_type': 'single_choice', 'difficulty': 'easy'
+    })
+    clear_flashes(client)
+    response = client.get(f'/papers/{paper_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_paper_page_changes_after_difficulty_edit(app, client, paper_id):
+    etag = client.get(f'/papers/{paper_id}').headers['ETag']
+
+    # 只修改难度和章节：试卷页面同样显示这两个字段
+    question_id = paper_question_id(app, paper_id)
+    with app.app_context():
+        question = get_db().execute('SELECT * FROM questions WHERE id = ?', [question_id]).fetchone()
+    client.post(f'/questions/{question_id}/edit', data={
+        'question_text': question['question_text'], 'answer_text': question['answer_text'],
+        'question_type': question['question_type'], 'difficulty': 'hard' if question['difficulty'] != 'hard' else 'easy',
+        'chapter': '第九章'
+    })
+    clear_flashes(client)
+    with app.app_context():
+        assert get_db().execute('SELECT version FROM questions WHERE id = ?', [question_id]).fetchone()[0] == 2
+    response = client.get(f'/papers/{paper_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_paper_page_with_pending_flash_not_304(client, paper_id):
+    etag = client.get(f'/papers/{paper_id}').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('success', '试卷生成成功！')]
+
+    # 有待显示的提示消息时必须返回完整页面，否则浏览器缓存的页面不会显示这条消息
+    response = client.get(f'/papers/{paper_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_download_paper_not_modified_until_paper_changes(app, client, paper_id):
+    response = client.get(f'/papers/{paper_id}/download?writer=ooxml')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get(f'/papers/{paper_id}/download?writer=python-docx').headers['ETag'] != etag
+
+    response = client.get(f'/papers/{paper_id}/download?writer=ooxml', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    with app.app_context():
+        conn = get_db()
+        conn.execute("UPDATE papers SET title = '条件请求（修订）' WHERE id = ?", [paper_id])
+        conn.commit()
+    response = client.get(f'/papers/{paper_id}/download?writer=ooxml', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    new_etag = response.headers['ETag']
+    assert new_etag != etag
+
+    # 题目被删除后试卷版本号同样递增
+    with app.app_context():
+        conn = get_db()
+        conn.execute('DELETE FROM questions WHERE id = ?', [paper_question_id(app, paper_id)])
+        conn.commit()
+    response = client.get(f'/papers/{paper_id}/download?writer=ooxml', headers={'If-None-Match': new_etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != new_etag
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+配置项的环境变量解析
+"""
+import pytest
+from config import env_seconds
+
+
+@pytest.mark.parametrize('value, expected', [(None, 0.1), ('', None), ('off', None), (' OFF ', None), ('0.5', 0.5)])
+def test_env_seconds(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv('SLOW_QUERY_SECONDS', raising=False)
+    else:
+        monkeypatch.setenv('SLOW_QUERY_SECONDS', value)
+    assert env_seconds('SLOW_QUERY_SECONDS', 0.1) == expected
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+iter_docx_lines 按 styles.xml 中的样式名识别标题，图片保存到媒体目录
+"""
+import hashlib
+import io
+import os
+import zipfile
+from app.docx_reader import MEDIA_URL, iter_docx_lines
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def make_docx(paragraphs, styles=None):
+    """paragraphs 为 [(styleId, 文本)]；styles 为 [(styleId, 样式名)]，None 表示没有 styles.xml"""
+    body = ''.join(
+        f'<w:p><w:pPr><w:pStyle w:val="{style}"/></w:pPr><w:r><w:t>{text}</w:t></w:r></w:p>' if style else
+        f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>'
+        for style, text in paragraphs
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', f'<w:document {W}><w:body>{body}</w:body></w:document>')
+        if styles is not None:
+            archive.writestr('word/styles.xml', f'<w:styles {W}>' + ''.join(
+                f'<w:style w:type="paragraph" w:styleId="{style_id}"><w:name w:val="{name}"/></w:style>'
+                for style_id, name in styles
+            ) + '</w:styles>')
+    buffer.seek(0)
+    return buffer
+
+
+def test_headings_matched_by_style_name():
+    # 中文版 Word 保存的文档：styleId 为 "1"、"4"、"a3"，样式名仍是内置的英文名
+    docx = make_docx(
+        [('a3', '期末试卷'), ('1', '一、单选题'), ('4', '1. 题目'), ('a4', '正文'), (None, '答案：A')],
+        styles=[('a3', 'Title'), ('1', 'heading 1'), ('4', 'heading 4'), ('a4', 'List Paragraph')]
+    )
+    assert list(iter_docx_lines(docx)) == ['# 期末试卷', '# 一、单选题', '#### 1. 题目', '正文', '答案：A']
+
+
+def test_headings_matched_by_style_id_without_styles():
+    docx = make_docx([('Title', '试卷'), ('Heading2', '判断题'), ('1', '正文')])
+    assert list(iter_docx_lines(docx)) == ['# 试卷', '## 判断题', '正文']
+
+
+def make_image_docx(images):
+    """images 为 [(包内文件名, 内容)]，每张图片一个段落，rels 中的目标路径相对于 word/"""
+    A = 'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+    R = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    body = ''.join(f'<w:p><w:r><w:t>图{i}</w:t></w:r><w:r><w:drawing><a:blip r:embed="rId{i}"/></w:drawing></w:r></w:p>'
+                   for i in range(len(images)))
+    rels = ''.join(f'<Relationship Id="rId{i}" Target="media/{name}"/>' for i, (name, _) in enumerate(images))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', f'<w:document {W} {A} {R}><w:body>{body}</w:body></w:document>')
+        archive.writestr('word/_rels/document.xml.rels', '<Relationships xmlns="http://schemas.openxmlformats.org/'
+                         f'package/2006/relationships">{rels}</Relationships>')
+        for name, data in images:
+            archive.writestr(f'word/media/{name}', data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_images_saved_to_media_folder(app, client):
+    media_folder = app.config['QUESTION_MEDIA_FOLDER']
+    images = [('image1.png', b'png-1'), ('image2.png', b'png-1'), ('image3.svg', b'<svg/>')]
+    name = hashlib.sha1(b'png-1').hexdigest() + '.png'
+
+    lines = list(iter_docx_lines(make_image_docx(images), media_folder=media_folder))
+
+    # 相同内容只保存一份；SVG 不保存
+    assert lines == [f'图0![图片]({MEDIA_URL}{name})', f'图1![图片]({MEDIA_URL}{name})', '图2[图片]']
+    assert os.listdir(media_folder) == [name]
+    response = client.get(f'{MEDIA_URL}{name}')
+    assert response.status_code == 200
+    assert response.data == b'png-1'
+    # 文档删除后链接仍然有效；没有指定目录时只输出占位文本
+    assert list(iter_docx_lines(make_image_docx(images[:1]))) == ['图0[图片]']
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+导入任务的并发上限和中断任务的恢复
+"""
+import io
+import os
+import subprocess
+import sys
+import pytest
+from werkzeug.datastructures import FileStorage
+from app import jobs
+from app.database import get_db
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """不启动进程池，只记录提交的任务编号"""
+    job_ids = []
+    monkeypatch.setattr(jobs, 'submit_job', lambda job_id, app=None: job_ids.append(job_id))
+    return job_ids
+
+
+def upload(name='题目.md'):
+    return FileStorage(io.BytesIO('#### 1. 题目\n答案：A\n'.encode('utf-8')), filename=name)
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_create_job_enforces_limit(app, submitted):
+    with app.test_request_context():
+        first = jobs.create_job(upload(), 1, 1, max_jobs=2)
+        second = jobs.create_job(upload(), 1, 1, max_jobs=2)
+        with pytest.raises(jobs.TooManyJobs):
+            jobs.create_job(upload(), 1, 1, max_jobs=2)
+
+        assert submitted == [first, second]
+        assert jobs.count_active_jobs(1) == 2
+        # 被拒绝的上传不留下文件
+        assert len(os.listdir(app.config['IMPORT_FOLDER'])) == 2
+
+
+def test_job_of_exited_worker_requeued_without_waiting(app, submitted):
+    with app.test_request_context():
+        crashed = jobs.create_job(upload(), 1, 1, max_jobs=1)
+        conn = get_db()
+        # 认领任务的工作进程刚刚退出，任务仍有新近的进度
+        conn.execute("UPDATE import_jobs SET state = 'running', worker_pid = ? WHERE id = ?", [dead_pid(), crashed])
+        conn.commit()
+        alive = jobs.create_job(upload(), 1, 2, max_jobs=1)
+        conn.execute("UPDATE import_jobs SET state = 'running', worker_pid = ? WHERE id = ?", [os.getpid(), alive])
+        conn.commit()
+        submitted.clear()
+
+        assert jobs.recover_jobs() == [crashed]
+        assert submitted == [crashed]
+        states = dict(conn.execute('SELECT id, state FROM import_jobs').fetchall())
+        assert states == {crashed: 'queued', alive: 'running'}
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+触发器维护的 library_stats 与 questions 的实际计数一致
+"""
+import random
+from app.database import get_db
+
+TYPES = ['single_choice', 'true_false', 'essay']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+
+
+def stats_table(conn):
+    rows = conn.execute('SELECT library_id, question_type, difficulty, question_count FROM library_stats')
+    return {tuple(row[:3]): row[3] for row in rows}
+
+
+def grouped_questions(conn):
+    rows = conn.execute('SELECT COALESCE(library_id, 0), question_type, difficulty, COUNT(*) FROM questions '
+                        'GROUP BY COALESCE(library_id, 0), question_type, difficulty')
+    return {tuple(row[:3]): row[3] for row in rows}
+
+
+def test_stats_follow_insert_update_delete(app):
+    rng = random.Random(6)
+    with app.app_context():
+        conn = get_db()
+        library_ids = [conn.execute('INSERT INTO libraries (name) VALUES (?)', [f'统计{i}']).lastrowid
+                       for i in range(3)] + [None]  # 没有所属题库的题目记在 0 下
+        ids = []
+        for step in range(600):
+            action = rng.random()
+            if action < 0.5 or not ids:
+                ids.append(conn.execute(
+                    'INSERT INTO questions (library_id, question_text, answer_text, question_type, difficulty, '
+                    'question_hash) VALUES (?, ?, ?, ?, ?, ?)',
+                    [rng.choice(library_ids), f'题目{step}', '答案', rng.choice(TYPES), rng.choice(DIFFICULTIES),
+                     str(step)]
+                ).lastrowid)
+            elif action < 0.8:
+                # 改题型、难度、题库中的任意几项，也包括改成相同的值和只改其他字段
+                column, values = rng.choice([('question_type', TYPES), ('difficulty', DIFFICULTIES),
+                                             ('library_id', library_ids), ('answer_text', ['略'])])
+                conn.execute(f'UPDATE questions SET {column} = ? WHERE id = ?', [rng.choice(values), rng.choice(ids)])
+            else:
+                question_id = ids.pop(rng.randrange(len(ids)))
+                conn.execute('DELETE FROM questions WHERE id = ?', [question_id])
+            if step % 100 == 99:
+                assert stats_table(conn) == grouped_questions(conn)
+
+        # 批量修改和删除（一条语句影响多行）
+        conn.execute("UPDATE questions SET difficulty = 'hard', question_type = 'essay' WHERE id % 3 = 0")
+        assert stats_table(conn) == grouped_questions(conn)
+        conn.execute('DELETE FROM questions WHERE library_id = ?', [library_ids[0]])
+        assert stats_table(conn) == grouped_questions(conn)
+        conn.execute('DELETE FROM questions')
+        assert stats_table(conn) == {}
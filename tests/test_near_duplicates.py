@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+近似重复接口的距离阈值上限
+"""
+from app import near_duplicates
+from app.database import get_db
+from app.seed import seed_bench
+
+
+def test_distance_limits(app, client):
+    with app.app_context():
+        conn = get_db()
+        library_id = seed_bench(conn, 1, 50, seed=6)[0]
+        question_id = conn.execute('SELECT MIN(id) FROM questions').fetchone()[0]
+
+    # 单题查询使用分段索引，距离超过 BAND_COUNT - 1 时结果不完整
+    url = f'/api/questions/{question_id}/duplicates'
+    assert client.get(f'{url}?distance={near_duplicates.MAX_BAND_DISTANCE}').status_code == 200
+    response = client.get(f'{url}?distance={near_duplicates.MAX_BAND_DISTANCE + 1}')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+    # 题库查重的距离过大时分桶失效，耗时接近题目数的平方
+    url = f'/api/libraries/{library_id}/duplicates'
+    response = client.get(f'{url}?distance={near_duplicates.MAX_CLUSTER_DISTANCE}')
+    assert response.status_code == 200
+    assert response.get_json()['distance'] == near_duplicates.MAX_CLUSTER_DISTANCE
+    assert client.get(f'{url}?distance={near_duplicates.MAX_CLUSTER_DISTANCE + 1}').status_code == 400
+    assert client.get(f'{url}?distance=-1').status_code == 400
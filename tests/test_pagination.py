@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+游标分页：created_at 相同的行不重复也不遗漏，无效游标返回 400，筛选条件下分页
+"""
+import base64
+import json
+import pytest
+from app.database import get_db
+from app.routes import fetch_library_page
+from app.utils import decode_cursor, encode_cursor
+
+CREATED_AT = '2026-01-01 08:00:00'
+
+
+@pytest.fixture
+def library_id(app):
+    """同一秒内写入的 10 道题目，难度交替"""
+    with app.app_context():
+        conn = get_db()
+        library_id = conn.execute("INSERT INTO libraries (name, user_id) VALUES ('分页', 1)").lastrowid
+        for i in range(10):
+            conn.execute(
+                'INSERT INTO questions (library_id, question_text, answer_text, question_type, difficulty, '
+                'question_hash, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [library_id, f'题目{i}', '答案', 'essay', ['easy', 'hard'][i % 2], str(i), CREATED_AT]
+            )
+        conn.commit()
+        return library_id
+
+
+def walk(client, url, **params):
+    """按 next_cursor 读完所有页，返回各页的题目 id"""
+    pages = []
+    cursor = None
+    while True:
+        response = client.get(url, query_string={**params, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        data = response.get_json()
+        pages.append([q['id'] for q in data['questions']])
+        cursor = data['next_cursor']
+        if not cursor:
+            return pages
+
+
+def question_ids(app, library_id, difficulty=None):
+    with app.app_context():
+        query = 'SELECT id FROM questions WHERE library_id = ?' + (' AND difficulty = ?' if difficulty else '')
+        rows = get_db().execute(query + ' ORDER BY id DESC', [library_id, *([difficulty] if difficulty else [])])
+        return [row[0] for row in rows]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(CREATED_AT, 42)) == (CREATED_AT, 42)
+
+
+@pytest.mark.parametrize('cursor', [
+    '!!!',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    base64.urlsafe_b64encode(json.dumps([CREATED_AT]).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps([CREATED_AT, '42']).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps([1, 42]).encode()).decode(),
+])
+def test_invalid_cursor(client, library_id, cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    response = client.get(f'/api/libraries/{library_id}/questions', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '无效的分页游标'
+
+
+def test_pages_across_equal_created_at(app, client, library_id):
+    pages = walk(client, f'/api/libraries/{library_id}/questions', page_size=3)
+
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert sum(pages, []) == question_ids(app, library_id)
+
+
+def test_filtered_pages(app, client, library_id):
+    pages = walk(client, f'/api/libraries/{library_id}/questions', page_size=2, difficulty='hard')
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == question_ids(app, library_id, 'hard')
+    response = client.get(f'/api/libraries/{library_id}/questions', query_string={'difficulty': 'impossible'})
+    assert response.status_code == 400
+
+
+def test_library_pages(app, client):
+    with app.app_context():
+        conn = get_db()
+        ids = [conn.execute('INSERT INTO libraries (name, created_at) VALUES (?, ?)', [f'题库{i}', CREATED_AT]).lastrowid
+               for i in range(5)]
+        conn.commit()
+
+    with app.test_request_context():
+        seen, cursor = [], None
+        while True:
+            libraries, cursor = fetch_library_page(cursor, page_size=2)
+            seen.extend(library['id'] for library in libraries)
+            if not cursor:
+                break
+    assert seen == sorted(ids, reverse=True)
+
+    # 页面路由遇到无效游标时提示并回到第一页
+    response = client.get('/libraries/', query_string={'cursor': '!!!'})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session['_flashes'] == [('danger', '无效的分页游标')]
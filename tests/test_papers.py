@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+组卷和题目表单的参数校验，试卷下载时重新渲染
+"""
+import pytest
+from app.database import get_db
+from app.seed import seed_bench
+
+
+@pytest.fixture
+def library_id(app):
+    with app.app_context():
+        return seed_bench(get_db(), 1, 100, seed=1)[0]
+
+
+@pytest.mark.parametrize('max_overlap', [-10, 101])
+def test_generate_paper_rejects_overlap_out_of_range(app, client, library_id, max_overlap):
+    response = client.post(f'/papers/generate/{library_id}', data={
+        'paper_title': '多套', 'single_choice_count': 3, 'variant_count': 2, 'max_overlap': max_overlap
+    })
+
+    assert response.status_code == 302
+    assert response.location.endswith(f'/papers/generate/{library_id}')
+    with client.session_transaction() as session:
+        assert session['_flashes'] == [('danger', '试卷之间的重复比例必须在 0 到 100 之间！')]
+    with app.app_context():
+        assert get_db().execute('SELECT COUNT(*) FROM papers').fetchone()[0] == 0
+
+
+def test_question_form_rejects_unknown_type(app, client, library_id):
+    with app.app_context():
+        question = get_db().execute('SELECT * FROM questions WHERE library_id = ? LIMIT 1', [library_id]).fetchone()
+    form = {'question_text': '新题目', 'answer_text': '答案', 'question_type': 'essay', 'difficulty': 'easy'}
+
+    client.post(f'/questions/{library_id}/create', data={**form, 'question_type': 'unknown'})
+    client.post(f'/questions/{question["id"]}/edit', data={**form, 'difficulty': 'impossible'})
+
+    with client.session_transaction() as session:
+        assert session['_flashes'] == [('danger', '无效的题型！'), ('danger', '无效的难度！')]
+    with app.app_context():
+        conn = get_db()
+        assert conn.execute("SELECT COUNT(*) FROM questions WHERE question_text = '新题目'").fetchone()[0] == 0
+        assert tuple(conn.execute('SELECT question_type, difficulty FROM questions WHERE id = ?',
+                                  [question['id']]).fetchone()) == (question['question_type'], question['difficulty'])
+
+
+@pytest.mark.parametrize('writer', ['ooxml', 'python-docx'])
+def test_download_paper_with_unknown_type(app, client, library_id, writer):
+    client.post(f'/papers/generate/{library_id}', data={'paper_title': '题型', 'single_choice_count': 3})
+    with app.app_context():
+        conn = get_db()
+        paper_id = conn.execute('SELECT MAX(id) FROM papers').fetchone()[0]
+        # 不经过表单直接写入数据库的题型
+        conn.execute("UPDATE questions SET question_type = 'fill_blank' WHERE id IN "
+                     "(SELECT question_id FROM paper_questions WHERE paper_id = ?)", [paper_id])
+        conn.commit()
+
+    response = client.get(f'/papers/{paper_id}/download?writer={writer}')
+    assert response.status_code == 200
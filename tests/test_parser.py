@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Markdown 题目解析
+"""
+from app.utils import iter_cleaned_questions, question_hash
+
+H4_QUESTIONS = '''# 题库
+
+#### 1. 多选题（简单）：以下哪些是操作系统？
+A. Linux
+B. Windows
+C. Excel
+D. macOS
+**答案：** ABD
+
+#### 2. 判断题（中等）：进程是资源分配的基本单位。
+**答案：** 正确
+
+#### 3. 单选题（困难）：TCP 属于哪一层协议？
+A. 网络层
+B. 传输层
+**答案：** B
+'''
+
+
+def test_h4_heading_ends_choice_answer():
+    # 选择题和判断题的答案之后出现 H4 标题时开始新题目，不能并入上一题的答案
+    questions = list(iter_cleaned_questions(H4_QUESTIONS.splitlines(), 1))
+
+    assert [q['answer_text'] for q in questions] == ['ABD', '正确', 'B']
+    assert [q['question_type'] for q in questions] == ['multiple_choice', 'true_false', 'single_choice']
+    assert questions[2]['question_text'] == 'TCP 属于哪一层协议？\nA. 网络层\nB. 传输层'
+
+
+def test_question_hash_ignores_h4_label():
+    # 之前的版本把 H4 标题的序号和标签保留在题目文本中，重新导入旧文件时不能因此产生重复题目
+    assert question_hash('12. 单选题（困难）：TCP 属于哪一层协议？') == question_hash('TCP 属于哪一层协议？')
+    assert question_hash('3. 什么是死锁') == question_hash('什么是死锁')
+    assert question_hash('3.14 是圆周率吗') != question_hash('14 是圆周率吗')
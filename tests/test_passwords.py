@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+每个进程只创建一个密码验证线程池
+"""
+import threading
+import time
+from app import passwords
+
+
+def test_concurrent_first_logins_share_verifier(app, monkeypatch):
+    created = []
+
+    class SlowVerifier(passwords.PasswordVerifier):
+        def __init__(self, *args):
+            time.sleep(0.05)  # 放大检查和创建之间的窗口
+            super().__init__(*args)
+            created.append(self)
+
+    monkeypatch.setattr(passwords, 'PasswordVerifier', SlowVerifier)
+    app.extensions.pop('password_verifier', None)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def login():
+        barrier.wait()
+        results.append(passwords.get_verifier(app))
+
+    threads = [threading.Thread(target=login) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(verifier is created[0] for verifier in results)
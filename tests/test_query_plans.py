@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+app/routes.py 中每条查询的执行计划都要用到索引
+
+在合成数据上依次请求各个路由，通过 trace 回调记录 routes.py 中（直接或经 query_db/execute_db）执行的语句，
+再逐条执行 EXPLAIN QUERY PLAN，出现没有使用索引的 "SCAN <表>" 即失败。
+"""
+import os
+import sys
+import pytest
+from flask import g
+from app import metrics, routes
+from app.database import connect, get_db
+from app.seed import seed_bench
+from app.slow_queries import explain, is_full_scan, normalize_sql
+
+ROUTES_FILE = os.path.abspath(routes.__file__)
+METRICS_FILE = os.path.abspath(metrics.__file__)
+# query_db/execute_db，调用它们的那一帧才是语句的来源
+WRAPPER_FUNCTIONS = {'query_db', 'execute_db'}
+
+# 有意读取整张小表的语句：统计页列出所有题库，并读取按题库汇总的计数表（行数与题库数量成正比）
+ALLOWED_FULL_SCANS = {
+    'SELECT id, name FROM libraries ORDER BY id',
+    'SELECT library_id, question_type, difficulty, question_count FROM library_stats WHERE question_count > ?',
+}
+
+
+def statement_origin():
+    """执行当前语句的 Python 代码所在的函数，跳过 query_db/execute_db 和计时游标；不在 routes.py 中时返回 None"""
+    frame = sys._getframe(2)
+    while frame is not None and (frame.f_code.co_name in WRAPPER_FUNCTIONS
+                                 or os.path.abspath(frame.f_code.co_filename) == METRICS_FILE):
+        frame = frame.f_back
+    if frame is None or os.path.abspath(frame.f_code.co_filename) != ROUTES_FILE:
+        return None
+    return frame.f_code.co_name
+
+
+@pytest.fixture
+def seeded(app):
+    with app.app_context():
+        conn = get_db()
+        library_ids = seed_bench(conn, 2, 300, seed=1)
+        # 只有几行的表 ANALYZE 后规划器会直接扫描，补充一些空题库，使统计信息接近实际部署
+        conn.executemany('INSERT INTO libraries (name, user_id) VALUES (?, 1)', [(f'题库 {i}',) for i in range(200)])
+        conn.execute('ANALYZE')
+        conn.commit()
+    return library_ids
+
+
+@pytest.fixture
+def traced(app):
+    """记录 routes.py 执行的 [(函数名, SQL)]"""
+    statements = []
+
+    def trace(sql):
+        if sql.startswith('--'):  # 触发器中的语句
+            return
+        origin = statement_origin()
+        if origin:
+            statements.append((origin, sql))
+
+    @app.before_request
+    def start_trace():
+        get_db().set_trace_callback(trace)
+
+    @app.teardown_request
+    def stop_trace(exception=None):
+        if '_database' in g:
+            g._database.set_trace_callback(None)
+
+    return statements
+
+
+def exercise_routes(client, library_id, other_library_id):
+    """请求所有读写数据库的路由"""
+    def ok(response):
+        assert response.status_code < 400, response.get_data(as_text=True)[:500]
+        return response
+
+    ok(client.get('/statistics'))
+    ok(client.get('/statistics.json'))
+    cursor = ok(client.get('/api/libraries/%d/questions?page_size=5' % library_id)).json['next_cursor']
+    ok(client.get(f'/api/libraries/{library_id}/questions?page_size=5&cursor={cursor}'))
+    ok(client.get(f'/api/libraries/{library_id}/questions?question_type=essay&difficulty=hard'))
+    ok(client.get('/libraries/?page_size=1'))
+    ok(client.post('/libraries/create', data={'name': '新题库'}))
+    ok(client.get(f'/libraries/{library_id}/export?format=csv'))
+    ok(client.get(f'/questions/{library_id}'))
+    ok(client.get(f'/questions/{library_id}?question_type=single_choice&difficulty=easy'))
+    ok(client.get(f'/questions/{library_id}/upload'))
+
+    ok(client.post(f'/questions/{library_id}/create', data={
+        'question_text': '查询计划测试题目', 'answer_text': '答案', 'question_type': 'short_answer',
+        'difficulty': 'easy'
+    }))
+    question_id = client.get(f'/api/libraries/{library_id}/questions?page_size=1').json['questions'][0]['id']
+    ok(client.get(f'/questions/{question_id}/edit'))
+    ok(client.post(f'/questions/{question_id}/edit', data={
+        'question_text': '查询计划测试题目（修改）', 'answer_text': '答案', 'question_type': 'short_answer',
+        'difficulty': 'medium'
+    }))
+    ok(client.get(f'/api/questions/{question_id}/duplicates'))
+    ok(client.get(f'/api/libraries/{library_id}/duplicates'))
+
+    ok(client.post(f'/papers/generate/{library_id}', data={
+        'paper_title': '单套', 'single_choice_count': 3, 'true_false_count': 2, 'writer': 'ooxml'
+    }))
+    ok(client.post(f'/papers/generate/{library_id}', data={
+        'paper_title': '多套', 'single_choice_count': 3, 'variant_count': 2, 'writer': 'ooxml'
+    }))
+    ok(client.post(f'/papers/assemble/{library_id}', json={
+        'paper_title': '蓝图', 'writer': 'ooxml', 'blueprint': {'types': {'single_choice': 3, 'essay': 1}}
+    }))
+    paper_id = get_latest_paper_id(client)
+    ok(client.get('/papers/'))
+    ok(client.get(f'/papers/{paper_id}'))
+    ok(client.get(f'/papers/{paper_id}/download?writer=ooxml'))
+
+    ok(client.post(f'/api/libraries/{library_id}/questions:batch',
+                   data='{"op": "update", "id": %d, "answer_text": "新答案"}\n' % question_id))
+    ok(client.post(f'/questions/{library_id}/batch_delete', json={'question_ids': [question_id]}))
+    other_question = client.get(f'/api/libraries/{library_id}/questions?page_size=1').json['questions'][0]['id']
+    ok(client.get(f'/questions/{other_question}/delete'))
+    ok(client.get(f'/libraries/{other_library_id}/delete'))
+
+
+def get_latest_paper_id(client):
+    with client.application.app_context():
+        return get_db().execute('SELECT MAX(id) FROM papers').fetchone()[0]
+
+
+def test_route_queries_use_indexes(app, client, seeded, traced):
+    exercise_routes(client, *seeded)
+
+    # 确认 trace 确实记录到了各个路由的语句
+    origins = {origin for origin, _ in traced}
+    assert {'get_statistics', 'fetch_question_page', 'fetch_library_page', 'delete_library', 'edit_question',
+            'generate_paper', 'paper', 'download_paper', 'batch_delete_questions'} <= origins
+
+    conn = connect(app.config['DATABASE'])
+    try:
+        full_scans = {}
+        for origin, sql in traced:
+            normalized = normalize_sql(sql)
+            if not normalized.split(' ', 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE', 'WITH'):
+                continue
+            if normalized in ALLOWED_FULL_SCANS:
+                continue
+            plan = explain(conn, sql, ())
+            if is_full_scan(plan):
+                full_scans[normalized] = (origin, plan)
+    finally:
+        conn.close()
+    assert not full_scans, '\n'.join(f'{origin}: {sql}\n  ' + '\n  '.join(plan)
+                                     for sql, (origin, plan) in full_scans.items())
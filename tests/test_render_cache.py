@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+删除题库时清除相关试卷的渲染缓存
+"""
+import os
+from app.database import get_db
+from app.seed import seed_bench
+
+
+def test_delete_library_purges_render_cache(app, client):
+    with app.app_context():
+        library_id, other_id = seed_bench(get_db(), 2, 100, seed=3)
+
+    for target in (library_id, other_id):
+        client.post(f'/papers/generate/{target}', data={
+            'paper_title': '缓存', 'single_choice_count': 3, 'writer': 'ooxml'
+        })
+    with app.app_context():
+        paper_ids = [row[0] for row in get_db().execute('SELECT id FROM papers ORDER BY id')]
+    for paper_id in paper_ids:
+        assert client.get(f'/papers/{paper_id}/download?writer=ooxml').status_code == 200
+    cache_folder = app.config['RENDER_CACHE_FOLDER']
+    assert len(os.listdir(cache_folder)) == 2
+
+    client.get(f'/libraries/{library_id}/delete')
+
+    with app.app_context():
+        rows = get_db().execute('SELECT paper_id, cache_key FROM paper_renders').fetchall()
+    assert [row['paper_id'] for row in rows] == [paper_ids[1]]
+    assert os.listdir(cache_folder) == [rows[0]['cache_key'] + '.docx']
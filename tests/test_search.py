@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+全文索引由应用写入路径维护，questions 上的触发器不依赖自定义 SQL 函数
+"""
+import sqlite3
+from app import search
+from app.database import get_db
+from app.utils import question_hash
+
+
+def search_ids(conn, query, library_id):
+    return [row['id'] for row in search.search_questions(conn, query, library_id)[0]]
+
+
+def test_plain_connection_write_indexed_later(app):
+    with app.app_context():
+        conn = get_db()
+        conn.execute("INSERT INTO libraries (name) VALUES ('外部写入')")
+        library_id = conn.execute('SELECT MAX(id) FROM libraries').fetchone()[0]
+        conn.commit()
+
+    # 没有注册 fts_tokens/question_simhash 的连接也能写入题目
+    raw = sqlite3.connect(app.config['DATABASE'])
+    raw.execute(
+        'INSERT INTO questions (library_id, question_text, answer_text, question_type, difficulty, question_hash) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        [library_id, '椭圆的离心率如何计算', '略', 'essay', 'hard', question_hash('椭圆的离心率如何计算')]
+    )
+    question_id = raw.execute('SELECT MAX(id) FROM questions').fetchone()[0]
+    raw.commit()
+    raw.close()
+
+    with app.app_context():
+        conn = get_db()
+        assert search_ids(conn, '离心率', library_id) == []
+        assert search.index_pending(conn) == 1
+        conn.commit()
+        assert search_ids(conn, '离心率', library_id) == [question_id]
+        assert conn.execute('SELECT simhash FROM questions WHERE id = ?', [question_id]).fetchone()[0] is not None
+        assert conn.execute('SELECT COUNT(*) FROM question_simhash_bands WHERE question_id = ?',
+                            [question_id]).fetchone()[0] == 4
+
+
+def test_create_and_edit_question_update_index(app, client):
+    with app.app_context():
+        conn = get_db()
+        conn.execute("INSERT INTO libraries (name) VALUES ('检索')")
+        library_id = conn.execute('SELECT MAX(id) FROM libraries').fetchone()[0]
+        conn.commit()
+
+    client.post(f'/questions/{library_id}/create', data={
+        'question_text': '简述进程调度算法', 'answer_text': '略', 'question_type': 'essay', 'difficulty': 'medium'
+    })
+    with app.app_context():
+        conn = get_db()
+        question_id = conn.execute('SELECT MAX(id) FROM questions').fetchone()[0]
+        assert search_ids(conn, '调度', library_id) == [question_id]
+
+    client.post(f'/questions/{question_id}/edit', data={
+        'question_text': '简述虚拟内存的页面置换', 'answer_text': '略', 'question_type': 'essay', 'difficulty': 'medium'
+    })
+    with app.app_context():
+        conn = get_db()
+        assert search_ids(conn, '调度', library_id) == []
+        assert search_ids(conn, '置换', library_id) == [question_id]
+        assert conn.execute('SELECT COUNT(*) FROM questions_search_pending').fetchone()[0] == 0
+
+        with conn:
+            assert search.rebuild_index(conn) == 1
+        assert search_ids(conn, '置换', library_id) == [question_id]
+        conn.execute("INSERT INTO questions_fts (questions_fts, rank) VALUES ('integrity-check', 1)")
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+慢查询日志和请求 SQL 统计在连接层面计时，不经过 query_db/execute_db 的语句同样记录
+"""
+import pytest
+from app import slow_queries
+from app.database import get_db
+from app.seed import seed_bench
+
+
+@pytest.fixture
+def log_all(monkeypatch, tmp_path):
+    """阈值设为 0，记录所有语句，返回读取日志的函数"""
+    path = str(tmp_path / 'slow.jsonl')
+    monkeypatch.setattr(slow_queries, 'threshold', 0)
+    monkeypatch.setattr(slow_queries, '_path', path)
+    return lambda: list(slow_queries.iter_log(path))
+
+
+def entries_for(entries, sql):
+    return [entry for entry in entries if entry['sql'] == slow_queries.normalize_sql(sql)]
+
+
+def test_connection_statements_logged(app, log_all):
+    with app.app_context():
+        conn = get_db()
+        library_id = conn.execute("INSERT INTO libraries (name) VALUES ('慢查询')").lastrowid
+        conn.executemany('INSERT INTO questions (library_id, question_text, answer_text, question_type, difficulty, '
+                         'question_hash) VALUES (?, ?, ?, ?, ?, ?)',
+                         [(library_id, f'题目{i}', '答案', 'essay', 'easy', str(i)) for i in range(600)])
+        conn.commit()
+
+        # 按行迭代（超过一批）、fetchall、只读一行后丢弃游标
+        iterated = sum(1 for _ in conn.execute('SELECT id FROM questions WHERE library_id = ?', [library_id]))
+        fetched = conn.execute('SELECT id, question_text FROM questions WHERE difficulty = ?', ['easy']).fetchall()
+        conn.execute('SELECT id FROM questions WHERE library_id = ? ORDER BY id', [library_id]).fetchone()
+
+    entries = log_all()
+    insert, = entries_for(entries, 'INSERT INTO questions (library_id, question_text, answer_text, question_type, '
+                                   'difficulty, question_hash) VALUES (?, ?, ?, ?, ?, ?)')
+    assert insert['rows'] == 600
+    assert insert['params'] == 'int, str×5'
+    scan, = entries_for(entries, 'SELECT id FROM questions WHERE library_id = ?')
+    assert scan['rows'] == iterated == 600
+    assert scan['plan']
+    full, = entries_for(entries, 'SELECT id, question_text FROM questions WHERE difficulty = ?')
+    assert full['rows'] == len(fetched)
+    first, = entries_for(entries, 'SELECT id FROM questions WHERE library_id = ? ORDER BY id')
+    assert first['rows'] == 1
+    # EXPLAIN 本身不记录
+    assert not [entry for entry in entries if entry['sql'].startswith('EXPLAIN')]
+
+
+def test_sampling_queries_logged_and_counted(app, client, log_all):
+    app.config['SERVER_TIMING'] = True
+    with app.app_context():
+        library_id = seed_bench(get_db(), 1, 200, seed=8)[0]
+
+    response = client.post(f'/papers/generate/{library_id}', data={
+        'paper_title': '慢查询', 'single_choice_count': 3, 'single_choice_difficulty': 'easy', 'writer': 'ooxml'
+    })
+    assert response.status_code == 200
+    # 组卷的抽样语句由 app.sampling 直接在连接上执行
+    assert [entry for entry in log_all() if entry['endpoint'] == 'paper.generate_paper'
+            and 'FROM questions' in entry['sql'] and 'difficulty' in entry['sql']]
+    statements = int(response.headers['Server-Timing'].split('desc="')[1].split()[0])
+    assert statements > 2